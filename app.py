@@ -6,6 +6,8 @@ from routes.feature_selection import feature_selection_routes
 from routes.normalization import normalization_routes
 from routes.train_model import train_model_routes
 from routes.traffic import traffic
+from routes.job_routes import job_routes
+from routes.search_routes import search_routes
 import os
 
 app = Flask(__name__)
@@ -25,6 +27,8 @@ app.register_blueprint(feature_selection_routes)
 app.register_blueprint(normalization_routes)
 app.register_blueprint(train_model_routes)
 app.register_blueprint(traffic, url_prefix='/traffic')
+app.register_blueprint(job_routes)
+app.register_blueprint(search_routes)
 
 # Route for user monitoring (must come before the __main__ check)
 # @app.route('/traffic')
@@ -0,0 +1,99 @@
+"""Benchmark the vectorized Benford feature selection against the row-wise path.
+
+Builds a synthetic numeric dataset, runs the original ``first_digit`` +
+nine-comparison implementation and the NumPy ``apply_benford_law``, checks
+that both produce the same chi-square statistics and selected features, and
+prints the timings.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_benford --rows 1000000 --cols 20
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.benford_utils import BENFORD_PROBS, apply_benford_law, chi_square_test, first_digit
+
+
+def rowwise_apply_benford_law(df):
+    """The original per-value implementation, kept here as the reference."""
+    chi_stats = []
+    processed_columns = []
+    for column in df.select_dtypes(include=[np.number]).columns:
+        if column == 'Label':
+            continue
+        first_digits = first_digit(df[column].dropna())
+        if first_digits.empty:
+            continue
+        total_values = len(first_digits)
+        observed_counts = [(first_digits == digit).sum() for digit in range(1, 10)]
+        expected_counts = BENFORD_PROBS * total_values
+        chi_stats.append(chi_square_test(np.array(observed_counts), expected_counts))
+        processed_columns.append(column)
+
+    chi_stats_df = pd.DataFrame({'Features': processed_columns, 'Chi-Square': chi_stats})
+    median_threshold = chi_stats_df['Chi-Square'].median()
+    selected = chi_stats_df[chi_stats_df['Chi-Square'] >= median_threshold]['Features'].tolist()
+    return {"selected_features": selected + ['Label'], "chi_stats": chi_stats_df.to_dict(orient="records")}
+
+
+def make_dataset(rows, cols, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(cols):
+        kind = i % 5
+        if kind == 0:
+            data[f"f{i}"] = rng.integers(0, 65536, rows)
+        elif kind == 1:
+            data[f"f{i}"] = rng.lognormal(5, 3, rows)
+        elif kind == 2:
+            data[f"f{i}"] = np.round(rng.uniform(0, 1, rows), 3)
+        elif kind == 3:
+            values = rng.exponential(1e6, rows)
+            values[rng.random(rows) < 0.05] = np.nan
+            data[f"f{i}"] = values
+        else:
+            # Computed values stored a rounding error below a decimal, e.g. 2.9999999999999996
+            data[f"f{i}"] = np.nextafter(np.round(rng.lognormal(3, 2, rows), 1), 0)
+    data['Label'] = rng.integers(0, 2, rows)
+    return pd.DataFrame(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--cols', type=int, default=20)
+    args = parser.parse_args()
+
+    df = make_dataset(args.rows, args.cols)
+    print(f"Dataset: {args.rows} rows x {args.cols} feature columns")
+
+    started = time.perf_counter()
+    vectorized = apply_benford_law(df)
+    vectorized_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rowwise = rowwise_apply_benford_law(df)
+    rowwise_time = time.perf_counter() - started
+
+    same_features = vectorized['selected_features'] == rowwise['selected_features']
+    same_stats = all(
+        a['Features'] == b['Features'] and a['Chi-Square'] == b['Chi-Square']
+        for a, b in zip(vectorized['chi_stats'], rowwise['chi_stats'])
+    ) and len(vectorized['chi_stats']) == len(rowwise['chi_stats'])
+
+    print(f"row-wise:   {rowwise_time:8.3f} s")
+    print(f"vectorized: {vectorized_time:8.3f} s  ({rowwise_time / vectorized_time:.1f}x faster)")
+    print(f"identical chi-square statistics: {same_stats}, identical selection: {same_features}")
+    if not (same_stats and same_features):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
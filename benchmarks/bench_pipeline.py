@@ -0,0 +1,220 @@
+"""Replay benchmark for the traffic capture pipeline.
+
+Feeds a pcap file or synthetic traffic through the same feature extraction,
+flow table, batched inference and capture writer used for live capture, once
+per model, and reports packets/s, per-stage latency percentiles, dropped
+packets and peak RSS. Each model runs in a fresh process so peak RSS is
+per model. No network access or privileges are needed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline --synthetic 20000
+    python -m benchmarks.bench_pipeline --pcap capture.pcap --models decision_tree,random_forest
+    python -m benchmarks.bench_pipeline --synthetic 20000 --rate 5000 --json
+    python -m benchmarks.bench_pipeline --synthetic 50000 --models random_forest --workers 4
+    python -m benchmarks.bench_pipeline --synthetic 20000 --models random_forest --no-verdict-cache
+
+With ``--workers N`` packets are read in a separate process and classified by
+N worker processes (see ``utils/fanout.py``). Synthetic packets are written to
+a temporary pcap first so their generation is not timed.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TRAINING_PACKETS = 5000
+
+
+def synthetic_training_set():
+    """Label the flows of a synthetic capture: spoofed 172.16.0.0/12 sources are the flood."""
+    import pandas as pd
+    from utils.flow_utils import FlowTable, FLOW_FEATURES
+    from utils.replay_utils import synthetic_packets
+    from scapy.all import IP, TCP
+
+    rows = []
+
+    def collect(record, reason):
+        features = record.features()
+        features['Label'] = 'DDoS' if record.src.startswith('172.') else 'Benign'
+        rows.append(features)
+
+    table = FlowTable(on_evict=collect)
+    for packet in synthetic_packets(TRAINING_PACKETS, seed=7):
+        ip, tcp = packet[IP], packet[TCP]
+        payload_len = len(tcp.payload)
+        table.update(float(packet.time), ip.src, ip.dst, tcp.sport, tcp.dport, ip.proto,
+                     payload_len, header_len=len(tcp) - payload_len, flags=int(tcp.flags), window=tcp.window)
+    table.flush()
+
+    df = pd.DataFrame(rows)
+    return df[FLOW_FEATURES], df['Label']
+
+
+def load_model(model_name, use_saved):
+    import joblib
+    from routes.train_model import get_classifier
+
+    saved_path = os.path.join('models', f"{model_name}.pkl")
+    if use_saved and os.path.exists(saved_path):
+        return joblib.load(saved_path)
+    X, y = synthetic_training_set()
+    model = get_classifier(model_name)
+    model.fit(X, y)
+    return model
+
+
+def run_fanout(model_name, args, traffic, output_dir):
+    from scapy.utils import wrpcap
+    from utils.replay_utils import synthetic_packets
+
+    pcap_path = args.pcap
+    if not pcap_path:
+        pcap_path = os.path.join(output_dir, 'synthetic.pcap')
+        wrpcap(pcap_path, synthetic_packets(args.synthetic))
+    session = traffic.build_session({
+        'source': 'pcap',
+        'pcap_path': pcap_path,
+        'replay_rate': args.rate,
+        'batch_size': args.batch_size,
+        'max_latency_ms': args.max_latency_ms,
+        'output_format': args.output_format,
+        'verdict_cache': not args.no_verdict_cache,
+    }, output_path=os.path.join(output_dir, 'bench.csv'))
+    fanout = traffic.fanout_capture(session, args.workers)
+    session.start(fanout=fanout)
+    session.wait()
+    stats = session.stats()
+    fanout_stats = stats['fanout']
+    elapsed = time.perf_counter() - fanout.started_at
+    workers = [worker for worker in fanout_stats['per_worker'] if worker]
+    sent = stats['packets_processed']
+
+    return {
+        'model': model_name,
+        'workers': args.workers,
+        'packets': sent,
+        'replay_packets_per_s': round(sent / elapsed, 1) if elapsed else 0.0,
+        'end_to_end_packets_per_s': round(sent / elapsed, 1) if elapsed else 0.0,
+        'classified_rows': fanout_stats['rows_merged'],
+        'dropped': stats['dropped'],
+        'stages': dict(workers[0]['stages'], inference=workers[0]['inference']['latency'],
+                       write=stats['stages']['write']),
+        'avg_batch_size': workers[0]['inference']['avg_batch_size'],
+        'verdict_cache': stats['verdict_cache'],
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+
+def run_model(model_name, args):
+    import routes.traffic as traffic
+    from utils.model_registry import LoadedModel
+    from utils.replay_utils import iter_pcap, synthetic_packets, replay
+
+    traffic.activate_model(LoadedModel(load_model(model_name, args.use_saved), None, {'name': model_name}))
+    if args.workers:
+        with tempfile.TemporaryDirectory() as output_dir:
+            return run_fanout(model_name, args, traffic, output_dir)
+
+    # Materialise the packets first so generation/reading is not timed
+    if args.pcap:
+        packets = list(iter_pcap(args.pcap))
+    else:
+        packets = list(synthetic_packets(args.synthetic))
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        session = traffic.build_session({
+            'source': 'pcap' if args.pcap else 'synthetic',
+            'batch_size': args.batch_size,
+            'max_latency_ms': args.max_latency_ms,
+            'output_format': args.output_format,
+            'verdict_cache': not args.no_verdict_cache,
+        }, output_path=os.path.join(output_dir, 'bench.csv'))
+        session.open()
+
+        started = time.perf_counter()
+        sent = replay(packets, session.process_packet, rate=args.rate)
+        replayed = time.perf_counter() - started
+        session.finish(timeout=None)
+        elapsed = time.perf_counter() - started
+
+        stats = session.stats()
+
+    return {
+        'model': model_name,
+        'packets': sent,
+        'replay_packets_per_s': round(sent / replayed, 1) if replayed else 0.0,
+        'end_to_end_packets_per_s': round(sent / elapsed, 1) if elapsed else 0.0,
+        'classified_rows': stats['inference']['processed'],
+        'dropped': stats['dropped'],
+        'stages': stats['stages'],
+        'avg_batch_size': stats['inference']['avg_batch_size'],
+        'verdict_cache': stats['verdict_cache'],
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+    }
+
+
+def format_ratio(cache):
+    return f"{cache['hit_ratio']:.1%}" if cache else '-'
+
+
+def format_stage(stage):
+    if not stage:
+        return '-'
+    return f"{stage['p50_ms']:.3f}/{stage['p99_ms']:.3f}"
+
+
+def main():
+    from routes.train_model import MODEL_NAMES
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--pcap', help='pcap/pcapng file to replay')
+    source.add_argument('--synthetic', type=int, default=20000, help='number of synthetic packets (default 20000)')
+    parser.add_argument('--models', default=','.join(MODEL_NAMES), help='comma-separated model names')
+    parser.add_argument('--rate', type=float, default=None, help='pace replay to this many packets/s (default: as fast as possible)')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--max-latency-ms', type=float, default=50)
+    parser.add_argument('--output-format', default='csv')
+    parser.add_argument('--workers', type=int, default=0, help='classify in this many worker processes (default: in-process)')
+    parser.add_argument('--no-verdict-cache', action='store_true', help='send every row to the model')
+    parser.add_argument('--use-saved', action='store_true', help='use models/<name>.pkl when present instead of fitting on synthetic flows')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    models = [name.strip() for name in args.models.split(',') if name.strip()]
+    unknown = [name for name in models if name not in MODEL_NAMES]
+    if unknown:
+        parser.error(f"Unknown models: {', '.join(unknown)}")
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for model_name in models:
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            results.append(pool.submit(run_model, model_name, args).result())
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    header = f"{'model':<20}{'pkts/s':>10}{'e2e pkts/s':>12}{'dropped':>9}  {'extract ms':>13}{'flow ms':>13}{'infer ms':>17}{'write ms':>17}{'cache hit':>10}{'RSS MB':>9}"
+    print("latency columns are p50/p99")
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        stages = r['stages']
+        print(f"{r['model']:<20}{r['replay_packets_per_s']:>10.1f}{r['end_to_end_packets_per_s']:>12.1f}{r['dropped']:>9}  "
+              f"{format_stage(stages['extract']):>13}{format_stage(stages['flow']):>13}"
+              f"{format_stage(stages['inference']):>17}{format_stage(stages['write']):>17}"
+              f"{format_ratio(r['verdict_cache']):>10}{r['peak_rss_mb']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""Measure how long importing the application takes, and where the time goes.
+
+Imports ``app`` in fresh interpreters: a few plain runs give the wall time,
+and one run under ``python -X importtime`` gives the per-module breakdown.
+Modules listed in DEFERRED_MODULES (sklearn, pandas, scapy, matplotlib, ...)
+are only meant to be imported by the first request that needs them; any that
+show up at startup are reported, and fail the run like an exceeded
+``--max-ms`` budget, so a stray top-level import does not go unnoticed.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --repeat 10 --top 30 --max-ms 800 --json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that must stay out of the startup import chain
+DEFERRED_MODULES = ['sklearn', 'scipy', 'pandas', 'pyarrow', 'scapy', 'matplotlib', 'joblib']
+
+# "import time: self [us] | cumulative | imported package", indented by nesting depth
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+
+def wall_time(module, repeat):
+    """Seconds per ``python -c 'import <module>'``, one fresh interpreter per run."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', f'import {module}'], cwd=ROOT, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def import_times(module):
+    """Entries of one ``-X importtime`` run, in the order the interpreter reports them."""
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr[-2000:]}")
+    entries = []
+    for line in completed.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            entries.append({'module': match.group(4), 'self_us': int(match.group(1)),
+                            'cumulative_us': int(match.group(2)), 'depth': len(match.group(3)) // 2})
+    return entries
+
+
+def package_times(entries):
+    """Self time added up per top-level package, largest first."""
+    totals = {}
+    for entry in entries:
+        package = entry['module'].split('.')[0]
+        totals[package] = totals.get(package, 0) + entry['self_us']
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def run(args):
+    samples = wall_time(args.module, args.repeat)
+    entries = import_times(args.module)
+    loaded = {entry['module'].split('.')[0] for entry in entries}
+    by_cumulative = sorted(entries, key=lambda entry: entry['cumulative_us'], reverse=True)
+    return {
+        'module': args.module,
+        'python': sys.version.split()[0],
+        'wall_ms': {
+            'median': round(statistics.median(samples) * 1000, 1),
+            'min': round(min(samples) * 1000, 1),
+            'max': round(max(samples) * 1000, 1),
+            'runs': len(samples),
+        },
+        'import_ms': round(sum(entry['self_us'] for entry in entries) / 1000, 1),
+        'modules_imported': len(entries),
+        'deferred_loaded': [name for name in DEFERRED_MODULES if name in loaded],
+        'top_cumulative': [{'module': entry['module'], 'cumulative_ms': round(entry['cumulative_us'] / 1000, 2),
+                            'self_ms': round(entry['self_us'] / 1000, 2)} for entry in by_cumulative[:args.top]],
+        'top_packages': [{'package': package, 'self_ms': round(total / 1000, 2)}
+                         for package, total in package_times(entries)[:args.top]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help='module to import (default: app)')
+    parser.add_argument('--repeat', type=int, default=5, help='plain imports timed for the wall time')
+    parser.add_argument('--top', type=int, default=20, help='rows in each table')
+    parser.add_argument('--max-ms', type=float, default=None,
+                        help='exit with status 1 when the median wall time exceeds this many milliseconds')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+
+    result = run(args)
+    failures = []
+    if args.max_ms is not None and result['wall_ms']['median'] > args.max_ms:
+        failures.append(f"median startup {result['wall_ms']['median']:.1f} ms exceeds {args.max_ms:.1f} ms")
+    if result['deferred_loaded']:
+        failures.append(f"imported at startup: {', '.join(result['deferred_loaded'])}")
+
+    if args.json:
+        print(json.dumps(dict(result, failures=failures), indent=2))
+    else:
+        wall = result['wall_ms']
+        print(f"import {result['module']}: median {wall['median']:.1f} ms over {wall['runs']} runs "
+              f"(min {wall['min']:.1f}, max {wall['max']:.1f}); "
+              f"{result['modules_imported']} modules, {result['import_ms']:.1f} ms in imports")
+        print()
+        header = f"{'module':<48}{'cumulative ms':>15}{'self ms':>10}"
+        print(header)
+        print('-' * len(header))
+        for entry in result['top_cumulative']:
+            print(f"{entry['module']:<48}{entry['cumulative_ms']:>15.2f}{entry['self_ms']:>10.2f}")
+        print()
+        header = f"{'package':<48}{'self ms':>10}"
+        print(header)
+        print('-' * len(header))
+        for entry in result['top_packages']:
+            print(f"{entry['package']:<48}{entry['self_ms']:>10.2f}")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark compiled tree ensembles against the sklearn models they come from.
+
+Fits decision tree, random forest and gradient boosting classifiers with the
+settings from ``get_classifier`` on synthetic data, compiles each one, checks
+that predictions and probabilities are identical, and times predict_proba at
+the batch sizes live capture produces.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_trees
+    python -m benchmarks.bench_trees --rows 20000 --features 40 --classes 3 --json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TREE_MODELS = ['decision_tree', 'random_forest', 'gradient_boosting']
+BATCH_SIZES = (1, 64, 1024)
+
+
+def time_calls(func, X, min_seconds=0.5, min_calls=5):
+    """Median seconds per call of ``func(X)``."""
+    func(X)  # warm-up
+    samples = []
+    deadline = time.perf_counter() + min_seconds
+    while len(samples) < min_calls or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        func(X)
+        samples.append(time.perf_counter() - started)
+    return float(np.median(samples))
+
+
+def run(args):
+    from sklearn.datasets import make_classification
+    from routes.train_model import get_classifier
+    from utils.tree_compiler import compile_model
+
+    X, y = make_classification(n_samples=args.rows, n_features=args.features, n_informative=args.features // 2,
+                               n_classes=args.classes, random_state=0)
+    split = int(len(X) * 0.8)
+    X_train, y_train, X_test = X[:split], y[:split], X[split:]
+    rng = np.random.default_rng(1)
+
+    results = []
+    for model_name in args.models:
+        model = get_classifier(model_name)
+        model.fit(X_train, y_train)
+        compiled = compile_model(model)
+
+        identical = bool(np.array_equal(model.predict(X_test), compiled.predict(X_test)) and
+                         np.array_equal(model.predict_proba(X_test), compiled.predict_proba(X_test)))
+        if not identical:
+            raise AssertionError(f"Compiled {model_name} does not match the sklearn model")
+
+        timings = {}
+        for size in args.batch_sizes:
+            batch = X_test[rng.integers(0, len(X_test), size)]
+            sklearn_s = time_calls(model.predict_proba, batch)
+            compiled_s = time_calls(compiled.predict_proba, batch)
+            timings[str(size)] = {
+                'sklearn_ms': round(sklearn_s * 1000, 3),
+                'compiled_ms': round(compiled_s * 1000, 3),
+                'speedup': round(sklearn_s / compiled_s, 1),
+            }
+        results.append({'model': model_name, 'trees': compiled.n_trees, 'nodes': compiled.n_nodes,
+                        'identical': identical, 'batches': timings})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--features', type=int, default=20)
+    parser.add_argument('--classes', type=int, default=2)
+    parser.add_argument('--models', default=','.join(TREE_MODELS), help='comma-separated tree model names')
+    parser.add_argument('--batch-sizes', default=','.join(str(size) for size in BATCH_SIZES))
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+    args.models = [name.strip() for name in args.models.split(',') if name.strip()]
+    unknown = [name for name in args.models if name not in TREE_MODELS]
+    if unknown:
+        parser.error(f"Not tree models: {', '.join(unknown)}")
+    args.batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+
+    results = run(args)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("predict_proba median ms per call; predictions and probabilities identical for every model")
+    header = f"{'model':<20}{'trees':>7}{'nodes':>9}{'batch':>7}{'sklearn ms':>12}{'compiled ms':>13}{'speedup':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        for size, t in r['batches'].items():
+            print(f"{r['model']:<20}{r['trees']:>7}{r['nodes']:>9}{size:>7}"
+                  f"{t['sklearn_ms']:>12.3f}{t['compiled_ms']:>13.3f}{t['speedup']:>8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,28 +1,68 @@
-from flask import Blueprint, jsonify, session
-import pandas as pd
-from utils.benford_utils import apply_benford_law
+from flask import Blueprint, jsonify, request, session
+from utils.benford_utils import benford_digit_counts_chunks, benford_selection
+from utils.dataset_store import dataset_exists, dataset_lock, dataset_shape, numeric_columns, iter_dataset_chunks
+from utils.job_queue import report_progress
+from utils.stage_cache import stage_cache, stage_key, dataset_digests, cache_info
+from routes.job_routes import wants_async, run_or_submit
 
 feature_selection_routes = Blueprint('feature_selection_routes', __name__)
 
-@feature_selection_routes.route('/feature_selection', methods=['POST'])
-def feature_selection():
-    dataset_path = session.get('dataset_path')
-    if not dataset_path:
-        return jsonify({"error": "No dataset uploaded"}), 400
+# Rows per chunk when streaming the dataset for Benford digit counts
+BENFORD_CHUNK_ROWS = 100000
 
-    dataset = pd.read_csv(dataset_path)
-    chi_results = apply_benford_law(dataset)
+def run_feature_selection(dataset_name, chunksize=BENFORD_CHUNK_ROWS):
+    """Benford feature selection on a stored dataset; returns (payload, status code)"""
+    # The digit counts depend only on the data, not on the chunk size
+    inputs = dataset_digests([dataset_name])
+    key = stage_key('feature_selection', inputs)
+    hit = stage_cache.fetch('feature_selection', key)
+    if hit is not None:
+        return {**hit[0], "cache": cache_info(key, True)}, 200
 
-    if "error" in chi_results:
-        return jsonify(chi_results), 400
+    total_rows = max(1, dataset_shape(dataset_name)[0])
 
-    selected_features = chi_results["selected_features"]  # Store selected features
-    session['selected_features'] = selected_features
+    def chunks_with_progress(chunks):
+        done = 0
+        for chunk in chunks:
+            yield chunk
+            done += len(chunk)
+            report_progress(done / total_rows, f"Counted leading digits of {done} rows")
+
+    # Stream only the numeric columns so memory stays bounded by the chunk size, not the dataset size
+    columns = [col for col in numeric_columns(dataset_name) if col != 'Label']
+    chunks = iter_dataset_chunks(dataset_name, columns=columns, chunksize=max(1, chunksize))
+    chi_results = benford_selection(*benford_digit_counts_chunks(columns, chunks_with_progress(chunks)))
+
+    if "error" in chi_results:
+        return chi_results, 400
 
-    return jsonify({
+    payload = {
         "message": "Feature Selection Done",
         "mean_threshold": chi_results["mean_threshold"],
         "median_threshold": chi_results["median_threshold"],
-        "selected_features": selected_features,
+        "selected_features": chi_results["selected_features"],
         "results": chi_results["chi_stats"]
-    })
\ No newline at end of file
+    }
+    stage_cache.put('feature_selection', key, payload, inputs=inputs)
+    return {**payload, "cache": cache_info(key, False)}, 200
+
+@feature_selection_routes.route('/feature_selection', methods=['POST'])
+def feature_selection():
+    dataset_name = session.get('dataset_name')
+    if not dataset_name or not dataset_exists(dataset_name):
+        return jsonify({"error": "No dataset uploaded"}), 400
+
+    try:
+        chunksize = int(request.form.get('chunksize', BENFORD_CHUNK_ROWS))
+    except ValueError:
+        return jsonify({"error": "chunksize must be an integer"}), 400
+
+    if wants_async():
+        return run_or_submit('feature_selection', run_feature_selection,
+                             dataset_name=dataset_name, chunksize=chunksize)
+
+    with dataset_lock(exclusive=False):
+        payload, status_code = run_feature_selection(dataset_name, chunksize)
+    if status_code == 200:
+        session['selected_features'] = payload["selected_features"]  # Store selected features
+    return jsonify(payload), status_code
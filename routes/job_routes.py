@@ -0,0 +1,58 @@
+from flask import Blueprint, jsonify, request, url_for
+import functools
+from utils.dataset_store import with_dataset_lock
+from utils.job_queue import job_queue
+from utils.stage_cache import stage_cache
+
+job_routes = Blueprint('job_routes', __name__)
+
+# Pipeline steps that rewrite the stored splits; every other step only reads them
+DATASET_WRITERS = ('preprocess', 'normalize')
+
+def wants_async():
+    return str(request.args.get('async', request.form.get('async', ''))).lower() in ('1', 'true', 'yes')
+
+def run_or_submit(kind, func, **params):
+    """Run a pipeline step inline, or as a background job when the client asks for ?async=1
+
+    Either way the step holds the dataset store lock while it runs, exclusively
+    if it rewrites the splits, so steps never see each other's half-written output.
+    """
+    func = functools.partial(with_dataset_lock, func, kind in DATASET_WRITERS)
+    if not wants_async():
+        payload, status_code = func(**params)
+        return jsonify(payload), status_code
+
+    try:
+        job = job_queue.submit(kind, func, **params)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 429
+    return jsonify({
+        "message": f"{kind.replace('_', ' ').capitalize()} job submitted",
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": url_for('job_routes.job_status', job_id=job.id)
+    }), 202
+
+@job_routes.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+@job_routes.route('/jobs', methods=['GET'])
+def list_jobs():
+    return jsonify({
+        "jobs": job_queue.list(),
+        **job_queue.stats()
+    })
+
+@job_routes.route('/stage_cache', methods=['GET'])
+def stage_cache_stats():
+    return jsonify(stage_cache.stats())
+
+@job_routes.route('/stage_cache/clear', methods=['POST'])
+def clear_stage_cache():
+    stage_cache.clear()
+    return jsonify({"message": "Stage cache cleared", **stage_cache.stats()})
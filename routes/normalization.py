@@ -1,53 +1,86 @@
-from flask import Blueprint, request, jsonify, session
-import pandas as pd
-import os
-from sklearn.preprocessing import MinMaxScaler, StandardScaler, QuantileTransformer
+from flask import Blueprint, request, jsonify
+from utils.pipeline_utils import PreprocessingPipeline, make_scaler
+from utils.dataset_store import dataset_exists, load_dataset, save_dataset
+from utils.job_queue import report_progress
+from utils.stage_cache import stage_cache, stage_key, dataset_digests, cache_info
+from routes.job_routes import run_or_submit
 
 normalization_routes = Blueprint('normalization_routes', __name__)
 
 @normalization_routes.route('/normalize', methods=['POST'])
 def normalize():
     normalization_type = request.form.get('normalization_type', 'minmax')
+    try:
+        make_scaler(normalization_type)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return run_or_submit('normalize', run_normalize, normalization_type=normalization_type)
+
+def run_normalize(normalization_type='minmax'):
+    """Fit the scaler on train and apply it to every split; returns (payload, status code)"""
     datasets = ["train", "validation", "test"]
-    results = []
     dimensions = {}
+    features = []
+
+    if not dataset_exists("train"):
+        return {"error": "Train dataset not found. The scaler is fitted on it."}, 400
+
+    # Reuse the drop list from /preprocess when there is one
+    pipeline = PreprocessingPipeline.load() or PreprocessingPipeline()
+
+    # Same splits, columns and method as a previous run: its scaler and normalized splits are reused
+    inputs = dataset_digests(datasets)
+    params = {"normalization_type": normalization_type, "feature_names": pipeline.feature_names}
+    key = stage_key('normalize', inputs, params)
+    hit = stage_cache.fetch('normalize', key, restore=True)
+    if hit is not None:
+        report_progress(0.5, "Restoring cached normalization results")
+        cached, restored = hit
+        cached['pipeline'].save()
+        return {**cached['payload'], "cache": cache_info(key, True, restored)}, 200
 
-    for dataset_name in datasets:
-        dataset_path = os.path.join('uploads', f"{dataset_name}.csv")
-        if not os.path.exists(dataset_path):
+    written = []
+    failed = False
+
+    for index, dataset_name in enumerate(datasets):
+        report_progress(index / len(datasets), f"Normalizing {dataset_name} dataset")
+        if not dataset_exists(dataset_name):
             dimensions[f"{dataset_name}_dimensions"] = "N/A"
             continue
 
         try:
-            dataset = pd.read_csv(dataset_path)
-            
-            # Get features (excluding Label)
-            features = [col for col in dataset.columns if col != 'Label']
-            
-            if normalization_type == "minmax":
-                scaler = MinMaxScaler()
-            elif normalization_type == "standard":
-                scaler = StandardScaler()
-            elif normalization_type == "quantile":
-                scaler = QuantileTransformer(output_distribution='normal')
-            else:
-                return jsonify({"error": "Invalid normalization type"}), 400
+            # Only the columns the pipeline keeps are read from the store
+            columns = pipeline.feature_names + ['Label'] if pipeline.feature_names else None
+            dataset = pipeline.drop(load_dataset(dataset_name, columns=columns))
+
+            # The scaler is fitted on train only; validation and test reuse it
+            if dataset_name == "train":
+                pipeline.fit_scaler(dataset, normalization_type)
+                pipeline.save()
+            features = pipeline.feature_names
 
             # Normalize features
-            dataset[features] = scaler.fit_transform(dataset[features])
+            dataset = pipeline.scale(dataset)
             
             # Save normalized dataset
-            normalized_path = os.path.join('uploads', f"{dataset_name}_normalized.csv")
-            dataset.to_csv(normalized_path, index=False)
+            save_dataset(dataset, f"{dataset_name}_normalized")
+            written.append(f"{dataset_name}_normalized")
             
             dimensions[f"{dataset_name}_dimensions"] = f"{dataset.shape[0]} rows, {dataset.shape[1]} columns"
             
         except Exception as e:
             dimensions[f"{dataset_name}_dimensions"] = "N/A"
+            failed = True
+            if dataset_name == "train":
+                return {"error": f"Normalization failed on the train dataset: {str(e)}", **dimensions}, 500
             continue
 
-    return jsonify({
+    payload = {
         "message": f"Normalization completed successfully using {normalization_type} method",
         **dimensions,
         "columns": features
-    })
\ No newline at end of file
+    }
+    if not failed:
+        stage_cache.put('normalize', key, {'payload': payload, 'pipeline': pipeline}, datasets=written,
+                        inputs=inputs, params=params)
+    return {**payload, "cache": cache_info(key, False)}, 200
@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify
-import pandas as pd
-import os
 import logging
-from utils.correlated_utils import CORRELATED
+from utils.pipeline_utils import PreprocessingPipeline
+from utils.dataset_store import dataset_exists, dataset_path, load_dataset, save_dataset
+from utils.job_queue import report_progress
+from utils.stage_cache import stage_cache, stage_key, dataset_digests, cache_info
+from routes.job_routes import run_or_submit
 
 preprocess_routes = Blueprint('preprocess_routes', __name__)
 
@@ -11,14 +13,39 @@ logging.basicConfig(level=logging.DEBUG)
     
 @preprocess_routes.route('/preprocess', methods=['POST'])
 def preprocess():
+    return run_or_submit('preprocess', run_preprocess)
+
+def run_preprocess():
+    """Drop NA rows and train-learned correlated columns from every split; returns (payload, status code)"""
     datasets = ["train", "validation", "test"]
     results = []
     dimensions = {}
 
-    for dataset_name in datasets:
-        dataset_path = os.path.join('uploads', f"{dataset_name}.csv")
-        if not os.path.exists(dataset_path):
-            logging.warning(f"{dataset_name.capitalize()} dataset not found at {dataset_path}")
+    if not dataset_exists("train"):
+        logging.warning(f"Train dataset not found at {dataset_path('train')}")
+        return {"error": "Train dataset not found. The column drop list is learned from it."}, 400
+
+    # Same splits as a previous run, or the output of one: its drop list and splits are reused
+    inputs = dataset_digests(datasets)
+    key = stage_key('preprocess', inputs)
+    hit = stage_cache.fetch('preprocess', key, restore=True)
+    if hit is not None:
+        report_progress(0.5, "Restoring cached preprocessing results")
+        cached, restored = hit
+        cached['pipeline'].save()
+        return {**cached['payload'], "cache": cache_info(key, True, restored)}, 200
+
+    # The drop list is learned from train only and applied to every split,
+    # so all three keep exactly the same columns
+    pipeline = PreprocessingPipeline()
+    removed_features = None
+    written = []
+    failed = False
+
+    for index, dataset_name in enumerate(datasets):
+        report_progress(index / len(datasets), f"Preprocessing {dataset_name} dataset")
+        if not dataset_exists(dataset_name):
+            logging.warning(f"{dataset_name.capitalize()} dataset not found at {dataset_path(dataset_name)}")
             results.append(f"{dataset_name.capitalize()} dataset not found.")
             dimensions[f"{dataset_name}_dimensions"] = "N/A"
             dimensions[f"{dataset_name}_missing"] = "N/A"
@@ -26,10 +53,7 @@ def preprocess():
 
         try:
             # Load the dataset
-            dataset = pd.read_csv(dataset_path)
-            
-            # Store original dimensions
-            original_rows, original_cols = dataset.shape
+            dataset = load_dataset(dataset_name)
             
             # Replace missing values
             missing_before = dataset.isnull().sum().sum()
@@ -37,10 +61,14 @@ def preprocess():
             missing_after = dataset.isnull().sum().sum()
             
             # Apply correlation-based feature elimination
-            dataset, removed_features = CORRELATED(dataset)
+            if dataset_name == "train":
+                removed_features = pipeline.fit_drop_list(dataset)
+                pipeline.save()
+            dataset = pipeline.drop(dataset)
             
             # Save the preprocessed dataset
-            dataset.to_csv(dataset_path, index=False)
+            save_dataset(dataset, dataset_name)
+            written.append(dataset_name)
             
             # Store results
             results.append(f"{dataset_name.capitalize()} Dataset Preprocessed: {dataset.shape[0]} rows, {dataset.shape[1]} columns.")
@@ -53,9 +81,19 @@ def preprocess():
             results.append(f"{dataset_name.capitalize()} Dataset Preprocessing Failed: {str(e)}")
             dimensions[f"{dataset_name}_dimensions"] = "N/A"
             dimensions[f"{dataset_name}_missing"] = "N/A"
+            failed = True
+            if dataset_name == "train":
+                # Without a drop list from train the other splits cannot be processed consistently
+                break
 
-    return jsonify({
+    payload = {
         "message": "Preprocessing completed successfully!",
         "details": results,
+        "removed_features": removed_features,
         **dimensions
-    })
+    }
+    # A run where a split failed is not cached, so a retry computes it again
+    if written and not failed:
+        stage_cache.put('preprocess', key, {'payload': payload, 'pipeline': pipeline}, datasets=written,
+                        aliases=[stage_key('preprocess', dataset_digests(datasets))], inputs=inputs)
+    return {**payload, "cache": cache_info(key, False)}, 200
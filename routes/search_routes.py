@@ -0,0 +1,278 @@
+from flask import Blueprint, jsonify, request
+import os
+import json
+import time
+import tempfile
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from routes.train_model import (MODEL_NAMES, N_JOBS_MODELS, get_classifier, training_splits, load_splits,
+                                save_model, profile_saved_model)
+from utils.search_utils import (DEFAULT_SEARCH_SPACES, LATENCY_BATCH_ROWS, validate_space, sample_configs,
+                                halving_schedule, objective, batch_latency_ms)
+from utils.job_queue import report_progress
+from routes.job_routes import run_or_submit
+
+search_routes = Blueprint('search_routes', __name__)
+
+# Search budgets and objective when the request sets none
+DEFAULT_MAX_CONFIGS = 20
+DEFAULT_TIME_BUDGET = 300.0
+DEFAULT_ETA = 3
+DEFAULT_MIN_ROWS = 1000
+# Validation accuracy traded for each millisecond of latency on a LATENCY_BATCH_ROWS batch
+DEFAULT_LATENCY_WEIGHT = 0.01
+
+def search_results_path(model_name):
+    """Winner and history of the last /search run for a model"""
+    return os.path.join('models', f"search_{model_name}.json")
+
+def evaluate_config(model_name, params, data_path, rows, cpus, model_path=None):
+    """Worker for /search: fit one configuration on the first ``rows`` training rows and measure it"""
+    import joblib
+    from sklearn.metrics import accuracy_score
+    from threadpoolctl import threadpool_limits
+
+    # Arrays are memory-mapped read-only, so every worker shares the same pages
+    data = joblib.load(data_path, mmap_mode='r')
+    classifier = get_classifier(model_name, **params)
+    if model_name in N_JOBS_MODELS:
+        classifier.set_params(n_jobs=cpus)
+
+    with threadpool_limits(limits=cpus):
+        started = time.perf_counter()
+        classifier.fit(data['X_train'][:rows], data['y_train'][:rows])
+        fit_seconds = time.perf_counter() - started
+        validation_accuracy = accuracy_score(data['y_validation'], classifier.predict(data['X_validation']))
+
+    # Latency as the live predictor sees it: one thread, one micro-batch
+    if model_name in N_JOBS_MODELS:
+        classifier.set_params(n_jobs=None)
+    with threadpool_limits(limits=1):
+        latency_ms = batch_latency_ms(classifier, data['X_validation'])
+
+    if model_path:
+        joblib.dump(classifier, model_path)
+    return {
+        "validation_accuracy": round(float(validation_accuracy), 4),
+        "latency_ms": round(latency_ms, 4),
+        "fit_seconds": round(fit_seconds, 3)
+    }
+
+def stop_pool(executor, terminate=False):
+    """Shut a process pool down; with ``terminate`` fits still running are killed rather than awaited"""
+    processes = list((executor._processes or {}).values()) if terminate else []
+    executor.shutdown(wait=not terminate, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+
+def run_search(model_name, space, max_configs=DEFAULT_MAX_CONFIGS, time_budget=DEFAULT_TIME_BUDGET,
+               eta=DEFAULT_ETA, min_rows=DEFAULT_MIN_ROWS, latency_weight=DEFAULT_LATENCY_WEIGHT, seed=42):
+    """Successive-halving search over ``space``; saves and registers the winner, returns (payload, status code)
+
+    Each round fits the surviving configurations in parallel on a growing
+    prefix of the shuffled train split, scores them by validation accuracy
+    minus ``latency_weight`` per millisecond of batch latency, and keeps the
+    best 1/eta. When ``time_budget`` runs out, fits still running are
+    killed and the last completed round decides; its winner is saved as
+    fitted on that round's rows rather than refitted on the full split, so
+    the budget bounds the whole search.
+    """
+    import joblib
+    import numpy as np
+    from sklearn.metrics import accuracy_score
+
+    try:
+        searched_at = time.time()
+        deadline = time.monotonic() + time_budget
+        pipeline, suffix, error = training_splits()
+        if error:
+            return error, 400
+
+        report_progress(0.02, "Loading datasets")
+        data, feature_names = load_splits(suffix)
+        # Growing subsamples are prefixes of one shuffled order
+        order = np.random.default_rng(seed).permutation(len(data['y_train']))
+        data['X_train'], data['y_train'] = data['X_train'][order], data['y_train'][order]
+        n_rows = len(data['y_train'])
+
+        configs = sample_configs(space, max_configs, seed)
+        schedule = halving_schedule(len(configs), n_rows, eta, min_rows)
+        planned = sum(count for count, _ in schedule)
+
+        cores = os.cpu_count() or 1
+        workers = max(1, min(len(configs), cores))
+        cpus = max(1, cores // workers)
+
+        trials = []
+        decided = []  # scored trials of the last completed round, best first
+        stopped = None
+        with tempfile.TemporaryDirectory(prefix='search-') as tmp_dir:
+            # Dumped once; workers memory-map it instead of each receiving a pickled copy
+            data_path = os.path.join(tmp_dir, 'splits.joblib')
+            joblib.dump(data, data_path)
+            del data
+
+            alive = list(range(len(configs)))
+            context = multiprocessing.get_context('spawn')
+            executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            try:
+                for round_index, (count, rows) in enumerate(schedule):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        stopped = 'time_budget'
+                        break
+                    candidates = alive[:count]
+                    futures = {}
+                    for config_id in candidates:
+                        # Every fitted model is kept: the winner of a round cut short is saved as it is
+                        model_path = os.path.join(tmp_dir, f"config-{config_id}-round-{round_index + 1}.joblib")
+                        future = executor.submit(evaluate_config, model_name, configs[config_id], data_path,
+                                                 rows, cpus, model_path)
+                        futures[future] = (config_id, model_path)
+
+                    results = []
+                    try:
+                        for future in as_completed(futures, timeout=remaining):
+                            config_id, model_path = futures[future]
+                            trial = {"config": config_id, "params": configs[config_id],
+                                     "round": round_index + 1, "rows": rows}
+                            try:
+                                trial.update(future.result())
+                                trial["score"] = round(objective(trial["validation_accuracy"], trial["latency_ms"],
+                                                                 latency_weight), 6)
+                                trial["model_path"] = model_path
+                            except Exception as e:
+                                trial.update({"error": str(e), "score": None})
+                            trials.append(trial)
+                            results.append(trial)
+                            report_progress(0.05 + 0.8 * len(trials) / planned,
+                                            f"Round {round_index + 1}/{len(schedule)}: {len(results)}/{len(candidates)} "
+                                            f"configurations on {rows} rows")
+                    except FuturesTimeoutError:
+                        stopped = 'time_budget'
+
+                    scored = sorted((trial for trial in results if trial["score"] is not None),
+                                    key=lambda trial: trial["score"], reverse=True)
+                    # A round cut short only decides when no earlier round did
+                    if stopped:
+                        decided = decided or scored
+                        break
+                    decided = scored
+                    alive = [trial["config"] for trial in scored]
+                    if not alive:
+                        break
+            finally:
+                stop_pool(executor, terminate=stopped is not None)
+
+            if not decided:
+                return {
+                    "error": "No configuration finished within the time budget" if stopped
+                             else "Every configuration failed to train",
+                    "history": trials
+                }, 400
+
+            winner = decided[0]
+            classifier = joblib.load(winner["model_path"])
+            splits = joblib.load(data_path, mmap_mode='r')
+
+            report_progress(0.9, "Evaluating the winner on the test split")
+            test_accuracy = accuracy_score(splits['y_test'], classifier.predict(splits['X_test']))
+            model_path, compiled_path, preprocessing_path, manifest = save_model(
+                classifier, model_name, pipeline, feature_names)
+            profile = profile_saved_model(model_path, splits['X_test'])
+            del splits
+
+        for trial in trials:
+            trial.pop("model_path", None)
+
+        result = {
+            "message": f"Searched {len(configs)} {model_name} configurations in {len(trials)} trials",
+            "model": model_name,
+            "winner": {key: winner[key] for key in ("config", "params", "rows", "validation_accuracy",
+                                                    "latency_ms", "score")},
+            "test_accuracy": round(float(test_accuracy), 4),
+            "trained_rows": winner["rows"],
+            "full_train_split": winner["rows"] == n_rows,
+            "objective": {"latency_weight": latency_weight, "latency_batch_rows": LATENCY_BATCH_ROWS},
+            "budget": {
+                "max_configs": max_configs,
+                "time_budget_s": time_budget,
+                "eta": eta,
+                "min_rows": min_rows,
+                "elapsed_s": round(time.time() - searched_at, 3),
+                "stopped": stopped or "completed"
+            },
+            "space": space,
+            "schedule": [{"round": index + 1, "configs": count, "rows": rows}
+                         for index, (count, rows) in enumerate(schedule)],
+            "history": trials,
+            "normalized": bool(suffix),
+            "workers": workers,
+            "cpus_per_model": cpus,
+            "model_path": model_path,
+            "preprocessing_path": preprocessing_path,
+            "compiled_model_path": compiled_path,
+            "registry_version": manifest["version"],
+            "sha256": manifest["sha256"],
+            "profile": profile,
+            "searched_at": searched_at
+        }
+        os.makedirs('models', exist_ok=True)
+        with open(search_results_path(model_name), 'w') as f:
+            json.dump(result, f, indent=2)
+        return result, 200
+
+    except Exception as e:
+        return {
+            "error": f"Error searching {model_name} parameters: {str(e)}",
+            "traceback": traceback.format_exc()
+        }, 500
+
+@search_routes.route('/search', methods=['POST'])
+def search():
+    options = request.get_json(silent=True) or {}
+
+    def option(name, default):
+        return options.get(name, request.args.get(name, request.form.get(name, default)))
+
+    model_name = option('model', '')
+    if model_name not in MODEL_NAMES:
+        return jsonify({
+            "error": f"Invalid model specified. Available models: {', '.join(MODEL_NAMES)}"
+        }), 400
+
+    space = options.get('space') or DEFAULT_SEARCH_SPACES.get(model_name)
+    try:
+        validate_space(space)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    unknown = sorted(set(space) - set(get_classifier(model_name).get_params()))
+    if unknown:
+        return jsonify({"error": f"Unknown parameters for {model_name}: {', '.join(unknown)}"}), 400
+
+    try:
+        max_configs = int(option('max_configs', DEFAULT_MAX_CONFIGS))
+        time_budget = float(option('time_budget', DEFAULT_TIME_BUDGET))
+        eta = int(option('eta', DEFAULT_ETA))
+        min_rows = int(option('min_rows', DEFAULT_MIN_ROWS))
+        latency_weight = float(option('latency_weight', DEFAULT_LATENCY_WEIGHT))
+    except (TypeError, ValueError):
+        return jsonify({"error": "max_configs, time_budget, eta, min_rows and latency_weight must be numbers"}), 400
+    if max_configs < 1 or time_budget <= 0 or eta < 2 or min_rows < 1 or latency_weight < 0:
+        return jsonify({"error": "Need max_configs >= 1, time_budget > 0, eta >= 2, min_rows >= 1 "
+                                 "and latency_weight >= 0"}), 400
+
+    return run_or_submit('search', run_search, model_name=model_name, space=space, max_configs=max_configs,
+                         time_budget=time_budget, eta=eta, min_rows=min_rows, latency_weight=latency_weight)
+
+@search_routes.route('/search/<model_name>', methods=['GET'])
+def search_results(model_name):
+    path = search_results_path(model_name)
+    if model_name not in MODEL_NAMES or not os.path.exists(path):
+        return jsonify({"error": f"No search results for {model_name}. Run /search first."}), 404
+    with open(path) as f:
+        return jsonify(json.load(f))
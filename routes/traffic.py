@@ -1,22 +1,29 @@
-from flask import Blueprint, jsonify, request, render_template, send_file
-from scapy.all import sniff, IP, TCP, conf
-import csv
+from flask import Blueprint, jsonify, request, render_template, send_file, Response, stream_with_context
 import os
+import functools
 import threading
+import time
 from datetime import datetime
-from collections import deque
-import pickle
-import pandas as pd
+from collections import OrderedDict
+from utils.capture_writer import CaptureWriter
+from utils.capture_session import CaptureSession
+from utils.inference_utils import (VerdictCache, VERDICT_CACHE_SIZE, VERDICT_CACHE_TTL, VERDICT_CACHE_REVALIDATE,
+                                   VERDICT_CACHE_RESOLUTION, VERDICT_CACHE_COARSE_RESOLUTION)
+from utils.traffic_stats import (TrafficStats, WINDOW_SECONDS, ALERT_SYN_RATIO, ALERT_SOURCES, EWMA_ALPHA,
+                                 EWMA_K)
+from utils.perf_utils import load_profile
+from utils.pipeline_utils import PreprocessingPipeline, model_pipeline_path
+from utils.tree_compiler import CompiledTreeEnsemble, source_model_path
+from utils.model_registry import registry as model_registry
+from utils.fanout import FanoutCapture, FrameRing, RING_POLL_INTERVAL, WORKER_STATS_INTERVAL
+from utils.capture_filter import MIN_SNAPLEN, MAX_SNAPLEN, PacketSampler, bpf_instructions, interface_linktype
+from utils.replay_utils import replay_source, resolve_pcap_path
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
 import io
+import json
+import queue
 import base64
-import joblib
 import tempfile
-import shutil
-import sklearn
 import logging
 
 # Set up logging
@@ -26,90 +33,154 @@ logger = logging.getLogger(__name__)
 traffic = Blueprint('traffic', __name__)
 
 # Global variables
-is_monitoring = False
-csv_file = 'network_traffic_features.csv'
-packet_queue = deque(maxlen=1000)
-prediction_queue = deque(maxlen=100)
-capture_thread = None
-loaded_model = None
+# Captures are written under uploads/ with the other runtime data, never over files in the repository
+CAPTURE_FOLDER = os.path.join('uploads', 'captures')
+csv_file = os.path.join(CAPTURE_FOLDER, 'network_traffic_features.csv')
+active_model = None  # LoadedModel from the registry; swapped as a single reference
 model_loaded = False
-graph_data = deque(maxlen=50)
 model_classes = ['Benign', 'DDoS']  # Default class labels
+graph_lock = threading.Lock()  # one render at a time; capture never takes it
+
+# Capture sessions by id in start order. Request handlers pick one with
+# ?session=<id>, by default the newest running one (or the newest at all)
+sessions = OrderedDict()
+# Re-entrant so start_capture can hold it across its busy checks and the registration
+sessions_lock = threading.RLock()
+
+# Finished sessions kept so their results can still be viewed and downloaded
+MAX_FINISHED_SESSIONS = 8
+
+# Streaming clients get at most one event per interval, and a keepalive when idle.
+# Waits are short so a stream that follows the newest session notices a new one quickly
+STREAM_MIN_INTERVAL = 0.25
+STREAM_KEEPALIVE = 15.0
+STREAM_MAX_EVENTS = 200
+STREAM_POLL_INTERVAL = 1.0
+
+# Micro-batching defaults for the inference worker (overridable per capture)
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_LATENCY_MS = 50
+INFERENCE_QUEUE_CAPACITY = 10000
+
+# Upper bound for the 'workers' option of start_capture (0 keeps everything in this process)
+MAX_CAPTURE_WORKERS = 2 * (os.cpu_count() or 1)
+
+# Packet rate a loaded model is expected to keep up with (rows/s), unless load_model is told otherwise
+EXPECTED_PACKET_RATE = 1000
+
+# Capture file buffering and rotation defaults
+WRITER_FLUSH_ROWS = 1000
+WRITER_FLUSH_INTERVAL = 1.0
+WRITER_ROTATE_MB = 100
+# Rows buffered for the capture file while the disk is slow; further rows are dropped and counted
+WRITER_CAPACITY = 100000
+
+# Feature order used for models that were not fitted with feature names
+FALLBACK_FEATURES = ['packet_length', 'src_port', 'dst_port', 'window_size', 'protocol']
 
 def select_network_interface():
     """Select the most appropriate network interface"""
+    # Enumerating interfaces is slow, so it waits for the first live capture
+    from scapy.all import conf
+
     for iface in conf.ifaces:
         iface_name = conf.ifaces[iface].name
         if 'Ethernet' in iface_name or 'Wi-Fi' in iface_name or 'eth' in iface_name.lower():
             return iface_name
     return conf.ifaces.dev_from_index(0).name if conf.ifaces else None
 
-def predict_traffic(packet_features):
+def classify_features(features_array, model, pipeline=None):
+    """Classify a feature array (one row per packet, in the model's feature order) with a single model call.
+
+    Returns a list of (label, confidence) tuples, one per row.
+    """
+    if pipeline is not None:
+        # Same scaling the model was trained with, applied to the whole batch at once
+        features_array = pipeline.transform_array(features_array)
+
+    count = len(features_array)
+    if hasattr(model, 'predict_proba'):
+        # One predict_proba call gives both the label (argmax) and its confidence
+        proba = model.predict_proba(features_array)
+        best = proba.argmax(axis=1)
+        confidences = proba[np.arange(count), best]
+        classes = getattr(model, 'classes_', None)
+        predictions = classes[best] if classes is not None else best
+    else:
+        predictions = model.predict(features_array)
+        if hasattr(model, 'decision_function'):
+            decision = np.abs(model.decision_function(features_array))
+            confidences = decision.max(axis=1) if decision.ndim > 1 else decision
+        else:
+            confidences = np.zeros(count)
+
+    results = []
+    for prediction, confidence in zip(predictions, confidences):
+        if isinstance(prediction, str):
+            label = prediction
+        elif not hasattr(model, 'classes_') and 0 <= int(prediction) < len(model_classes):
+            # Default to our class labels
+            label = model_classes[int(prediction)]
+        else:
+            label = str(prediction)
+        results.append((label, float(confidence)))
+    return results
+
+def predict_batch(rows, active=None, cache=None):
+    """Classify a batch of feature rows with a single model call.
+
+    With a ``VerdictCache`` only rows without a cached verdict reach the
+    model. Returns a list of (label, confidence) tuples, one per row.
+    """
+    # The active model is read once per batch: a model activated meanwhile
+    # takes over from the next batch, never halfway through this one
+    active = active or active_model
+    if active is None:
+        return [("No model loaded", 0.0)] * len(rows)
+
+    # Prepare features in the order expected by the model
+    feature_names = active.feature_names or FALLBACK_FEATURES
+    features_array = np.array(
+        [[row.get(name, 0) for name in feature_names] for row in rows], dtype=float
+    )
+    if cache is None:
+        return classify_features(features_array, active.model, active.pipeline)
+    return cache.classify(rows, features_array, active,
+                          lambda features: classify_features(features, active.model, active.pipeline))
+
+def predict_traffic(packet_features, active=None):
     """Predict traffic type using loaded model and return prediction with confidence"""
-    if not model_loaded or loaded_model is None:
+    if (active or active_model) is None:
         return "No model loaded", 0.0
-    
+
     try:
-        # Prepare features in the order expected by the model
-        features = []
-        if hasattr(loaded_model, 'feature_names_in_'):
-            # If model has feature names, use them to order the features
-            for feature_name in loaded_model.feature_names_in_:
-                features.append(packet_features.get(feature_name, 0))
-        else:
-            # Fallback to using all available features in packet_features
-            for key in packet_features:
-                if key not in ['timestamp', 'source_ip', 'destination_ip', 'prediction', 'confidence']:
-                    features.append(packet_features[key])
-        
-        features_array = np.array(features).reshape(1, -1)
-        
-        # Get prediction
-        prediction = loaded_model.predict(features_array)[0]
-        
-        # Get confidence scores if available
-        confidence = 0.0
-        if hasattr(loaded_model, 'predict_proba'):
-            proba = loaded_model.predict_proba(features_array)[0]
-            confidence = max(proba)  # Use the highest class probability
-        elif hasattr(loaded_model, 'decision_function'):
-            decision = loaded_model.decision_function(features_array)[0]
-            confidence = float(abs(decision))  # Use absolute value of decision function
-        
-        # Use model's classes if available
-        if hasattr(loaded_model, 'classes_'):
-            try:
-                predicted_label = loaded_model.classes_[prediction]
-            except IndexError:
-                predicted_label = str(prediction)
-        else:
-            # Default to our class labels
-            predicted_label = model_classes[prediction] if prediction < len(model_classes) else str(prediction)
-        
-        return predicted_label, confidence
+        return predict_batch([packet_features], active)[0]
     except Exception as e:
         logger.error(f"Prediction error: {str(e)}")
         return "Prediction error", 0.0
 
-def generate_graph():
+def generate_graph(points):
     """Generate visualization graph showing Benign vs DDoS traffic"""
-    if not graph_data:
+    if not points:
         return None
-    
-    plt.figure(figsize=(12, 6))
-    timestamps = [d['timestamp'] for d in graph_data]
-    lengths = [d['length'] for d in graph_data]
-    predictions = [d['prediction'] for d in graph_data]
-    confidences = [d['confidence'] for d in graph_data]
-    
+
+    timestamps = [d['timestamp'] for d in points]
+    lengths = [d['length'] for d in points]
+    predictions = [d['prediction'] for d in points]
+    confidences = [d['confidence'] for d in points]
+
     try:
         times = [datetime.strptime(ts, "%Y-%m-%dT%H:%M:%S.%f") for ts in timestamps]
     except ValueError:
         times = [datetime.strptime(ts.split('.')[0], "%Y-%m-%dT%H:%M:%S") for ts in timestamps]
-    
-    # Create figure and primary axis
-    fig, ax1 = plt.subplots(figsize=(12, 6))
-    
+
+    # A standalone figure: nothing is registered with pyplot, so nothing can leak
+    # and request threads do not share pyplot's global state
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(12, 6))
+    ax1 = fig.subplots()
+
     # Plot packet sizes with color based on prediction
     colors = []
     for pred in predictions:
@@ -117,173 +188,665 @@ def generate_graph():
             colors.append('red')
         else:
             colors.append('green')
-    
+
     ax1.scatter(times, lengths, c=colors, alpha=0.6, label='Packet Size')
     ax1.set_xlabel('Time')
     ax1.set_ylabel('Packet Size (bytes)')
     ax1.grid(True, linestyle='--', alpha=0.6)
-    
+
     # Create secondary axis for confidence
     ax2 = ax1.twinx()
-    
+
     # Plot confidence scores
     ax2.plot(times, confidences, 'b-', alpha=0.4, label='Confidence')
     ax2.set_ylabel('Confidence Score', color='b')
     ax2.tick_params('y', colors='b')
     ax2.set_ylim(0, 1.1)
-    
+
     # Add legend
     lines1, labels1 = ax1.get_legend_handles_labels()
     lines2, labels2 = ax2.get_legend_handles_labels()
     ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
-    
+
     # Add title
-    plt.title('Network Traffic Analysis - Benign (Green) vs DDoS (Red)')
-    
+    ax1.set_title('Network Traffic Analysis - Benign (Green) vs DDoS (Red)')
+
     # Add horizontal lines for thresholds
     ax1.axhline(y=1500, color='orange', linestyle='--', alpha=0.3, label='Jumbo Frame Threshold')
-    
+
     # Tight layout
     fig.tight_layout()
-    
+
     # Save to buffer
     buf = io.BytesIO()
-    plt.savefig(buf, format='png', dpi=100)
-    buf.seek(0)
-    plt.close()
-    
-    return base64.b64encode(buf.read()).decode('utf-8')
-
-def process_packet(packet):
-    """Process each captured packet and extract features"""
-    if IP in packet:
-        # Initialize with basic features we can always extract
-        row = {
-            'timestamp': datetime.now().isoformat(),
-            'source_ip': packet[IP].src,
-            'destination_ip': packet[IP].dst,
-            'packet_length': len(packet),
-            'protocol': packet[IP].proto,
-        }
-        
-        # Add TCP-specific features if available
-        if TCP in packet:
-            row.update({
-                'src_port': packet[TCP].sport,
-                'dst_port': packet[TCP].dport,
-                'window_size': packet[TCP].window,
-                'flags': packet[TCP].flags
-            })
-        
-        if model_loaded:
-            # Get prediction and confidence
-            prediction, confidence = predict_traffic(row)
-            row['prediction'] = prediction
-            row['confidence'] = confidence
-        else:
-            row['prediction'] = "No model"
-            row['confidence'] = 0.0
-        
-        # Add to queues
-        packet_queue.append(row)
-        prediction_queue.append(row)
-        
-        # Add to graph data
-        graph_data.append({
-            'timestamp': row['timestamp'],
-            'length': row['packet_length'],
-            'prediction': row['prediction'],
-            'confidence': row['confidence']
-        })
-        
-        # Write to CSV
-        try:
-            file_exists = os.path.isfile(csv_file)
-            with open(csv_file, 'a', newline='') as f:
-                # Dynamically get fieldnames from the row keys
-                writer = csv.DictWriter(f, fieldnames=row.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(row)
-        except Exception as e:
-            logger.error(f"Error writing to CSV: {str(e)}")
-        
-        return row
-    return None
+    fig.savefig(buf, format='png', dpi=100)
+    return buf.getvalue()
+
+def cached_graph(session):
+    """PNG of a session's graph data, rendered again only after new packets arrived"""
+    with graph_lock:
+        version = session.graph_points.written
+        cached_version, png = session.graph_cache
+        if cached_version != version:
+            png = generate_graph(session.graph_points.snapshot())
+            session.graph_cache = (version, png)
+        return png, version
+
+def find_session(session_id=None):
+    """The session with ``session_id``, or else the newest running session, or else the newest one"""
+    with sessions_lock:
+        if session_id:
+            return sessions.get(str(session_id))
+        newest = list(sessions.values())
+    for session in reversed(newest):
+        if session.running:
+            return session
+    return newest[-1] if newest else None
+
+def request_session():
+    return find_session(request.args.get('session'))
+
+def register_session(session):
+    """Add a session, dropping the oldest finished ones beyond MAX_FINISHED_SESSIONS"""
+    with sessions_lock:
+        sessions[session.id] = session
+        finished = [key for key, other in sessions.items() if not other.running and other is not session]
+        for key in finished[:max(0, len(finished) - MAX_FINISHED_SESSIONS)]:
+            del sessions[key]
+
+def running_sessions():
+    with sessions_lock:
+        return [session for session in sessions.values() if session.running]
+
+def session_summary(session):
+    return {
+        'session': session.id,
+        'source': session.source,
+        'iface': session.iface,
+        'monitoring': session.running,
+        'started_at': session.started_at,
+        'finished_at': session.finished_at,
+        'count': session.feed.total,
+        'output_file': os.path.abspath(session.writer.path) if session.writer else None,
+        'workers': session.fanout.workers if session.fanout else 0,
+    }
+
+def stream_status(session):
+    """Counters sent along with every streamed update"""
+    if session is None:
+        return {'session': None, 'count': 0, 'sample_rate': 1, 'monitoring': False,
+                'graph_version': 0, 'alert_seq': 0, 'inference': None}
+    return {
+        'session': session.id,
+        'count': session.feed.total,
+        'sample_rate': session.sampler.rate,
+        'monitoring': session.running,
+        'graph_version': session.graph_points.written,
+        'alert_seq': session.traffic_stats.alert_seq,
+        'inference': session.engine.stats() if session.fanout is None else None
+    }
+
+@traffic.route('/sessions')
+def list_sessions():
+    """Capture sessions still held by the server, oldest first"""
+    with sessions_lock:
+        current = list(sessions.values())
+    return jsonify({'sessions': [session_summary(session) for session in current]})
 
 @traffic.route('/get_predictions')
 def get_predictions():
-    """Endpoint to get recent predictions for display"""
+    """Endpoint to get recent predictions for display
+
+    Pass ``graph=0`` to skip the server-rendered image; dashboards that draw
+    their own charts use ``counts`` instead.
+    """
+    session = request_session()
+    if session is None:
+        if request.args.get('session'):
+            return jsonify({'error': 'Unknown capture session'}), 404
+        return jsonify({'predictions': [], 'count': 0, 'graph': None, 'counts': [], 'seq': 0, 'flows': [],
+                        'session': None, 'flow_table': None, 'writer': None, 'inference': None})
+
+    graph = None
+    if request.args.get('graph', '1') != '0':
+        png, _ = cached_graph(session)
+        graph = base64.b64encode(png).decode('utf-8') if png else None
+    predictions = session.predictions.snapshot()
     return jsonify({
-        'predictions': list(prediction_queue)[-100:],
-        'count': len(prediction_queue),
-        'graph': generate_graph()
+        'predictions': predictions,
+        'count': len(predictions),
+        'graph': graph,
+        'counts': session.feed.counts(),
+        'seq': session.feed.seq,
+        'flows': session.flows.snapshot(),
+        'session': session.id,
+        'alert_seq': session.traffic_stats.alert_seq,
+        'flow_table': session.flow_table.stats(),
+        'writer': session.writer.stats() if session.writer else None,
+        'inference': stream_status(session)['inference']
     })
 
-def start_sniffing():
-    """Start packet capture on selected interface"""
-    global is_monitoring
-    
+@traffic.route('/graph.png')
+def get_graph():
+    """The server-rendered traffic graph, cached until new packets arrive"""
+    session = request_session()
+    if session is None:
+        return '', 204
+    png, version = cached_graph(session)
+    if png is None:
+        return '', 204
+    etag = f"graph-{session.id}-{version}"
+    if request.if_none_match.contains(etag):
+        return '', 304
+    response = Response(png, mimetype='image/png')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def sse_message(event, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+@traffic.route('/stream')
+def stream():
+    """Server-Sent Events: prediction deltas and per-second counts as they arrive
+
+    Each ``predictions`` event carries the rows classified since the previous
+    one, the per-second counts that changed, and the capture counters. Event
+    ids are ``<session>:<seq>``: a reconnecting browser resumes after
+    ``Last-Event-ID``, and rows that already left the feed's buffer are
+    skipped rather than replayed. Without ``?session=<id>`` the stream
+    follows the newest capture and sends a fresh ``snapshot`` when one starts.
+    """
+    session_id = request.args.get('session')
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('since') or ''
+    resume_session, _, resume_seq = last_id.rpartition(':')
+
+    def generate():
+        yield 'retry: 2000\n\n'
+        session, seq = None, 0
+        snapshot_sent = False
+        last_sent = time.time()
+        last_second = int(time.time()) - 1
+        while True:
+            current = find_session(session_id)
+            if current is not session or not snapshot_sent:
+                session, recent = current, []
+                if session is None:
+                    seq = 0
+                elif resume_session == session.id and resume_seq.isdigit() and not snapshot_sent:
+                    seq = int(resume_seq)
+                else:
+                    # A new subscriber starts from the most recent rows the feed still holds
+                    recent, seq = session.feed.since(0, 100)
+                counts = session.feed.counts() if session else []
+                event_id = f"{session.id}:{seq}" if session else None
+                yield sse_message('snapshot', {'predictions': recent, 'counts': counts, **stream_status(session)},
+                                  event_id)
+                snapshot_sent = True
+                last_sent = time.time()
+                last_second = int(time.time()) - 1
+                continue
+
+            if session is None or not session.feed.wait(seq, STREAM_POLL_INTERVAL):
+                if session is None:
+                    time.sleep(STREAM_POLL_INTERVAL)
+                if time.time() - last_sent >= STREAM_KEEPALIVE:
+                    yield ': keepalive\n\n'
+                    last_sent = time.time()
+                continue
+            # Coalesce bursts into one event per interval
+            time.sleep(STREAM_MIN_INTERVAL)
+            events, seq = session.feed.since(seq, STREAM_MAX_EVENTS)
+            counts = session.feed.counts(since_second=last_second)
+            last_second = counts[-1]['second'] if counts else last_second
+            yield sse_message('predictions', {'predictions': events, 'counts': counts, **stream_status(session)},
+                              f"{session.id}:{seq}")
+            last_sent = time.time()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@traffic.route('/inference_stats')
+def inference_stats():
+    """Endpoint exposing throughput and latency counters of the inference worker"""
+    session = request_session()
+    if session is None or session.started_at is None:
+        return jsonify({'error': 'Inference engine not started'}), 404
+    if session.fanout is not None:
+        return jsonify({'error': 'Inference runs in the capture workers', 'workers': session.stats()['fanout']}), 404
+    cache = session.verdict_cache
+    return jsonify(dict(session.engine.stats(), verdict_cache=cache.stats() if cache else None))
+
+@traffic.route('/traffic_stats')
+def get_traffic_stats():
+    """Per-second rates, window aggregates (heavy hitters, distinct sources) and rate alerts
+
+    ``seconds`` limits the per-second history and ``alerts_since`` returns
+    only alerts after that sequence number.
+    """
+    session = request_session()
+    if session is None:
+        return jsonify({'error': 'No capture session'}), 404
     try:
-        iface = select_network_interface()
-        if iface:
-            logger.info(f"Starting capture on interface {iface}")
-            sniff(prn=process_packet, store=False, stop_filter=lambda x: not is_monitoring, iface=iface)
-        else:
-            logger.error("No suitable network interface found")
+        seconds = int(request.args.get('seconds', 0)) or None
+        alerts_since = int(request.args.get('alerts_since', 0))
+    except ValueError:
+        return jsonify({'error': 'seconds and alerts_since must be integers'}), 400
+    return jsonify(dict(session.traffic_stats.snapshot(seconds, alerts_since), session=session.id))
+
+def pipeline_stats(session=None):
+    """Packets/s, per-stage latency percentiles and drop counts of a capture (the current one by default)"""
+    session = session or find_session()
+    return session.stats() if session is not None else None
+
+@traffic.route('/pipeline_stats')
+def get_pipeline_stats():
+    session = request_session()
+    if session is None:
+        return jsonify({'error': 'No capture session'}), 404
+    return jsonify(session.stats())
+
+def writer_paths():
+    """Capture files being written by running sessions"""
+    return {os.path.abspath(session.writer.path) for session in running_sessions() if session.writer}
+
+def verdict_cache(options):
+    """The VerdictCache for a capture, or None when ``verdict_cache`` is turned off.
+
+    Raises ValueError for invalid cache options.
+    """
+    if str(options.get('verdict_cache', True)).lower() in ('0', 'false', 'off', 'no'):
+        return None
+    try:
+        cache = VerdictCache(
+            max_entries=int(options.get('cache_size', VERDICT_CACHE_SIZE)),
+            ttl=float(options.get('cache_ttl', VERDICT_CACHE_TTL)),
+            revalidate_every=int(options.get('cache_revalidate', VERDICT_CACHE_REVALIDATE)),
+            resolution=float(options.get('cache_resolution', VERDICT_CACHE_RESOLUTION)),
+            coarse_resolution=float(options.get('cache_coarse_resolution', VERDICT_CACHE_COARSE_RESOLUTION))
+        )
+    except (TypeError, ValueError):
+        raise ValueError('cache_size, cache_ttl, cache_revalidate, cache_resolution and cache_coarse_resolution '
+                         'must be numeric')
+    if cache.ttl <= 0 or cache.resolution <= 0 or cache.coarse_resolution <= 0:
+        raise ValueError('cache_ttl, cache_resolution and cache_coarse_resolution must be positive')
+    return cache
+
+def capture_output_path(output_file):
+    """Where a capture asked to write to ``output_file`` goes: that file name next to the default capture file.
+
+    Raises ValueError for anything but a plain file name, so a request
+    cannot create, append to or rotate files elsewhere on the server.
+    """
+    name = os.path.basename(str(output_file))
+    if name != output_file or name in ('.', '..') or name.startswith('.'):
+        raise ValueError('output_file must be a plain file name; captures are written next to '
+                         f"{os.path.abspath(csv_file)}")
+    return os.path.join(os.path.dirname(csv_file), name)
+
+def build_session(options, sampler=None, settings=None, iface=None, output_path=None):
+    """Create a capture session, with its writer and inference engine, from capture options.
+
+    Without an ``output_file`` a session running next to others gets a
+    numbered copy of the default file name. ``output_path`` is a path chosen
+    by the server itself (e.g. a benchmark's temporary directory) and is used
+    as is. Raises ValueError for invalid options.
+    """
+    try:
+        batch_size = int(options.get('batch_size', DEFAULT_BATCH_SIZE))
+        max_latency_ms = float(options.get('max_latency_ms', DEFAULT_MAX_LATENCY_MS))
+    except (TypeError, ValueError):
+        raise ValueError('batch_size and max_latency_ms must be numeric')
+
+    try:
+        rotate_seconds = options.get('rotate_seconds')
+        rotate_bytes = int(float(options.get('rotate_mb', WRITER_ROTATE_MB)) * 1024 * 1024)
+        rotate_seconds = float(rotate_seconds) if rotate_seconds else None
+    except (TypeError, ValueError):
+        raise ValueError('rotate_mb and rotate_seconds must be numeric')
+
+    try:
+        traffic_stats = TrafficStats(
+            window_seconds=int(options.get('stats_window', WINDOW_SECONDS)),
+            sample_rate=sampler.rate if sampler else 1,
+            pps_threshold=float(options['alert_pps']) if options.get('alert_pps') else None,
+            syn_ratio=float(options.get('alert_syn_ratio', ALERT_SYN_RATIO)),
+            sources_threshold=int(options.get('alert_sources', ALERT_SOURCES)),
+            alpha=float(options.get('ewma_alpha', EWMA_ALPHA)),
+            k=float(options.get('ewma_k', EWMA_K))
+        )
+    except (TypeError, ValueError):
+        raise ValueError('stats_window, alert_pps, alert_syn_ratio, alert_sources, ewma_alpha and ewma_k must be numeric')
+    if traffic_stats.window_seconds < 1 or not 0 < traffic_stats.alpha <= 1:
+        raise ValueError('stats_window must be at least 1 and ewma_alpha between 0 and 1')
+
+    cache = verdict_cache(options)
+
+    busy = writer_paths()
+    output_file = options.get('output_file')
+    candidates = [output_path] if output_path else [capture_output_path(output_file)] if output_file else [csv_file] + [
+        csv_file.replace('.csv', f"_{n}.csv") for n in range(2, len(busy) + 3)]
+    for path in candidates:
+        writer = CaptureWriter(
+            path,
+            output_format=options.get('output_format', 'csv'),
+            flush_rows=WRITER_FLUSH_ROWS,
+            flush_interval=WRITER_FLUSH_INTERVAL,
+            rotate_bytes=rotate_bytes,
+            rotate_seconds=rotate_seconds,
+            capacity=WRITER_CAPACITY
+        )
+        if os.path.abspath(writer.path) not in busy:
+            break
+    else:
+        raise ValueError(f"{writer.path} is being written by another capture")
+
+    return CaptureSession(
+        options.get('source', 'live'),
+        writer,
+        functools.partial(predict_batch, cache=cache),
+        batch_size=batch_size,
+        max_latency_ms=max_latency_ms,
+        capacity=INFERENCE_QUEUE_CAPACITY,
+        sampler=sampler,
+        settings=settings,
+        iface=iface,
+        options=options,
+        traffic_stats=traffic_stats,
+        verdict_cache=cache
+    )
+
+def capture_options(options, iface=None):
+    """Return (BPF program or None, filter settings, sampler) for the requested capture
+
+    The BPF filter and snap length are applied by the kernel and so only to
+    live capture, compiled for the link type of ``iface``; sampling applies
+    to every source.
+    """
+    bpf_filter = options.get('bpf_filter') or None
+    snaplen = int(options['snaplen']) if options.get('snaplen') else None
+    if snaplen is not None and not MIN_SNAPLEN <= snaplen <= MAX_SNAPLEN:
+        raise ValueError(f"snaplen must be between {MIN_SNAPLEN} and {MAX_SNAPLEN}")
+    live = options.get('source', 'live') == 'live'
+    if not live and (bpf_filter or snaplen):
+        raise ValueError('bpf_filter and snaplen apply to live capture only')
+
+    sampler = PacketSampler(options.get('sampling', 'none'), options.get('sample_rate', 1))
+    # Compiled up front so a bad expression is reported to the caller
+    program = (bpf_instructions(bpf_filter, snaplen, interface_linktype(iface))
+               if live and (bpf_filter or snaplen) else None)
+    return program, {'bpf_filter': bpf_filter, 'snaplen': snaplen}, sampler
+
+def fanout_worker(index, ring_name, results, control, loaded, sampling, batch_size, max_latency_ms,
+                  cache_settings=None):
+    """Entry point of a fan-out capture worker process
+
+    Runs a session of its own: its flow table holds only the flows hashed to
+    this worker, and its inference engine sends classified rows back to the
+    web process instead of recording them here. A ``('model', manifest)``
+    control message switches it to that registered model.
+    """
+    from scapy.all import conf
+
+    try:
+        activate_model(loaded)
+        ring = FrameRing(name=ring_name)
+        # Each worker caches verdicts for the flows hashed to it
+        cache = VerdictCache(**cache_settings) if cache_settings else None
+        # Only the rate is used here: frames were sampled by the reader
+        session = CaptureSession(
+            'fanout', None, functools.partial(predict_batch, cache=cache),
+            batch_size=batch_size,
+            max_latency_ms=max_latency_ms,
+            capacity=INFERENCE_QUEUE_CAPACITY,
+            sampler=PacketSampler(*sampling),
+            verdict_cache=cache,
+            on_results=lambda rows, batch_results: results.put(('rows', index, rows, batch_results))
+        )
+    except Exception as e:
+        results.put(('done', index, {'error': str(e)}))
+        return
+
+    session.engine.start()
+    results.put(('ready', index))
+    next_report = time.time() + WORKER_STATS_INTERVAL
+    try:
+        while True:
+            try:
+                kind, payload = control.get_nowait()
+            except queue.Empty:
+                pass
+            else:
+                if kind == 'model':
+                    try:
+                        activate_model(model_registry.load(payload))
+                        logger.info(f"Capture worker {index} switched to {payload['name']} v{payload['version']}")
+                    except Exception as e:
+                        logger.error(f"Capture worker {index} kept its model: {str(e)}")
+            closed = ring.closed
+            frames = ring.get_many()
+            if not frames:
+                if closed:
+                    break
+                time.sleep(RING_POLL_INTERVAL)
+            for frame, ts, wirelen, linktype in frames:
+                packet = conf.l2types.num2layer.get(linktype, conf.raw_layer)(frame)
+                packet.time = ts
+                packet.wirelen = wirelen or None
+                session.process_packet(packet)
+            if time.time() >= next_report:
+                results.put(('stats', index, session.worker_stats()))
+                next_report = time.time() + WORKER_STATS_INTERVAL
     except Exception as e:
-        logger.error(f"Capture error: {str(e)}")
+        logger.error(f"Capture worker {index} error: {str(e)}")
     finally:
-        is_monitoring = False
+        session.finish(timeout=None)
+        ring.close()
+        results.put(('done', index, session.worker_stats()))
+
+def fanout_capture(session, workers, program=None):
+    """Spread a session's capture over ``workers`` processes that classify and send rows back to it"""
+    return FanoutCapture(
+        workers, fanout_worker,
+        (active_model, (session.sampler.mode, session.sampler.rate),
+         session.engine.batch_size, session.engine.max_latency * 1000.0,
+         session.verdict_cache.settings() if session.verdict_cache else None),
+        session.handle_predictions, session.sampler, session.source, session.options,
+        iface=session.iface, program=program, settings=session.settings,
+        # Window statistics come from the reader, which sees packets in capture order
+        on_observed=session.observe_batch
+    )
 
 @traffic.route('/start_capture', methods=['POST'])
 def start_capture():
-    global is_monitoring, capture_thread
-    
-    if is_monitoring:
-        return jsonify({'error': 'Capture already running'}), 400
-    
+    """Start a capture session; live sessions on different interfaces and replays run side by side"""
     if not model_loaded:
         return jsonify({'error': 'No model loaded'}), 400
-    
-    is_monitoring = True
-    packet_queue.clear()
-    prediction_queue.clear()
-    graph_data.clear()
-    
-    capture_thread = threading.Thread(target=start_sniffing)
-    capture_thread.daemon = True
-    capture_thread.start()
-    
+
+    options = request.get_json(silent=True) or {}
+    source = options.get('source', 'live')
+    iface = None
+    if source == 'live':
+        iface = options.get('iface') or select_network_interface()
+        if not iface:
+            return jsonify({'error': 'No suitable network interface found'}), 400
+
+    try:
+        if source == 'pcap':
+            # Only files in the pcap folder can be replayed
+            options = dict(options, pcap_path=resolve_pcap_path(options.get('pcap_path')))
+        if source != 'live':
+            # Checked here as well: with workers the source is only opened in the reader process
+            replay_source(options)
+        program, settings, sampler = capture_options(options, iface)
+        workers = int(options.get('workers') or 0)
+        if not 0 <= workers <= MAX_CAPTURE_WORKERS:
+            raise ValueError(f"workers must be between 0 and {MAX_CAPTURE_WORKERS}")
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    # The busy interface and output file checks and the registration happen under
+    # one hold of the lock, so two concurrent requests cannot both pass the checks
+    with sessions_lock:
+        if source == 'live':
+            busy = [session for session in running_sessions() if session.source == 'live' and session.iface == iface]
+            if busy:
+                return jsonify({'error': f"Capture already running on {iface}", 'session': busy[0].id}), 400
+        try:
+            session = build_session(options, sampler, settings, iface)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+
+        # With workers, reading, feature extraction and classification leave this
+        # process; only merging the results into the session stays here
+        fanout = fanout_capture(session, workers, program) if workers else None
+        try:
+            session.start(program, fanout)
+        except (TypeError, ValueError) as e:
+            session.finish()
+            return jsonify({'error': str(e)}), 400
+        register_session(session)
+
     return jsonify({
         'status': 'Capture started',
-        'output_file': os.path.abspath(csv_file),
-        'message': f"Capturing network traffic to {csv_file}"
+        'session': session.id,
+        'source': source,
+        'iface': iface,
+        'output_file': os.path.abspath(session.writer.path),
+        'output_format': session.writer.output_format,
+        'batch_size': session.engine.batch_size,
+        'max_latency_ms': session.engine.max_latency * 1000.0,
+        'capture': dict(settings, sampling=sampler.mode, sample_rate=sampler.rate),
+        'workers': workers,
+        'message': f"Capturing network traffic to {session.writer.path}"
     })
 
 @traffic.route('/stop_capture', methods=['POST'])
 def stop_capture():
-    global is_monitoring
-    
-    if not is_monitoring:
+    """Stop a session (``session`` in the body or query), by default the newest running one"""
+    options = request.get_json(silent=True) or {}
+    session_id = options.get('session') or request.args.get('session')
+    session = find_session(session_id)
+    if session is None or not session.running:
         return jsonify({'error': 'No capture running'}), 400
-    
-    is_monitoring = False
-    
-    if capture_thread and capture_thread.is_alive():
-        capture_thread.join(timeout=5)
-    
+
+    stopped = session.stop(timeout=5)
+    count = session.feed.total
+
     return jsonify({
-        'status': 'Capture stopped',
-        'output_file': os.path.abspath(csv_file),
-        'count': len(prediction_queue),
-        'message': f"Capture stopped. {len(prediction_queue)} packets analyzed"
+        'status': 'Capture stopped' if stopped else 'Capture stopping',
+        'session': session.id,
+        'output_file': os.path.abspath(session.writer.path if session.writer else csv_file),
+        'count': count,
+        'message': f"Capture stopped. {count} packets analyzed"
     })
 
+def capacity_warnings(profile, packet_rate, batch_size=DEFAULT_BATCH_SIZE, max_latency_ms=DEFAULT_MAX_LATENCY_MS):
+    """Warnings for a model whose profiled throughput or latency can't keep up with live traffic"""
+    batches = profile.get('batches', {})
+    if not batches:
+        return []
+    # Closest profiled batch size not above the inference batch size
+    sizes = sorted(int(size) for size in batches)
+    size = max([s for s in sizes if s <= batch_size] or sizes[:1])
+    measured = batches[str(size)]
+
+    warnings = []
+    if measured['rows_per_s'] < packet_rate:
+        warnings.append(
+            f"{profile.get('model_type', 'Model')} classifies about {measured['rows_per_s']:.0f} rows/s at batch size {size}, "
+            f"below the expected {packet_rate:.0f} packets/s; the inference queue will fill and packets will be dropped"
+        )
+    if measured['p99_ms'] > max_latency_ms:
+        warnings.append(
+            f"p99 prediction latency at batch size {size} is {measured['p99_ms']:.1f} ms, "
+            f"above the {max_latency_ms} ms batching deadline"
+        )
+    return warnings
+
+def activate_model(loaded):
+    """Make ``loaded`` the model live inference uses.
+
+    A single reference assignment, so the capture pipeline never pauses:
+    batches already being classified finish on the previous model.
+    """
+    global active_model, model_loaded, model_classes
+    if loaded.classes:
+        model_classes = loaded.classes
+    active_model = loaded
+    model_loaded = True
+
+def activate_registered(manifest, packet_rate):
+    """Load a registered model (from the cache when possible), test it and activate it"""
+    import sklearn
+
+    cached = manifest['sha256'] in model_registry.cached()
+    started = time.perf_counter()
+    loaded = model_registry.load(manifest)
+    load_ms = (time.perf_counter() - started) * 1000
+
+    # Test prediction with dummy data before the model goes live
+    try:
+        dummy_features = {name: 0 for name in (loaded.feature_names or FALLBACK_FEATURES)}
+        prediction, confidence = predict_batch([dummy_features], loaded)[0]
+        logger.info(f"Test prediction: {prediction} (confidence: {confidence})")
+    except Exception as e:
+        error_msg = f"Model test failed: {str(e)}"
+        logger.error(error_msg)
+        return jsonify({'error': error_msg}), 400
+
+    # Under the sessions lock, so a fan-out capture starting now either
+    # pickles this model into its workers or is sent the swap below
+    with sessions_lock:
+        activate_model(loaded)
+        # Fan-out workers hold their own copy of the model and load the new one from the registry
+        for session in running_sessions():
+            if session.fanout is not None:
+                session.fanout.send(('model', manifest))
+    logger.info(f"Activated {loaded.name} v{loaded.version} ({loaded.sha256[:12]}): {type(loaded.model).__name__}")
+
+    # Latency profile written by /train next to models/<name>.pkl
+    profile = load_profile(os.path.join('models', f"{loaded.name}.pkl"))
+    warnings = capacity_warnings(profile, packet_rate) if profile else []
+    for warning in warnings:
+        logger.warning(warning)
+
+    return jsonify({
+        'status': 'Model loaded successfully',
+        'model_type': str(type(loaded.model).__name__),
+        'name': loaded.name,
+        'version': loaded.version,
+        'sha256': loaded.sha256,
+        'cached': cached,
+        'load_ms': round(load_ms, 3),
+        'features': loaded.feature_names or 'Unknown',
+        'classes': model_classes,
+        'preprocessing': loaded.pipeline is not None,
+        'normalization': loaded.pipeline.normalization_type if loaded.pipeline is not None else None,
+        'compiled': isinstance(loaded.model, CompiledTreeEnsemble),
+        'profile': profile,
+        'expected_packet_rate': packet_rate,
+        'warnings': warnings,
+        'sklearn_version': sklearn.__version__
+    })
+
+def request_packet_rate(options):
+    return float(options.get('packet_rate', EXPECTED_PACKET_RATE))
+
 @traffic.route('/load_model', methods=['POST'])
 def load_model():
-    global loaded_model, model_loaded, model_classes
-    
+    import sklearn
+
+    try:
+        packet_rate = request_packet_rate(request.form)
+    except ValueError:
+        return jsonify({'error': 'packet_rate must be a number'}), 400
+
     if 'model' not in request.files:
         logger.error("No file part in request")
         return jsonify({'error': 'No file uploaded'}), 400
@@ -301,75 +864,40 @@ def load_model():
         return jsonify({'error': 'Invalid file type. Please upload a .pkl, .joblib or .sav file'}), 400
     
     try:
+        filename = os.path.basename(model_file.filename)
         with tempfile.TemporaryDirectory() as temp_dir:
-            temp_path = os.path.join(temp_dir, model_file.filename)
+            temp_path = os.path.join(temp_dir, filename)
             model_file.save(temp_path)
             logger.info(f"Saved uploaded file to {temp_path}")
             
             logger.info(f"Current scikit-learn version: {sklearn.__version__}")
-            
-            try:
-                loaded_model = joblib.load(temp_path)
-                logger.info("Model loaded successfully with joblib")
-            except Exception as joblib_error:
-                logger.warning(f"Joblib load failed: {str(joblib_error)}. Falling back to pickle.")
-                try:
-                    with open(temp_path, 'rb') as f:
-                        loaded_model = pickle.load(f)
-                    logger.info("Model loaded successfully with pickle")
-                except Exception as pickle_error:
-                    error_msg = (
-                        f"Failed to load model.\n"
-                        f"Joblib error: {str(joblib_error)}\n"
-                        f"Pickle error: {str(pickle_error)}\n"
-                        f"Current scikit-learn version: {sklearn.__version__}\n"
-                        f"Ensure the model was trained with a compatible scikit-learn version."
-                    )
-                    logger.error(error_msg)
-                    return jsonify({'error': error_msg}), 400
-            
-            if not hasattr(loaded_model, 'predict'):
-                error_msg = "Uploaded file is not a valid scikit-learn model (missing predict method)"
-                logger.error(error_msg)
-                return jsonify({'error': error_msg}), 400
-            
-            # Get model's class labels if available
-            if hasattr(loaded_model, 'classes_'):
-                model_classes = loaded_model.classes_.tolist()
-                logger.info(f"Model classes: {model_classes}")
-            
-            # Test prediction with dummy data
+
+            # Preprocessing state saved by /train: uploaded alongside, or found next to models/<name>.pkl
+            pipeline_file = request.files.get('preprocessing')
+            if pipeline_file and pipeline_file.filename:
+                pipeline_path = os.path.join(temp_dir, 'preprocessing.pkl')
+                pipeline_file.save(pipeline_path)
+            else:
+                # A compiled models/<name>_compiled.pkl shares the preprocessing state of models/<name>.pkl
+                pipeline_path = model_pipeline_path(source_model_path(os.path.join('models', filename)))
+            pipeline = PreprocessingPipeline.load(pipeline_path)
+            if pipeline is not None:
+                logger.info(f"Loaded preprocessing state from {pipeline_path}")
+
+            # The upload becomes a versioned registry artifact; identical content reuses its version
             try:
-                if hasattr(loaded_model, 'feature_names_in_'):
-                    dummy_features = {name: 0 for name in loaded_model.feature_names_in_}
-                else:
-                    # Create dummy features with typical network traffic features
-                    dummy_features = {
-                        'packet_length': 0,
-                        'src_port': 0,
-                        'dst_port': 0,
-                        'window_size': 0,
-                        'protocol': 0
-                    }
-                
-                # Test prediction
-                prediction, confidence = predict_traffic(dummy_features)
-                logger.info(f"Test prediction: {prediction} (confidence: {confidence})")
-            except Exception as e:
-                error_msg = f"Model test failed: {str(e)}"
+                manifest = model_registry.register_file(temp_path, os.path.splitext(filename)[0],
+                                                        pipeline=pipeline, source='upload')
+            except ValueError as e:
+                error_msg = (
+                    f"{str(e)}\n"
+                    f"Current scikit-learn version: {sklearn.__version__}\n"
+                    f"Ensure the model was trained with a compatible scikit-learn version."
+                )
                 logger.error(error_msg)
                 return jsonify({'error': error_msg}), 400
-        
-        model_loaded = True
-        logger.info(f"Model loaded successfully: {type(loaded_model).__name__}")
-        
-        return jsonify({
-            'status': 'Model loaded successfully',
-            'model_type': str(type(loaded_model).__name__),
-            'features': loaded_model.feature_names_in_.tolist() if hasattr(loaded_model, 'feature_names_in_') else 'Unknown',
-            'classes': model_classes,
-            'sklearn_version': sklearn.__version__
-        })
+
+        return activate_registered(manifest, packet_rate)
         
     except Exception as e:
         logger.error(f"Error loading model: {str(e)}")
@@ -382,23 +910,63 @@ def load_model():
             )
         }), 500
 
+@traffic.route('/activate_model', methods=['POST'])
+def activate_model_route():
+    """Switch to a registered model by sha256 (or prefix), or by name and optional version"""
+    options = request.get_json(silent=True) or request.form
+    try:
+        packet_rate = request_packet_rate(options)
+    except ValueError:
+        return jsonify({'error': 'packet_rate must be a number'}), 400
+
+    manifest = model_registry.find(sha256=options.get('sha256'), name=options.get('name'),
+                                   version=options.get('version'))
+    if manifest is None:
+        return jsonify({'error': 'No matching registered model'}), 404
+    try:
+        return activate_registered(manifest, packet_rate)
+    except Exception as e:
+        logger.error(f"Error activating model: {str(e)}")
+        return jsonify({'error': f'Error activating model: {str(e)}'}), 500
+
+@traffic.route('/models', methods=['GET'])
+def list_models():
+    active = active_model
+    cached = set(model_registry.cached())
+    manifests = model_registry.manifests()
+    for manifest in manifests:
+        manifest['active'] = active is not None and active.manifest.get('sha256') == manifest['sha256']
+        manifest['cached'] = manifest['sha256'] in cached
+    return jsonify({'models': manifests, **model_registry.stats()})
+
 @traffic.route('/')
 def traffic_monitoring():
     return render_template('traffic.html')
 
 @traffic.route('/download_csv')
 def download_csv():
-    if not os.path.exists(csv_file):
-        logger.error("CSV file not found")
+    session = request_session()
+    writer = session.writer if session is not None else None
+    if writer is not None:
+        path = writer.latest_complete_file()
+        mimetype = writer.mimetype
+        download_name = 'network_traffic_analysis' + os.path.splitext(writer.path)[1]
+        if writer.output_format == 'csv.gz':
+            download_name = 'network_traffic_analysis.csv.gz'
+    else:
+        path, mimetype, download_name = csv_file, 'text/csv', 'network_traffic_analysis.csv'
+
+    if not path or not os.path.exists(path):
+        logger.error("Capture file not found")
         return jsonify({'error': 'No data file available'}), 404
     
     try:
         return send_file(
-            csv_file,
+            os.path.abspath(path),
             as_attachment=True,
-            download_name='network_traffic_analysis.csv',
-            mimetype='text/csv'
+            download_name=download_name,
+            mimetype=mimetype
         )
     except Exception as e:
-        logger.error(f"Error sending CSV file: {str(e)}")
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        logger.error(f"Error sending capture file: {str(e)}")
+        return jsonify({'error': str(e)}), 500
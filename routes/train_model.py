@@ -1,105 +1,484 @@
 from flask import Blueprint, jsonify, request
-import pandas as pd
 import os
-import joblib
+import json
+import time
+import tempfile
+import multiprocessing
+import importlib
 import traceback
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.svm import SVC
-from sklearn.linear_model import LogisticRegression
-from sklearn.discriminant_analysis import LinearDiscriminantAnalysis, QuadraticDiscriminantAnalysis
-from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
-from sklearn.neural_network import MLPClassifier
-from sklearn.metrics import accuracy_score
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from utils.pipeline_utils import PreprocessingPipeline, model_pipeline_path
+from utils.dataset_store import (UPLOAD_FOLDER, dataset_columns, dataset_exists, dataset_shape, iter_dataset_chunks,
+                                 load_dataset, memmap_dataset)
+from utils.perf_utils import profile_model, save_profile
+from utils.tree_compiler import can_compile, compile_model, compiled_model_path
+from utils.model_registry import registry as model_registry, content_sha256
+from utils.job_queue import report_progress
+from routes.job_routes import run_or_submit
 
 train_model_routes = Blueprint('train_model_routes', __name__)
 
-def get_classifier(model_name):
-    classifiers = {
-        'decision_tree': DecisionTreeClassifier(criterion='gini', random_state=42, max_depth=5),
-        'naive_bayes': GaussianNB(),
-        'knn': KNeighborsClassifier(n_neighbors=5),
-        'svm': SVC(kernel='rbf', random_state=42, probability=True),
-        'logistic_regression': LogisticRegression(random_state=42, max_iter=1000),
-        'lda': LinearDiscriminantAnalysis(),
-        'qda': QuadraticDiscriminantAnalysis(),
-        'random_forest': RandomForestClassifier(random_state=42, n_estimators=100),
-        'mlp': MLPClassifier(random_state=42, hidden_layer_sizes=(100,), max_iter=1000),
-        'gradient_boosting': GradientBoostingClassifier(random_state=42)
-    }
-    return classifiers.get(model_name.lower())
+SPLITS = ["train", "validation", "test"]
+
+MODEL_NAMES = ['decision_tree', 'naive_bayes', 'knn', 'svm',
+               'logistic_regression', 'sgd', 'lda', 'qda',
+               'random_forest', 'mlp', 'gradient_boosting']
+
+# Models whose estimator parallelises itself through n_jobs
+N_JOBS_MODELS = ['knn', 'random_forest']
+
+# Results of the last /train_many run
+LEADERBOARD_PATH = os.path.join('models', 'leaderboard.json')
+
+# Models /train?mode=incremental can fit chunk by chunk with partial_fit, and their
+# default epochs (one pass already gives naive Bayes its exact statistics)
+INCREMENTAL_EPOCHS = {'naive_bayes': 1, 'sgd': 5, 'mlp': 10}
+
+# Rows per partial_fit call; with the model this bounds incremental training's memory
+DEFAULT_CHUNK_ROWS = 50000
+
+# Blocks of the train split, picked at random across the file, that make up one partial_fit call
+INTERLEAVED_BLOCKS = 8
+
+# Test rows kept from the chunked evaluation to profile the model on
+PROFILE_SAMPLE_ROWS = 10000
+
+# Estimator per model name as (module, class, constructor arguments); the class is
+# imported on first use so startup does not pay for every sklearn submodule
+CLASSIFIERS = {
+    'decision_tree': ('sklearn.tree', 'DecisionTreeClassifier', {'criterion': 'gini', 'random_state': 42, 'max_depth': 5}),
+    'naive_bayes': ('sklearn.naive_bayes', 'GaussianNB', {}),
+    'knn': ('sklearn.neighbors', 'KNeighborsClassifier', {'n_neighbors': 5}),
+    'svm': ('sklearn.svm', 'SVC', {'kernel': 'rbf', 'random_state': 42, 'probability': True}),
+    'logistic_regression': ('sklearn.linear_model', 'LogisticRegression', {'random_state': 42, 'max_iter': 1000}),
+    'sgd': ('sklearn.linear_model', 'SGDClassifier', {'loss': 'log_loss', 'random_state': 42}),
+    'lda': ('sklearn.discriminant_analysis', 'LinearDiscriminantAnalysis', {}),
+    'qda': ('sklearn.discriminant_analysis', 'QuadraticDiscriminantAnalysis', {}),
+    'random_forest': ('sklearn.ensemble', 'RandomForestClassifier', {'random_state': 42, 'n_estimators': 100}),
+    'mlp': ('sklearn.neural_network', 'MLPClassifier', {'random_state': 42, 'hidden_layer_sizes': (100,), 'max_iter': 1000}),
+    'gradient_boosting': ('sklearn.ensemble', 'GradientBoostingClassifier', {'random_state': 42})
+}
+
+def get_classifier(model_name, **params):
+    """A new unfitted estimator for ``model_name``, with ``params`` overriding its
+    default settings, or None if the name is unknown"""
+    spec = CLASSIFIERS.get(model_name.lower())
+    if spec is None:
+        return None
+    module, class_name, defaults = spec
+    return getattr(importlib.import_module(module), class_name)(**{**defaults, **params})
 
 @train_model_routes.route('/train', methods=['POST'])
 def train():
-    try:
-        model_name = request.args.get('model', 'decision_tree')
-        
-        # Validate model name
-        valid_models = ['decision_tree', 'naive_bayes', 'knn', 'svm', 
-                       'logistic_regression', 'lda', 'qda', 
-                       'random_forest', 'mlp', 'gradient_boosting']
-        if model_name not in valid_models:
-            return jsonify({
-                "error": f"Invalid model specified. Available models: {', '.join(valid_models)}"
-            }), 400
+    model_name = request.args.get('model', 'decision_tree')
 
-        # Check if required files exist
-        required_files = ['train.csv', 'validation.csv', 'test.csv']
-        missing_files = [f for f in required_files if not os.path.exists(os.path.join('uploads', f))]
-        if missing_files:
-            return jsonify({
-                "error": f"Missing required files: {', '.join(missing_files)}",
-                "available_files": os.listdir('uploads')
-            }), 400
+    mode = request.args.get('mode', 'full')
 
-        # Load datasets
-        train_df = pd.read_csv(os.path.join('uploads', "train.csv"))
-        val_df = pd.read_csv(os.path.join('uploads', "validation.csv"))
-        test_df = pd.read_csv(os.path.join('uploads', "test.csv"))
+    # Validate model name
+    valid_models = MODEL_NAMES
+    if model_name not in valid_models:
+        return jsonify({
+            "error": f"Invalid model specified. Available models: {', '.join(valid_models)}"
+        }), 400
 
-        # Validate columns
-        if not (train_df.shape[1] == val_df.shape[1] == test_df.shape[1]):
+    if mode == 'incremental':
+        if model_name not in INCREMENTAL_EPOCHS:
             return jsonify({
-                "error": "All datasets must have the same number of features/columns",
-                "details": {
-                    "train_columns": train_df.shape[1],
-                    "validation_columns": val_df.shape[1],
-                    "test_columns": test_df.shape[1]
-                }
+                "error": f"{model_name} cannot be trained incrementally. "
+                         f"Incremental models: {', '.join(INCREMENTAL_EPOCHS)}"
             }), 400
+        try:
+            epochs = int(request.args.get('epochs', INCREMENTAL_EPOCHS[model_name]))
+            chunk_rows = int(request.args.get('chunk_rows', DEFAULT_CHUNK_ROWS))
+        except ValueError:
+            return jsonify({"error": "epochs and chunk_rows must be integers"}), 400
+        if epochs < 1 or chunk_rows < 1:
+            return jsonify({"error": "epochs and chunk_rows must be at least 1"}), 400
+        return run_or_submit('train', run_incremental_training, model_name=model_name,
+                             epochs=epochs, chunk_rows=chunk_rows)
+    elif mode != 'full':
+        return jsonify({"error": f"Invalid mode: {mode}. Use full or incremental"}), 400
+
+    return run_or_submit('train', run_training, model_name=model_name)
+
+def training_splits():
+    """Pick the splits to train on; returns (pipeline, suffix, error payload or None)"""
+    # Train on the normalized splits when /normalize has produced them
+    pipeline = PreprocessingPipeline.load()
+    suffix = ''
+    if pipeline is not None and pipeline.scaler is not None and \
+            all(dataset_exists(f"{split}_normalized") for split in SPLITS):
+        suffix = '_normalized'
+    elif pipeline is not None:
+        pipeline = pipeline.without_scaler()
+
+    # Check if required datasets exist
+    required = [f"{split}{suffix}" for split in SPLITS]
+    missing = [name for name in required if not dataset_exists(name)]
+    if missing:
+        return pipeline, suffix, {
+            "error": f"Missing required datasets: {', '.join(missing)}",
+            "available_files": os.listdir('uploads')
+        }
+
+    # Validate columns from the file metadata before loading anything
+    shapes = {split: dataset_shape(f"{split}{suffix}") for split in SPLITS}
+    if not (shapes['train'][1] == shapes['validation'][1] == shapes['test'][1]):
+        return pipeline, suffix, {
+            "error": "All datasets must have the same number of features/columns",
+            "details": {
+                "train_columns": shapes['train'][1],
+                "validation_columns": shapes['validation'][1],
+                "test_columns": shapes['test'][1]
+            }
+        }
+    return pipeline, suffix, None
 
-        # Prepare data
-        X_train = train_df.iloc[:, :-1].values
-        y_train = train_df.iloc[:, -1].values
-        X_val = val_df.iloc[:, :-1].values
-        y_val = val_df.iloc[:, -1].values
-        X_test = test_df.iloc[:, :-1].values
-        y_test = test_df.iloc[:, -1].values
+def load_splits(suffix):
+    """Load the three splits as arrays; returns (arrays, feature_names)"""
+    arrays = {}
+    feature_names = None
+    for split in SPLITS:
+        df = load_dataset(f"{split}{suffix}")
+        feature_names = df.columns[:-1].tolist()
+        arrays[f"X_{split}"] = df.iloc[:, :-1].values
+        arrays[f"y_{split}"] = df.iloc[:, -1].values
+    return arrays, feature_names
+
+def save_model(classifier, model_name, pipeline, feature_names):
+    """Save the model, its compiled form for tree models, and the preprocessing
+    state live traffic needs, and register the model as a new registry version;
+    returns (model path, compiled path or None, preprocessing path, registry manifest)"""
+    import joblib
+
+    os.makedirs('models', exist_ok=True)
+    model_path = os.path.join('models', f"{model_name}.pkl")
+    joblib.dump(classifier, model_path)
+
+    # Tree models also get a packed-array predictor that /traffic/load_model can load instead
+    compiled_path = None
+    if can_compile(classifier):
+        compiled_path = compiled_model_path(model_path)
+        joblib.dump(compile_model(classifier), compiled_path)
+
+    # Save the preprocessing state next to the model so live traffic gets the same columns and scaling
+    if pipeline is None:
+        pipeline = PreprocessingPipeline()
+    pipeline.feature_names = feature_names
+    preprocessing_path = pipeline.save(model_pipeline_path(model_path))
+
+    # Keyed by the saved file, so uploading models/<name>.pkl later finds this version
+    manifest = model_registry.register(classifier, model_name, pipeline=pipeline, source='train',
+                                       sha256=content_sha256(model_path, pipeline))
+    return model_path, compiled_path, preprocessing_path, manifest
+
+def profile_saved_model(path, X):
+    """Profile a saved model as live inference would load it, and store the profile next to it"""
+    import joblib
+
+    profile = profile_model(joblib.load(path), X, path)
+    save_profile(profile, path)
+    return profile
+
+def run_training(model_name):
+    """Fit, evaluate and save one model; returns (payload, status code)"""
+    from sklearn.metrics import accuracy_score
+
+    try:
+        pipeline, suffix, error = training_splits()
+        if error:
+            return error, 400
+
+        # Load datasets
+        report_progress(0.1, "Loading datasets")
+        data, feature_names = load_splits(suffix)
 
         # Get and train classifier
+        report_progress(0.2, f"Fitting {model_name}")
         classifier = get_classifier(model_name)
-        classifier.fit(X_train, y_train)
+        classifier.fit(data['X_train'], data['y_train'])
 
         # Calculate metrics
-        val_accuracy = accuracy_score(y_val, classifier.predict(X_val))
-        test_accuracy = accuracy_score(y_test, classifier.predict(X_test))
+        report_progress(0.8, "Evaluating on validation and test splits")
+        val_accuracy = accuracy_score(data['y_validation'], classifier.predict(data['X_validation']))
+        test_accuracy = accuracy_score(data['y_test'], classifier.predict(data['X_test']))
 
         # Save model
-        os.makedirs('models', exist_ok=True)
-        model_path = os.path.join('models', f"{model_name}.pkl")
-        joblib.dump(classifier, model_path)
+        report_progress(0.85, "Saving model")
+        model_path, compiled_path, preprocessing_path, manifest = save_model(classifier, model_name, pipeline, feature_names)
 
-        return jsonify({
+        # Latency and footprint matter as much as accuracy for live traffic
+        report_progress(0.9, "Profiling inference latency")
+        profile = profile_saved_model(model_path, data['X_test'])
+        compiled_profile = profile_saved_model(compiled_path, data['X_test']) if compiled_path else None
+
+        return {
             "message": f"{model_name.replace('_', ' ').title()} model trained successfully",
             "model": model_name,
             "validation_accuracy": round(val_accuracy, 4),
             "test_accuracy": round(test_accuracy, 4),
-            "model_path": model_path
-        })
+            "normalized": bool(suffix),
+            "model_path": model_path,
+            "preprocessing_path": preprocessing_path,
+            "registry_version": manifest["version"],
+            "sha256": manifest["sha256"],
+            "profile": profile,
+            "compiled_model_path": compiled_path,
+            "compiled_profile": compiled_profile
+        }, 200
 
     except Exception as e:
-        return jsonify({
+        return {
             "error": f"Error training {model_name} model: {str(e)}",
             "traceback": traceback.format_exc()
-        }), 500
\ No newline at end of file
+        }, 500
+
+def chunk_arrays(chunk):
+    """Features and labels of a dataset chunk; the label is the last column"""
+    return chunk.iloc[:, :-1].to_numpy(), chunk.iloc[:, -1].to_numpy()
+
+def dataset_classes(name, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Sorted class labels of a dataset, read from its label column only"""
+    import numpy as np
+
+    label = dataset_columns(name)[-1]
+    classes = set()
+    for chunk in iter_dataset_chunks(name, columns=[label], chunksize=chunk_rows):
+        classes.update(chunk[label].unique().tolist())
+    return np.array(sorted(classes))
+
+def chunked_accuracy(classifier, name, chunk_rows=DEFAULT_CHUNK_ROWS, sample_rows=0):
+    """Accuracy on a dataset predicted chunk by chunk; returns (accuracy, rows, first rows as a sample)"""
+    correct = 0
+    total = 0
+    sample = None
+    for chunk in iter_dataset_chunks(name, chunksize=chunk_rows):
+        X, y = chunk_arrays(chunk)
+        del chunk
+        correct += int((classifier.predict(X) == y).sum())
+        total += len(y)
+        if sample is None and sample_rows:
+            sample = X[:sample_rows].copy()
+    return (correct / total if total else 0.0), total, sample
+
+def run_incremental_training(model_name, epochs, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Fit a model with partial_fit over chunks read from disk, evaluate it chunk by chunk
+    and save it; returns (payload, status code)
+
+    The train split is first copied, one chunk at a time, into memory-mapped
+    arrays (``memmap_dataset``). Each epoch visits blocks of
+    ``chunk_rows / INTERLEAVED_BLOCKS`` rows in a new random order; every
+    partial_fit call interleaves the rows of ``INTERLEAVED_BLOCKS`` of them,
+    so a call samples the whole file even if the upload was sorted by label,
+    while the file is still read in contiguous blocks. Only one chunk of rows
+    is held in memory at a time.
+    """
+    import numpy as np
+
+    try:
+        pipeline, suffix, error = training_splits()
+        if error:
+            return error, 400
+
+        train_name = f"train{suffix}"
+        feature_names = dataset_columns(train_name)[:-1]
+        if dataset_shape(train_name)[0] == 0:
+            return {"error": "The train dataset has no rows"}, 400
+
+        report_progress(0.02, "Collecting class labels")
+        classes = dataset_classes(train_name, chunk_rows)
+        classifier = get_classifier(model_name)
+        rng = np.random.default_rng(42)
+
+        history = []
+        with tempfile.TemporaryDirectory(prefix='train-incremental-', dir=UPLOAD_FOLDER) as scratch:
+            report_progress(0.05, "Copying the train split to disk")
+            features, labels = memmap_dataset(train_name, classes, scratch, chunk_rows)
+            total_rows = len(labels)
+            block_rows = max(1, chunk_rows // INTERLEAVED_BLOCKS)
+            starts = np.arange(0, total_rows, block_rows)
+
+            for epoch in range(epochs):
+                started = time.perf_counter()
+                seen = 0
+                blocks = rng.permutation(starts)
+                for first in range(0, len(blocks), INTERLEAVED_BLOCKS):
+                    picked = blocks[first:first + INTERLEAVED_BLOCKS]
+                    X = np.concatenate([features[start:start + block_rows] for start in picked])
+                    y = np.concatenate([labels[start:start + block_rows] for start in picked])
+                    order = rng.permutation(len(y))
+                    X, y = X[order], classes[y[order]]
+                    classifier.partial_fit(X, y, classes=classes)
+                    seen += len(y)
+                    report_progress(0.1 + 0.7 * (epoch + seen / total_rows) / epochs,
+                                    f"Epoch {epoch + 1}/{epochs}: {seen}/{total_rows} rows")
+                fit_seconds = time.perf_counter() - started
+                val_accuracy, _, _ = chunked_accuracy(classifier, f"validation{suffix}", chunk_rows)
+                history.append({"epoch": epoch + 1, "validation_accuracy": round(val_accuracy, 4),
+                                "fit_seconds": round(fit_seconds, 3)})
+            del features, labels
+
+        report_progress(0.8, "Evaluating on the test split")
+        test_accuracy, _, sample = chunked_accuracy(classifier, f"test{suffix}", chunk_rows,
+                                                    sample_rows=PROFILE_SAMPLE_ROWS)
+
+        report_progress(0.85, "Saving model")
+        model_path, compiled_path, preprocessing_path, manifest = save_model(classifier, model_name, pipeline, feature_names)
+
+        report_progress(0.9, "Profiling inference latency")
+        profile = profile_saved_model(model_path, sample) if sample is not None and len(sample) else None
+
+        return {
+            "message": f"{model_name.replace('_', ' ').title()} model trained incrementally",
+            "model": model_name,
+            "mode": "incremental",
+            "epochs": epochs,
+            "chunk_rows": chunk_rows,
+            "train_rows": total_rows,
+            "classes": [str(label) for label in classes],
+            "history": history,
+            "validation_accuracy": history[-1]["validation_accuracy"] if history else 0.0,
+            "test_accuracy": round(test_accuracy, 4),
+            "normalized": bool(suffix),
+            "model_path": model_path,
+            "preprocessing_path": preprocessing_path,
+            "registry_version": manifest["version"],
+            "sha256": manifest["sha256"],
+            "profile": profile,
+            "compiled_model_path": compiled_path,
+            "compiled_profile": None
+        }, 200
+
+    except Exception as e:
+        return {
+            "error": f"Error training {model_name} model incrementally: {str(e)}",
+            "traceback": traceback.format_exc()
+        }, 500
+
+def train_candidate(model_name, data_path, cpus):
+    """Worker for /train_many: fit one model on the memory-mapped splits and measure it"""
+    import joblib
+    from sklearn.metrics import accuracy_score
+    from threadpoolctl import threadpool_limits
+
+    # Arrays are memory-mapped read-only, so every worker shares the same pages
+    data = joblib.load(data_path, mmap_mode='r')
+    classifier = get_classifier(model_name)
+    # Give each worker its share of the cores, both for the estimator's own
+    # n_jobs and for the BLAS/OpenMP threads under it
+    if model_name in N_JOBS_MODELS:
+        classifier.set_params(n_jobs=cpus)
+
+    with threadpool_limits(limits=cpus):
+        started = time.perf_counter()
+        classifier.fit(data['X_train'], data['y_train'])
+        fit_seconds = time.perf_counter() - started
+
+        val_accuracy = accuracy_score(data['y_validation'], classifier.predict(data['X_validation']))
+        started = time.perf_counter()
+        test_predictions = classifier.predict(data['X_test'])
+        predict_seconds = time.perf_counter() - started
+        test_accuracy = accuracy_score(data['y_test'], test_predictions)
+
+    # Fitted estimators keep n_jobs; the live predictor runs on one worker thread
+    if model_name in N_JOBS_MODELS:
+        classifier.set_params(n_jobs=None)
+    model_path, compiled_path, _, manifest = save_model(classifier, model_name, data['pipeline'], data['feature_names'])
+    with threadpool_limits(limits=cpus):
+        profile = profile_saved_model(model_path, data['X_test'])
+        if compiled_path:
+            profile_saved_model(compiled_path, data['X_test'])
+
+    return {
+        "model": model_name,
+        "validation_accuracy": round(val_accuracy, 4),
+        "test_accuracy": round(test_accuracy, 4),
+        "fit_seconds": round(fit_seconds, 3),
+        "predict_us_per_row": round(predict_seconds / max(1, len(test_predictions)) * 1e6, 3),
+        "p99_ms_batch_1": profile["batches"]["1"]["p99_ms"],
+        "rows_per_s_batch_64": profile["batches"]["64"]["rows_per_s"],
+        "model_size_kb": profile["model_size_kb"],
+        "model_path": model_path,
+        "compiled_model_path": compiled_path,
+        "registry_version": manifest["version"],
+        "sha256": manifest["sha256"]
+    }
+
+def run_training_many(model_names):
+    """Train several models in parallel on data loaded once; returns (payload, status code)"""
+    import joblib
+
+    try:
+        pipeline, suffix, error = training_splits()
+        if error:
+            return error, 400
+
+        report_progress(0.05, "Loading datasets")
+        data, feature_names = load_splits(suffix)
+        data['pipeline'] = pipeline
+        data['feature_names'] = feature_names
+
+        cores = os.cpu_count() or 1
+        workers = max(1, min(len(model_names), cores))
+        cpus = max(1, cores // workers)
+
+        leaderboard, failed = [], []
+        with tempfile.TemporaryDirectory(prefix='train-many-') as tmp_dir:
+            # Dumped once; workers memory-map it instead of each receiving a pickled copy
+            data_path = os.path.join(tmp_dir, 'splits.joblib')
+            joblib.dump(data, data_path)
+            del data
+
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {pool.submit(train_candidate, name, data_path, cpus): name for name in model_names}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    name = futures[future]
+                    try:
+                        leaderboard.append(future.result())
+                    except Exception as e:
+                        failed.append({"model": name, "error": str(e)})
+                    report_progress(0.1 + 0.9 * done / len(model_names), f"Trained {done}/{len(model_names)} models")
+
+        leaderboard.sort(key=lambda row: (-row["validation_accuracy"], row["predict_us_per_row"]))
+        for rank, row in enumerate(leaderboard, start=1):
+            row["rank"] = rank
+
+        result = {
+            "message": f"Trained {len(leaderboard)} of {len(model_names)} models",
+            "leaderboard": leaderboard,
+            "failed": failed,
+            "normalized": bool(suffix),
+            "workers": workers,
+            "cpus_per_model": cpus,
+            "trained_at": time.time()
+        }
+        os.makedirs('models', exist_ok=True)
+        with open(LEADERBOARD_PATH, 'w') as f:
+            json.dump(result, f, indent=2)
+        return result, 200
+
+    except Exception as e:
+        return {
+            "error": f"Error training models: {str(e)}",
+            "traceback": traceback.format_exc()
+        }, 500
+
+@train_model_routes.route('/train_many', methods=['POST'])
+def train_many():
+    requested = request.args.get('models', request.form.get('models', ''))
+    model_names = [name.strip() for name in requested.split(',') if name.strip()] or MODEL_NAMES
+    unknown = [name for name in model_names if name not in MODEL_NAMES]
+    if unknown:
+        return jsonify({
+            "error": f"Invalid models: {', '.join(unknown)}. Available models: {', '.join(MODEL_NAMES)}"
+        }), 400
+
+    return run_or_submit('train_many', run_training_many, model_names=list(dict.fromkeys(model_names)))
+
+@train_model_routes.route('/leaderboard', methods=['GET'])
+def leaderboard():
+    if not os.path.exists(LEADERBOARD_PATH):
+        return jsonify({"error": "No leaderboard yet. Train models with /train_many first."}), 404
+    with open(LEADERBOARD_PATH) as f:
+        return jsonify(json.load(f))
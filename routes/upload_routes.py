@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify, session
+from flask import Blueprint, request, jsonify, session, send_file
 import os
-import pandas as pd
-from sklearn.model_selection import train_test_split
+from utils.dataset_store import (UPLOAD_FOLDER, remove_dataset, dataset_exists, dataset_dimensions,
+                                 dataset_lock, export_csv, load_dataset_stats)
+from utils.ingest_utils import ingest_csv
 
 upload_routes = Blueprint('upload_routes', __name__)
 
-UPLOAD_FOLDER = 'uploads'
+SPLITS = ["train", "validation", "test"]
 
 @upload_routes.route('/upload', methods=['POST'])
 def upload_file():
@@ -27,87 +28,97 @@ def upload_file():
     elif dataset_type == "train_validation_test" and len(files) != 3:
         return jsonify({"error": "Please upload exactly 3 files for Train + Validation + Test datasets."}), 400
 
-    # Save files and assign them to their respective purposes
     for i, file in enumerate(files):
-        if file.filename == '':
+        if file is None or file.filename == '':
             return jsonify({"error": "No file selected"}), 400
-
-        file_path = os.path.join(UPLOAD_FOLDER, file.filename)
-        file.save(file_path)
-        dataset = pd.read_csv(file_path)
-
-        if 'Label' not in dataset.columns:
-            return jsonify({"error": "Dataset must have a 'Label' column"}), 400
-
-        # Assign file to its purpose
-        if dataset_type == "train_validation_test" or dataset_type == "train_test":
-            purpose = purposes[i]
-            dataset.to_csv(os.path.join(UPLOAD_FOLDER, f"{purpose}.csv"), index=False)
-            details.append(f"{file.filename} uploaded as {purpose} dataset: {dataset.shape[0]} rows, {dataset.shape[1]} columns")
-        else:
-            details.append(f"{file.filename}: {dataset.shape[0]} rows, {dataset.shape[1]} columns")
-
-    # Process datasets based on the type
+        if dataset_type != "train" and purposes[i] not in SPLITS:
+            return jsonify({"error": f"Invalid purpose for {file.filename}: {purposes[i]}. "
+                                     f"Use one of: {', '.join(SPLITS)}"}), 400
+
+    # Pipeline steps still reading or rewriting the old splits finish first
+    with dataset_lock():
+        # Preprocessing state and normalized splits from an earlier dataset no longer apply
+        stale_state = os.path.join(UPLOAD_FOLDER, 'preprocessing.pkl')
+        if os.path.exists(stale_state):
+            os.remove(stale_state)
+        for split in SPLITS:
+            remove_dataset(f"{split}_normalized")
+
+        # Each upload is parsed once, chunk by chunk, straight into the dataset store:
+        # a single file is split into train/validation/test by row hash on the way
+        summary = {}
+        for i, file in enumerate(files):
+            try:
+                if dataset_type == "train":
+                    stats = ingest_csv(file.stream)
+                else:
+                    stats = ingest_csv(file.stream, name=purposes[i])
+            except ValueError as e:
+                return jsonify({"error": f"{file.filename}: {str(e)}"}), 400
+            summary.update(stats)
+
+            if dataset_type == "train":
+                rows = sum(split_stats['rows'] for split_stats in stats.values())
+                details.append(f"{file.filename}: {rows} rows, {stats['train']['columns']} columns")
+            else:
+                details.append(f"{file.filename} uploaded as {purposes[i]} dataset: "
+                               f"{stats[purposes[i]]['rows']} rows, {stats[purposes[i]]['columns']} columns")
+
+    # Shapes come from the counts taken while streaming, not from re-reading the data
     if dataset_type == "train":
-        # Split the single file into train, validation, and test datasets
-        train_df, val_test_df = train_test_split(dataset, test_size=0.3, random_state=42)
-        val_df, test_df = train_test_split(val_test_df, test_size=0.5, random_state=42)
-
-        train_path = os.path.join(UPLOAD_FOLDER, "train.csv")
-        val_path = os.path.join(UPLOAD_FOLDER, "validation.csv")
-        test_path = os.path.join(UPLOAD_FOLDER, "test.csv")
-        
-        train_df.to_csv(train_path, index=False)
-        val_df.to_csv(val_path, index=False)
-        test_df.to_csv(test_path, index=False)
-
-        dimensions = {
-            'train_dimensions': f"{train_df.shape[0]} rows, {train_df.shape[1]} columns",
-            'validation_dimensions': f"{val_df.shape[0]} rows, {val_df.shape[1]} columns",
-            'test_dimensions': f"{test_df.shape[0]} rows, {test_df.shape[1]} columns"
-        }
+        dimensions = {f'{split}_dimensions': f"{summary[split]['rows']} rows, {summary[split]['columns']} columns"
+                      for split in SPLITS}
         details.append("Train dataset split into Train, Validation, and Test sets.")
 
     elif dataset_type == "train_test":
-        # [Previous train_test processing code...]
         dimensions = {
-            'train_dimensions': f"{train_df.shape[0]} rows, {train_df.shape[1]} columns",
-            'test_dimensions': f"{test_df.shape[0]} rows, {test_df.shape[1]} columns"
+            'train_dimensions': dataset_dimensions("train"),
+            'test_dimensions': dataset_dimensions("test")
         }
         details.append("Train and Test datasets uploaded successfully.")
 
     elif dataset_type == "train_validation_test":
-        # For this case, dimensions are already set from the file saving loop
-        dimensions = {}
-        for purpose in purposes:
-            if purpose == 'train':
-                dimensions['train_dimensions'] = f"{pd.read_csv(os.path.join(UPLOAD_FOLDER, 'train.csv')).shape[0]} rows, {pd.read_csv(os.path.join(UPLOAD_FOLDER, 'train.csv')).shape[1]} columns"
-            elif purpose == 'validation':
-                dimensions['validation_dimensions'] = f"{pd.read_csv(os.path.join(UPLOAD_FOLDER, 'validation.csv')).shape[0]} rows, {pd.read_csv(os.path.join(UPLOAD_FOLDER, 'validation.csv')).shape[1]} columns"
-            elif purpose == 'test':
-                dimensions['test_dimensions'] = f"{pd.read_csv(os.path.join(UPLOAD_FOLDER, 'test.csv')).shape[0]} rows, {pd.read_csv(os.path.join(UPLOAD_FOLDER, 'test.csv')).shape[1]} columns"
+        dimensions = {f'{purpose}_dimensions': f"{summary[purpose]['rows']} rows, {summary[purpose]['columns']} columns"
+                      for purpose in purposes}
 
     # Update session
-    session['dataset_path'] = os.path.join(UPLOAD_FOLDER, "train.csv")
+    session['dataset_name'] = "train"
     session['dataset_type'] = dataset_type
 
     return jsonify({
         "message": "Dataset(s) uploaded and processed successfully!",
         "details": details,
+        "summary": summary,
         **dimensions
     })
 
 @upload_routes.route('/get_dataset_dimensions', methods=['GET'])
 def get_dataset_dimensions():
-    datasets = ["train", "validation", "test"]
     dimensions = {}
 
-    for dataset_name in datasets:
-        dataset_path = os.path.join(UPLOAD_FOLDER, f"{dataset_name}.csv")
-        if os.path.exists(dataset_path):
-            dataset = pd.read_csv(dataset_path)
-            dimensions[f"{dataset_name}_dimensions"] = f"{dataset.shape[0]} rows, {dataset.shape[1]} columns"
-        else:
-            dimensions[f"{dataset_name}_dimensions"] = "Not uploaded"
-
-    return jsonify(dimensions)
\ No newline at end of file
+    for dataset_name in SPLITS:
+        dimensions[f"{dataset_name}_dimensions"] = dataset_dimensions(dataset_name)
+
+    return jsonify(dimensions)
+
+@upload_routes.route('/export_dataset/<name>', methods=['GET'])
+def export_dataset(name):
+    """Download a stored dataset as CSV"""
+    allowed = SPLITS + [f"{split}_normalized" for split in SPLITS]
+    if name not in allowed or not dataset_exists(name):
+        return jsonify({"error": f"Dataset not found: {name}"}), 404
+
+    export_dir = os.path.join(UPLOAD_FOLDER, 'exports')
+    os.makedirs(export_dir, exist_ok=True)
+    path = export_csv(name, os.path.join(export_dir, f"{name}.csv"))
+    return send_file(os.path.abspath(path), as_attachment=True, download_name=f"{name}.csv", mimetype='text/csv')
+
+@upload_routes.route('/dataset_stats/<name>', methods=['GET'])
+def dataset_stats(name):
+    """Row count and column statistics recorded when a split was uploaded"""
+    if name not in SPLITS or not dataset_exists(name):
+        return jsonify({"error": f"Dataset not found: {name}"}), 404
+    stats = load_dataset_stats(name)
+    if stats is None:
+        return jsonify({"error": f"No upload statistics for {name}; the dataset was rewritten after upload"}), 404
+    return jsonify(stats)
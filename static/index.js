@@ -44,6 +44,44 @@ function updateStatusMessage(message, type = 'info') {
     statusElement.innerHTML = icon + message;
 }
 
+// Run a pipeline step as a background job and poll it until it finishes,
+// so long steps don't hold the request open; resolves with the step's result
+function runJob(url, options = {}) {
+    const separator = url.includes('?') ? '&' : '?';
+    return fetch(`${url}${separator}async=1`, options)
+        .then(async response => {
+            const data = await response.json();
+            // Validation errors come back immediately instead of as a job
+            if (response.status !== 202) {
+                return data;
+            }
+            return pollJob(data.status_url);
+        });
+}
+
+function pollJob(statusUrl, interval = 1000) {
+    return new Promise((resolve, reject) => {
+        const check = () => {
+            fetch(statusUrl)
+                .then(response => response.json())
+                .then(job => {
+                    if (job.error && !job.status) {
+                        resolve({ error: job.error });
+                    } else if (job.status === 'finished' || job.status === 'failed') {
+                        resolve(job.result || { error: job.error });
+                    } else {
+                        const percent = Math.round(job.progress * 100);
+                        document.getElementById('loadingMessage').textContent =
+                            `${job.message || (job.status === 'queued' ? 'Waiting for a free worker...' : 'Working...')} (${percent}%)`;
+                        setTimeout(check, interval);
+                    }
+                })
+                .catch(reject);
+        };
+        check();
+    });
+}
+
 // Function to load dataset based on type (train, train_test, or train_validation_test)
 function loadDataset(type) {
     datasetType = type;
@@ -201,20 +239,17 @@ function processData(action) {
     showOutputSection();
     clearCurrentStepOutput();
     
-    fetch('/preprocess', {
+    runJob('/preprocess', {
         method: "POST",
         headers: {
             "Content-Type": "application/json",
         },
     })
-    .then(response => {
-        if (!response.ok) {
-            throw new Error(`HTTP error! Status: ${response.status}`);
-        }
-        return response.json();
-    })
     .then(data => {
         hideLoading();
+        if (data.error) {
+            throw new Error(data.error);
+        }
         updateStatusMessage("Preprocessing completed successfully!", 'success');
         
         // Format preprocessing results
@@ -271,14 +306,13 @@ function featureSelection(method) {
     showOutputSection();
     clearCurrentStepOutput();
     
-    fetch('/feature_selection', {
+    runJob('/feature_selection', {
         method: "POST",
         headers: {
             "Content-Type": "application/x-www-form-urlencoded",
         },
         body: "method=" + encodeURIComponent(method)
     })
-    .then(response => response.json())
     .then(data => {
         hideLoading();
         
@@ -335,14 +369,13 @@ function normalizeData(type) {
     showOutputSection();
     clearCurrentStepOutput();
     
-    fetch("/normalize", {
+    runJob("/normalize", {
         method: "POST",
         headers: {
             "Content-Type": "application/x-www-form-urlencoded",
         },
         body: "normalization_type=" + encodeURIComponent(type)
     })
-    .then(response => response.json())
     .then(data => {
         hideLoading();
         
@@ -401,13 +434,14 @@ function normalizeData(type) {
 }
 
 // Function to train models
-function trainModel(model) {
+function trainModel(model, mode = 'full') {
     const modelNames = {
         'decision_tree': 'Decision Tree',
         'naive_bayes': 'Naive Bayes',
         'knn': 'K-Nearest Neighbors',
         'svm': 'Support Vector Machine',
         'logistic_regression': 'Logistic Regression',
+        'sgd': 'SGD Logistic Regression',
         'lda': 'Linear Discriminant Analysis',
         'qda': 'Quadratic Discriminant Analysis',
         'random_forest': 'Random Forest',
@@ -421,27 +455,17 @@ function trainModel(model) {
         return;
     }
 
-    showLoading(`Training ${modelNames[model]} model...`);
+    const incremental = mode === 'incremental';
+    showLoading(`Training ${modelNames[model]} model${incremental ? ' incrementally' : ''}...`);
     showOutputSection();
     clearCurrentStepOutput();
     
-    fetch(`/train?model=${model}`, { 
+    runJob(`/train?model=${model}${incremental ? '&mode=incremental' : ''}`, { 
         method: "POST",
         headers: {
             'Accept': 'application/json'
         }
     })
-    .then(async response => {
-        const contentType = response.headers.get('content-type');
-        const responseData = contentType?.includes('application/json') 
-            ? await response.json() 
-            : { error: await response.text() };
-
-        if (!response.ok) {
-            throw new Error(responseData.error || `HTTP error! Status: ${response.status}`);
-        }
-        return responseData;
-    })
     .then(data => {
         hideLoading();
         
@@ -474,6 +498,46 @@ function trainModel(model) {
                         </tr>
                     </table>
                 </div>
+                ${data.history ? `
+                <div class="mt-3">
+                    <h4 style="color: lightblue;">Epochs (${data.train_rows} rows in chunks of ${data.chunk_rows}):</h4>
+                    <table class="data-table">
+                        <tr>
+                            <th>Epoch</th>
+                            <th>Validation Accuracy</th>
+                            <th>Fit (s)</th>
+                        </tr>
+                        ${data.history.map(row => `
+                        <tr>
+                            <td>${row.epoch}</td>
+                            <td>${(row.validation_accuracy * 100).toFixed(2)}%</td>
+                            <td>${row.fit_seconds}</td>
+                        </tr>
+                        `).join('')}
+                    </table>
+                </div>
+                ` : ''}
+                ${data.profile ? `
+                <div class="mt-3">
+                    <h4 style="color: lightblue;">Inference Profile (${data.profile.model_size_kb} KB on disk):</h4>
+                    <table class="data-table">
+                        <tr>
+                            <th>Batch Size</th>
+                            <th>p50 (ms)</th>
+                            <th>p99 (ms)</th>
+                            <th>Rows/s</th>
+                        </tr>
+                        ${Object.entries(data.profile.batches).map(([size, stats]) => `
+                        <tr>
+                            <td>${size}</td>
+                            <td>${stats.p50_ms}</td>
+                            <td>${stats.p99_ms}</td>
+                            <td>${Math.round(stats.rows_per_s)}</td>
+                        </tr>
+                        `).join('')}
+                    </table>
+                </div>
+                ` : ''}
                 <div class="mt-3">
                     <p>Model saved as: <code>${data.model_path || model + '.pkl'}</code></p>
                 </div>
@@ -512,3 +576,68 @@ function trainModel(model) {
     });
 }
 
+// Function to train every model in parallel and compare them
+function trainAllModels() {
+    showLoading("Training all models...");
+    showOutputSection();
+    clearCurrentStepOutput();
+
+    runJob('/train_many', { method: "POST" })
+    .then(data => {
+        hideLoading();
+
+        if (data.error) {
+            throw new Error(data.error);
+        }
+
+        updateStatusMessage(data.message, data.failed.length ? 'warning' : 'success');
+
+        const outputHTML = `
+            <div class="step-result">
+                <h3 class="step-title">Model Leaderboard</h3>
+                <div class="alert alert-success">
+                    ${data.message} using ${data.workers} parallel workers
+                </div>
+                <div class="mt-3">
+                    <table class="data-table">
+                        <tr>
+                            <th>#</th>
+                            <th>Model</th>
+                            <th>Validation</th>
+                            <th>Test</th>
+                            <th>Fit (s)</th>
+                            <th>Predict (&micro;s/row)</th>
+                            <th>Size (KB)</th>
+                        </tr>
+                        ${data.leaderboard.map(row => `
+                        <tr>
+                            <td>${row.rank}</td>
+                            <td>${row.model}</td>
+                            <td>${(row.validation_accuracy * 100).toFixed(2)}%</td>
+                            <td>${(row.test_accuracy * 100).toFixed(2)}%</td>
+                            <td>${row.fit_seconds}</td>
+                            <td>${row.predict_us_per_row}</td>
+                            <td>${row.model_size_kb}</td>
+                        </tr>
+                        `).join('')}
+                    </table>
+                </div>
+                ${data.failed.length ? `
+                <div class="mt-3 alert alert-warning">
+                    <h5>Failed:</h5>
+                    <ul>
+                        ${data.failed.map(row => `<li>${row.model}: ${row.error}</li>`).join('')}
+                    </ul>
+                </div>
+                ` : ''}
+            </div>
+        `;
+
+        document.getElementById('currentStepOutput').innerHTML = outputHTML;
+    })
+    .catch(error => {
+        hideLoading();
+        updateStatusMessage("Training error: " + error.message, 'danger');
+        console.error("Training Error:", error);
+    });
+}
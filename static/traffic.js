@@ -8,13 +8,21 @@ document.addEventListener('DOMContentLoaded', function() {
     const fileInfoElement = document.getElementById('fileInfo');
     const packetCountElement = document.getElementById('packetCount');
     const threatLevelElement = document.getElementById('threatLevel');
-    const trafficGraph = document.getElementById('trafficGraph');
+    const trafficChart = document.getElementById('trafficChart');
     const predictionTableBody = document.getElementById('predictionTableBody');
     const activityLog = document.getElementById('activityLog');
     
     let modelLoaded = false;
     let isMonitoring = false;
     let updateInterval;
+    let eventSource = null;
+    let captureSession = null;
+    let alertSeq = 0;
+
+    // Client-side state fed by the server's deltas
+    const CHART_SECONDS = 60;
+    let recentPredictions = [];
+    const countsBySecond = new Map();
     
     // Model upload handler
     modelUpload.addEventListener('change', function(e) {
@@ -24,7 +32,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const formData = new FormData();
         formData.append('model', file);
         
-        fetch('/load_model', {
+        fetch('/traffic/load_model', {
             method: 'POST',
             body: formData
         })
@@ -48,8 +56,14 @@ document.addEventListener('DOMContentLoaded', function() {
             
             // Update UI with model info
             addLogEntry(`Model loaded: ${data.model_type}`, 'success');
+            addLogEntry(`Registry: ${data.name} v${data.version} (${data.sha256.slice(0, 12)})${data.cached ? ', from cache' : ''}`, 'info');
             addLogEntry(`Features: ${data.features.length || 'Unknown'}`, 'info');
             addLogEntry(`Classes: ${data.classes.join(', ')}`, 'info');
+            if (data.profile) {
+                const single = data.profile.batches['1'];
+                addLogEntry(`Latency p50/p99 (1 row): ${single.p50_ms}/${single.p99_ms} ms, size ${data.profile.model_size_kb} KB`, 'info');
+            }
+            (data.warnings || []).forEach(warning => addLogEntry(warning, 'warning'));
         })
         .catch(error => {
             modelStatus.textContent = 'Error loading model';
@@ -62,7 +76,7 @@ document.addEventListener('DOMContentLoaded', function() {
     startBtn.addEventListener('click', function() {
         if (!modelLoaded) return;
         
-        fetch('/start_capture', {
+        fetch('/traffic/start_capture', {
             method: 'POST'
         })
         .then(response => response.json())
@@ -73,15 +87,22 @@ document.addEventListener('DOMContentLoaded', function() {
             }
             
             isMonitoring = true;
+            captureSession = data.session;
             startBtn.disabled = true;
             stopBtn.disabled = false;
             statusElement.className = 'status-card status-active';
             statusElement.querySelector('.status-text').textContent = 'Monitoring network traffic';
             fileInfoElement.textContent = data.output_file;
             
-            // Start updating UI
-            updateInterval = setInterval(updateUI, 1000);
+            // Updates arrive on the event stream; poll only without one
+            resetView();
+            if (!eventSource) {
+                updateInterval = setInterval(updateUI, 1000);
+            }
             addLogEntry('Started network traffic capture', 'success');
+            if (data.capture && data.capture.sample_rate > 1) {
+                addLogEntry(`Sampling ${data.capture.sampling} 1 in ${data.capture.sample_rate}: multiply counts by ${data.capture.sample_rate}`, 'warning');
+            }
         })
         .catch(error => {
             addLogEntry(`Error starting capture: ${error.message}`, 'error');
@@ -90,8 +111,10 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Stop capture handler
     stopBtn.addEventListener('click', function() {
-        fetch('/stop_capture', {
-            method: 'POST'
+        fetch('/traffic/stop_capture', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({session: captureSession})
         })
         .then(response => response.json())
         .then(data => {
@@ -109,31 +132,142 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
-    // Update UI with latest data
+    // Subscribe to prediction deltas and per-second counts pushed by the server
+    function connectStream() {
+        if (!window.EventSource) return;
+
+        eventSource = new EventSource('/traffic/stream');
+        // A snapshot starts over, e.g. when the stream moves on to a newer capture session
+        eventSource.addEventListener('snapshot', e => {
+            resetView();
+            applyUpdate(JSON.parse(e.data));
+        });
+        eventSource.addEventListener('predictions', e => applyUpdate(JSON.parse(e.data)));
+        // The browser reconnects by itself and resumes after the last event id
+        eventSource.onerror = () => console.warn('Prediction stream interrupted, reconnecting');
+    }
+
+    // Fallback for browsers without EventSource
     function updateUI() {
-        fetch('/get_predictions')
+        fetch('/traffic/get_predictions?graph=0')
         .then(response => response.json())
         .then(data => {
-            // Update packet count
-            packetCountElement.textContent = data.count;
-            
-            // Update threat level based on recent predictions
-            updateThreatLevel(data.predictions);
-            
-            // Update graph
-            if (data.graph) {
-                trafficGraph.src = `data:image/png;base64,${data.graph}`;
-                trafficGraph.style.display = 'block';
-            }
-            
-            // Update prediction table
-            updatePredictionTable(data.predictions);
+            recentPredictions = [];
+            countsBySecond.clear();
+            applyUpdate(data);
         })
         .catch(error => {
             console.error('Error updating UI:', error);
         });
     }
-    
+
+    function resetView() {
+        alertSeq = 0;
+        recentPredictions = [];
+        countsBySecond.clear();
+        packetCountElement.textContent = '0';
+        drawChart();
+    }
+
+    function applyUpdate(data) {
+        const packets = (data.predictions || []).filter(p => p.record_type !== 'flow');
+        recentPredictions = recentPredictions.concat(packets).slice(-100);
+        (data.counts || []).forEach(bucket => countsBySecond.set(bucket.second, bucket));
+
+        // Forget seconds that scrolled out of the chart
+        const oldest = Math.floor(Date.now() / 1000) - CHART_SECONDS;
+        for (const second of countsBySecond.keys()) {
+            if (second < oldest) countsBySecond.delete(second);
+        }
+
+        packetCountElement.textContent = data.count;
+        if (data.session && data.alert_seq > alertSeq) {
+            fetchAlerts(data.session, alertSeq);
+            alertSeq = data.alert_seq;
+        }
+        updateThreatLevel(recentPredictions);
+        updatePredictionTable(recentPredictions);
+        drawChart();
+    }
+
+    // Rate alerts are raised from window statistics, ahead of the flow classifier
+    function fetchAlerts(session, since) {
+        fetch(`/traffic/traffic_stats?session=${session}&seconds=1&alerts_since=${since}`)
+        .then(response => response.json())
+        .then(data => (data.alerts || []).forEach(alert => addLogEntry(`Alert: ${alert.message}`, 'error')))
+        .catch(error => console.error('Error fetching alerts:', error));
+    }
+
+    function isMalicious(label) {
+        return label && (label.includes('DDoS') || label.includes('Malicious'));
+    }
+
+    // Packets per second over the last minute, malicious stacked on benign
+    function drawChart() {
+        const ctx = trafficChart.getContext('2d');
+        const ratio = window.devicePixelRatio || 1;
+        const width = trafficChart.clientWidth || 600;
+        const height = trafficChart.clientHeight || 300;
+        if (trafficChart.width !== width * ratio || trafficChart.height !== height * ratio) {
+            trafficChart.width = width * ratio;
+            trafficChart.height = height * ratio;
+        }
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.clearRect(0, 0, width, height);
+
+        const pad = {left: 48, right: 12, top: 24, bottom: 28};
+        const plotWidth = width - pad.left - pad.right;
+        const plotHeight = height - pad.top - pad.bottom;
+        const now = Math.floor(Date.now() / 1000);
+
+        const series = [];
+        for (let second = now - CHART_SECONDS + 1; second <= now; second++) {
+            const bucket = countsBySecond.get(second);
+            let malicious = 0;
+            if (bucket) {
+                Object.entries(bucket.labels).forEach(([label, n]) => {
+                    if (isMalicious(label)) malicious += n;
+                });
+            }
+            const total = bucket ? bucket.packets : 0;
+            series.push({second, benign: total - malicious, malicious});
+        }
+        const peak = Math.max(1, ...series.map(s => s.benign + s.malicious));
+
+        ctx.font = '11px Roboto, sans-serif';
+        ctx.fillStyle = '#666';
+        ctx.strokeStyle = '#e0e0e0';
+        ctx.textAlign = 'right';
+        for (let i = 0; i <= 4; i++) {
+            const y = pad.top + plotHeight * (1 - i / 4);
+            ctx.beginPath();
+            ctx.moveTo(pad.left, y);
+            ctx.lineTo(width - pad.right, y);
+            ctx.stroke();
+            ctx.fillText(Math.round(peak * i / 4), pad.left - 6, y + 4);
+        }
+
+        const barWidth = plotWidth / CHART_SECONDS;
+        series.forEach((s, i) => {
+            const x = pad.left + i * barWidth;
+            const benignHeight = plotHeight * s.benign / peak;
+            const maliciousHeight = plotHeight * s.malicious / peak;
+            ctx.fillStyle = '#4caf50';
+            ctx.fillRect(x + 1, pad.top + plotHeight - benignHeight, barWidth - 2, benignHeight);
+            ctx.fillStyle = '#f44336';
+            ctx.fillRect(x + 1, pad.top + plotHeight - benignHeight - maliciousHeight, barWidth - 2, maliciousHeight);
+        });
+
+        ctx.fillStyle = '#666';
+        ctx.textAlign = 'left';
+        ctx.fillText('Packets per second - Benign (green) vs DDoS (red)', pad.left, pad.top - 8);
+        ctx.textAlign = 'center';
+        [0, 15, 30, 45, 59].forEach(i => {
+            const label = new Date(series[i].second * 1000).toLocaleTimeString();
+            ctx.fillText(label, pad.left + (i + 0.5) * barWidth, height - 8);
+        });
+    }
+
     // Update threat level indicator
     function updateThreatLevel(predictions) {
         if (predictions.length === 0) {
@@ -143,9 +277,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         // Count malicious predictions
-        const maliciousCount = predictions.filter(p => 
-            p.prediction && (p.prediction.includes('DDoS') || p.prediction.includes('Malicious'))
-        ).length;
+        const maliciousCount = predictions.filter(p => isMalicious(p.prediction)).length;
         
         const threatPercentage = (maliciousCount / predictions.length) * 100;
         
@@ -186,7 +318,7 @@ document.addEventListener('DOMContentLoaded', function() {
             const row = document.createElement('tr');
             
             // Determine row class based on prediction
-            if (pred.prediction && (pred.prediction.includes('DDoS') || pred.prediction.includes('Malicious'))) {
+            if (isMalicious(pred.prediction)) {
                 row.className = 'table-danger';
             } else {
                 row.className = 'table-success';
@@ -235,7 +367,10 @@ document.addEventListener('DOMContentLoaded', function() {
     function initUI() {
         startBtn.disabled = true;
         stopBtn.disabled = true;
-        trafficGraph.style.display = 'none';
+        drawChart();
+        // Keep the time axis moving between updates
+        setInterval(drawChart, 1000);
+        connectStream();
         addLogEntry('System initialized', 'info');
     }
     
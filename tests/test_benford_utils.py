@@ -0,0 +1,34 @@
+"""The NumPy first-digit extraction must agree with the string-based first_digit."""
+import numpy as np
+import pandas as pd
+
+from utils.benford_utils import first_digit, first_digits_block
+
+
+def assert_same_digits(values):
+    values = np.asarray(values, dtype=np.float64)
+    expected = first_digit(pd.Series(values)).to_numpy()
+    np.testing.assert_array_equal(first_digits_block(values).ravel(), expected)
+
+
+def test_floats_next_to_digit_boundaries():
+    rng = np.random.default_rng(0)
+    rounded = np.round(rng.lognormal(0, 6, 20000), 1)
+    rounded = rounded[rounded > 0]
+    powers = rng.integers(1, 10, 20000) * 10.0 ** rng.integers(-40, 40, 20000)
+    for values in (rounded, powers):
+        assert_same_digits(values)
+        assert_same_digits(np.nextafter(values, 0))
+        assert_same_digits(np.nextafter(values, np.inf))
+
+
+def test_known_boundary_values():
+    assert_same_digits([2.9999999999999996, 79.99999999999999, 9.999999999999998, 0.3, 0.1 + 0.2,
+                        1e-5, 1e22, 1e23, 9.999999999999999e22, 5e-300, 3e-310, -7.999999999999999])
+
+
+def test_integers_and_missing_values():
+    np.testing.assert_array_equal(first_digits_block(np.array([[0, 7], [-42, 1000], [99, 10 ** 18]])),
+                                  [[0, 7], [4, 1], [9, 1]])
+    np.testing.assert_array_equal(first_digits_block(np.array([0.0, np.nan, np.inf, -0.05])).ravel(),
+                                  [0, 0, 0, 5])
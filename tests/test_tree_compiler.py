@@ -0,0 +1,67 @@
+"""Compiled tree ensembles must predict exactly what the sklearn models they come from do."""
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+
+from utils.tree_compiler import compile_model
+
+MODELS = {
+    'decision_tree': lambda depth: DecisionTreeClassifier(max_depth=depth, random_state=0),
+    'random_forest': lambda depth: RandomForestClassifier(n_estimators=15, max_depth=depth, random_state=0),
+    'gradient_boosting': lambda depth: GradientBoostingClassifier(n_estimators=15, max_depth=depth or 12,
+                                                                  random_state=0),
+}
+
+
+def dataset(n_classes, missing=False):
+    X, y = make_classification(n_samples=1200, n_features=12, n_informative=8, n_classes=n_classes,
+                               random_state=n_classes)
+    if missing:
+        X[np.random.default_rng(0).random(X.shape) < 0.05] = np.nan
+    return X[:900], y[:900], X[900:]
+
+
+def assert_identical(model, X):
+    compiled = compile_model(model)
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X))
+    if hasattr(model, 'decision_function'):
+        np.testing.assert_array_equal(compiled.decision_function(X), model.decision_function(X))
+    return compiled
+
+
+# Shallow models are padded to complete trees, unlimited depth keeps the sparse layout
+@pytest.mark.parametrize('depth, layout', [(6, 'complete'), (None, 'sparse')])
+@pytest.mark.parametrize('n_classes', [2, 3])
+@pytest.mark.parametrize('name', sorted(MODELS))
+def test_compiled_matches_sklearn(name, n_classes, depth, layout):
+    X_train, y_train, X_test = dataset(n_classes)
+    model = MODELS[name](depth).fit(X_train, y_train)
+    compiled = assert_identical(model, X_test)
+    assert compiled.layout == layout
+
+
+@pytest.mark.parametrize('name', ['decision_tree', 'random_forest'])
+def test_compiled_matches_sklearn_with_missing_values(name):
+    X_train, y_train, X_test = dataset(3, missing=True)
+    model = MODELS[name](6).fit(X_train, y_train)
+    assert_identical(model, X_test)
+
+
+def test_compiled_matches_sklearn_on_labels_and_dataframes():
+    pd = pytest.importorskip('pandas')
+    X_train, y_train, X_test = dataset(3)
+    columns = [f"f{i}" for i in range(X_train.shape[1])]
+    labels = np.array(['Benign', 'DDoS', 'PortScan'])[y_train]
+    model = RandomForestClassifier(n_estimators=10, max_depth=6, random_state=0)
+    model.fit(pd.DataFrame(X_train, columns=columns), labels)
+    assert_identical(model, pd.DataFrame(X_test, columns=columns))
+
+
+def test_wrong_feature_count_is_rejected():
+    X_train, y_train, X_test = dataset(2)
+    compiled = compile_model(DecisionTreeClassifier(max_depth=3, random_state=0).fit(X_train, y_train))
+    with pytest.raises(ValueError):
+        compiled.predict(X_test[:, :-1])
@@ -0,0 +1,49 @@
+"""Verdict cache keys: which rows share a cached verdict and which go to the model."""
+import numpy as np
+
+from utils.inference_utils import VerdictCache
+
+FEATURES = ['destination_port', 'total_fwd_packets', 'flow_duration', 'packet_length_mean']
+
+
+class Model:
+    feature_names = FEATURES
+
+
+def row(src, sport, packets, duration, length):
+    return {'source_ip': src, 'destination_ip': '192.168.1.10', 'src_port': sport, 'dst_port': 80,
+            'protocol': 6, 'destination_port': 80, 'total_fwd_packets': packets,
+            'total_backward_packets': 0, 'flow_duration': duration, 'packet_length_mean': length}
+
+
+def classify(cache, rows, model):
+    calls = []
+
+    def model_call(features):
+        calls.append(len(features))
+        return [('Benign', 1.0)] * len(features)
+
+    features = np.array([[r[name] for name in FEATURES] for r in rows], dtype=float)
+    cache.classify(rows, features, model, model_call)
+    return sum(calls)
+
+
+def test_growing_counters_keep_a_flows_signature():
+    cache, model = VerdictCache(), Model()
+    rows = [row('10.0.0.1', 4000, packets, 5000.0 + packets * 100, 60.0) for packets in range(4, 15)]
+    assert classify(cache, rows, model) == 1
+
+
+def test_changed_packet_sizes_are_classified_again():
+    cache, model = VerdictCache(), Model()
+    assert classify(cache, [row('10.0.0.1', 4000, 2, 1000.0, 60.0)], model) == 1
+    assert classify(cache, [row('10.0.0.1', 4000, 3, 1500.0, 1400.0)], model) == 1
+
+
+def test_first_packets_of_different_flows_share_a_verdict():
+    cache, model = VerdictCache(), Model()
+    flood = [row(f"172.16.0.{i}", 1024 + i, 1, 0.0, 60.0) for i in range(50)]
+    assert classify(cache, flood, model) == 1
+    # Later packets of a flow are keyed by its 5-tuple
+    later = [row(f"172.16.0.{i}", 1024 + i, 2, 10.0, 60.0) for i in range(3)]
+    assert classify(cache, later, model) == 3
@@ -1,36 +1,139 @@
 import numpy as np
-import pandas as pd
 
 BENFORD_PROBS = np.array([0.301, 0.176, 0.125, 0.097, 0.079, 0.067, 0.058, 0.051, 0.046])
 
+# Relative distance from a digit boundary within which the scaled float is
+# compared exactly, well above the few ulps scaling by 10**k can be off
+BOUNDARY_TOLERANCE = 1e-9
+# Powers of ten a float64 holds exactly
+EXACT_POWERS_OF_TEN = np.array([float(10 ** k) for k in range(23)])
+
+def get_first_non_zero_digit(number):
+    num_str = str(number).replace(',', '')
+    for char in num_str:
+        if char.isdigit() and char != '0':
+            return int(char)
+    return np.nan
+
 def first_digit(series):
-    def get_first_non_zero_digit(number):
-        num_str = str(number).replace(',', '')
-        for char in num_str:
-            if char.isdigit() and char != '0':
-                return int(char)
-        return np.nan
     return series.apply(get_first_non_zero_digit).dropna().astype(int)
 
 def chi_square_test(observed_counts, expected_counts):
     return np.sum(((observed_counts - expected_counts) ** 2) / expected_counts)
 
-def apply_benford_law(df):
+def _boundary_digits(x, boundary, exp):
+    """Leading digit of floats ``x`` lying within rounding error of ``boundary * 10**exp``.
+
+    The float nearest to the boundary is written as the boundary by ``repr``;
+    any other float is exactly below or above it.
+    """
+    boundary = boundary.astype(np.int64)
+    exp = exp.astype(np.int64)
+    nearest = np.empty_like(x)
+    # Within this range one multiplication or division by an exact power of ten
+    # is correctly rounded; beyond it Python parses the decimal exactly
+    exact = np.abs(exp) < len(EXACT_POWERS_OF_TEN)
+    power = EXACT_POWERS_OF_TEN[np.abs(exp[exact])]
+    nearest[exact] = np.where(exp[exact] >= 0, boundary[exact] * power, boundary[exact] / power)
+    nearest[~exact] = [float(f"{b}e{e}") for b, e in zip(boundary[~exact], exp[~exact])]
+    digit = np.where(x >= nearest, boundary, boundary - 1)
+    # 10 * 10**exp leads with 1 and anything just below 1 * 10**exp with 9
+    return np.where(digit == 10, 1, np.where(digit == 0, 9, digit))
+
+def first_digits_block(values):
+    """Leading non-zero digit of every entry of a 2-D numeric block, computed with NumPy.
+
+    Entries without a leading digit (0, NaN, inf) get 0. Integer blocks are reduced
+    exactly with integer division; float blocks are scaled by a power of ten found
+    with log10, and values next to a digit boundary are settled exactly, so the
+    digit is the one ``first_digit`` reads from the shortest decimal string.
+    """
+    values = np.asarray(values)
+    if values.ndim == 1:
+        values = values.reshape(-1, 1)
+
+    if values.dtype.kind in 'iu':
+        if values.dtype.kind == 'u':
+            x = values.astype(np.uint64, copy=False)
+        else:
+            x = np.abs(values.astype(np.int64, copy=False)).astype(np.uint64)
+        while True:
+            big = x >= 10
+            if not big.any():
+                break
+            x = np.where(big, x // 10, x)
+        return x.astype(np.int8)
+
+    x = np.abs(values.astype(np.float64, copy=False))
+    digits = np.zeros(x.shape, dtype=np.int8)
+    valid = np.isfinite(x) & (x > 0)
+    xv = x[valid]
+    if xv.size == 0:
+        return digits
+
+    exp = np.floor(np.log10(xv))
+    # 10**-exp overflows and precision runs out for (sub)normal values this small,
+    # so the rare ones are read from their decimal string like first_digit does
+    tiny = exp < -290
+    if tiny.any():
+        exp[tiny] = 0
+    # Multiply by exact powers of ten instead of dividing by 10**-k to limit rounding
+    scale = np.power(10.0, np.abs(exp))
+    above = exp >= 0
+    lead = np.empty_like(xv)
+    lead[above] = xv[above] / scale[above]
+    lead[~above] = xv[~above] * scale[~above]
+    # log10 can land one decade off next to exact powers of ten
+    high = lead >= 10
+    low = lead < 1
+    lead = np.where(high, lead / 10, np.where(low, lead * 10, lead))
+    exp = exp + high - low
+    digit = np.clip(np.floor(lead), 1, 9).astype(np.int8)
+
+    # Within rounding error of a boundary d * 10**exp the scaled value can't tell
+    # which side the float is on, and first_digit reads the shortest decimal
+    # string, which is the boundary itself when the float is the nearest to it
+    boundary = np.rint(lead)
+    near = np.abs(lead - boundary) <= BOUNDARY_TOLERANCE * boundary
+    if near.any():
+        digit[near] = _boundary_digits(xv[near], boundary[near], exp[near])
+    if tiny.any():
+        digit[tiny] = [get_first_non_zero_digit(v) for v in xv[tiny]]
+    digits[valid] = digit
+    return digits
+
+def digit_counts(digits):
+    """Per-column counts of the leading digits 1-9 as a (columns, 9) array."""
+    n_cols = digits.shape[1]
+    offsets = digits.astype(np.int64) + 10 * np.arange(n_cols, dtype=np.int64)
+    counts = np.bincount(offsets.ravel(), minlength=10 * n_cols).reshape(n_cols, 10)
+    return counts[:, 1:]
+
+def benford_digit_counts(df):
+    """Return (columns, counts) for the numeric feature columns of ``df``."""
+    columns = [col for col in df.select_dtypes(include=[np.number]).columns if col != 'Label']
+    counts = np.zeros((len(columns), 9), dtype=np.int64)
+
+    # Integer and float columns are converted as separate blocks so integers stay exact
+    for kinds in ('iu', 'f'):
+        block_cols = [i for i, col in enumerate(columns) if df[col].dtype.kind in kinds]
+        if block_cols:
+            block = df[[columns[i] for i in block_cols]].to_numpy()
+            counts[block_cols] = digit_counts(first_digits_block(block))
+    return columns, counts
+
+def benford_selection(columns, counts):
+    """Chi-square statistics and median-threshold selection from per-column digit counts."""
     chi_stats = []
     processed_columns = []
 
-    for column in df.select_dtypes(include=[np.number]).columns:
-        if column == 'Label':
-            continue
-
-        first_digits = first_digit(df[column].dropna())
-        if first_digits.empty:
+    for column, observed_counts in zip(columns, counts):
+        total_values = observed_counts.sum()
+        if total_values == 0:
             continue
 
-        total_values = len(first_digits)
-        observed_counts = [(first_digits == digit).sum() for digit in range(1, 10)]
         expected_counts = BENFORD_PROBS * total_values
-        chi_square_statistic = chi_square_test(np.array(observed_counts), expected_counts)
+        chi_square_statistic = chi_square_test(observed_counts, expected_counts)
 
         chi_stats.append(chi_square_statistic)
         processed_columns.append(column)
@@ -38,6 +141,7 @@ def apply_benford_law(df):
     if not chi_stats:
         return {"error": "No numeric columns available for feature selection."}
 
+    import pandas as pd
     chi_stats_df = pd.DataFrame({'Features': processed_columns, 'Chi-Square': chi_stats})
     mean_threshold = chi_stats_df['Chi-Square'].mean()
     median_threshold = chi_stats_df['Chi-Square'].median()
@@ -53,4 +157,48 @@ def apply_benford_law(df):
         "median_threshold": median_threshold,
         "selected_features": selected_features,
         "chi_stats": chi_stats_df.to_dict(orient="records")
-    }
\ No newline at end of file
+    }
+
+def apply_benford_law(df):
+    columns, counts = benford_digit_counts(df)
+    return benford_selection(columns, counts)
+
+def benford_digit_counts_chunks(columns, chunks):
+    """Accumulate per-column digit histograms over an iterable of DataFrame chunks.
+
+    Only the 9-bin counts are kept, so peak memory depends on the chunk size and
+    not on the number of rows. A column that turns out non-numeric in any chunk
+    is dropped, just as reading the whole file at once would have made it object.
+    """
+    counts = np.zeros((len(columns), 9), dtype=np.int64)
+    position = {col: i for i, col in enumerate(columns)}
+    non_numeric = set()
+
+    for chunk in chunks:
+        numeric = set(chunk.select_dtypes(include=[np.number]).columns)
+        non_numeric.update(col for col in columns if col not in numeric)
+        chunk = chunk[[col for col in columns if col not in non_numeric]]
+        chunk_columns, chunk_counts = benford_digit_counts(chunk)
+        counts[[position[col] for col in chunk_columns]] += chunk_counts
+
+    keep = [i for i, col in enumerate(columns) if col not in non_numeric]
+    return [columns[i] for i in keep], counts[keep]
+
+def benford_digit_counts_csv(path, chunksize=100000):
+    """Streaming version of ``benford_digit_counts`` for a CSV file.
+
+    A first chunk decides which columns can be numeric and the rest of the
+    file is read with ``usecols`` limited to them.
+    """
+    import pandas as pd
+
+    head = pd.read_csv(path, nrows=chunksize)
+    columns = [col for col in head.select_dtypes(include=[np.number]).columns if col != 'Label']
+    del head
+    if not columns:
+        return [], np.zeros((0, 9), dtype=np.int64)
+    return benford_digit_counts_chunks(columns, pd.read_csv(path, usecols=columns, chunksize=chunksize))
+
+def apply_benford_law_streaming(path, chunksize=100000):
+    columns, counts = benford_digit_counts_csv(path, chunksize=chunksize)
+    return benford_selection(columns, counts)
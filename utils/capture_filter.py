@@ -0,0 +1,242 @@
+import ctypes
+import select
+import socket
+import struct
+import time
+import zlib
+
+# Linux socket option and classic BPF opcode used to accept a packet
+SO_ATTACH_FILTER = 26
+BPF_RET_K = 0x06
+
+# Enough for Ethernet + 802.1Q + IPv4 and TCP headers with options
+MIN_SNAPLEN = 128
+MAX_SNAPLEN = 262144
+
+SAMPLING_MODES = ('none', 'count', 'flow')
+
+ETH_P_IP = 0x0800
+ETH_P_8021Q = 0x8100
+
+# pcap link types the sampler can find the IPv4 header in
+DLT_NULL = 0
+DLT_EN10MB = 1
+DLT_LOOP = 108
+DLT_LINUX_SLL = 113
+DLT_LINUX_SLL2 = 276
+RAW_IP_LINKTYPES = (12, 14, 101, 228)
+
+# Linux device types (ARPHRD_*) and the link type their frames arrive with
+ARPHRD_LINKTYPES = {1: DLT_EN10MB, 772: DLT_EN10MB, 65534: 101}
+
+
+def bpf_instructions(bpf_filter=None, snaplen=None, linktype=1):
+    """Classic BPF program for a filter expression and snap length, as (code, jt, jf, k) tuples.
+
+    The filter is compiled by libpcap. The snap length is applied the way
+    libpcap does it: every instruction that accepts a packet returns the
+    number of bytes to keep, so the kernel truncates before copying.
+    Without a filter the program accepts everything.
+    """
+    snaplen = int(snaplen) if snaplen else MAX_SNAPLEN
+    if not bpf_filter:
+        return [(BPF_RET_K, 0, 0, snaplen)]
+
+    from scapy.arch.common import compile_filter
+    from scapy.error import Scapy_Exception
+    try:
+        program = compile_filter(bpf_filter, linktype=linktype)
+    except ImportError as e:
+        raise ValueError(f"BPF filters need libpcap: {str(e)}")
+    except (Scapy_Exception, OSError) as e:
+        raise ValueError(f"Invalid BPF filter {bpf_filter!r}: {str(e)}")
+    instructions = []
+    for i in range(program.bf_len):
+        insn = program.bf_insns[i]
+        k = insn.k
+        if insn.code == BPF_RET_K and k:
+            k = min(k, snaplen)
+        instructions.append((insn.code, insn.jt, insn.jf, k))
+    return instructions
+
+
+def interface_linktype(iface):
+    """Link type of the frames a packet socket on ``iface`` reads; Ethernet when it cannot be told."""
+    if not iface or '/' in str(iface):
+        return DLT_EN10MB
+    try:
+        with open(f"/sys/class/net/{iface}/type") as f:
+            return ARPHRD_LINKTYPES.get(int(f.read()), DLT_EN10MB)
+    except (OSError, ValueError):
+        return DLT_EN10MB
+
+
+def link_type(cls):
+    """pcap link type number of a scapy link layer class, Ethernet if scapy does not know it."""
+    from scapy.all import conf
+
+    return conf.l2types.layer2num.get(cls, DLT_EN10MB)
+
+
+def attach_bpf(sock, instructions):
+    """Attach a classic BPF program to a Linux packet socket."""
+    code = b''.join(struct.pack('HBBI', *insn) for insn in instructions)
+    buffer = ctypes.create_string_buffer(code, len(code))
+    # struct sock_fprog { unsigned short len; struct sock_filter *filter; }
+    fprog = struct.pack('HL', len(instructions), ctypes.addressof(buffer))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def read_frames(iface, program=None, bpf_filter=None, should_stop=None, poll_interval=0.5):
+    """Yield (link layer class, link type, frame bytes, timestamp) from an interface without dissecting anything.
+
+    On Linux packet sockets ``program`` (see ``bpf_instructions``) is attached
+    so the kernel filters and truncates; other sockets compile ``bpf_filter``
+    themselves and do not apply a snap length.
+    """
+    from scapy.all import conf
+
+    sock = conf.L2listen(iface=iface)
+    try:
+        if isinstance(getattr(sock, 'ins', None), socket.socket):
+            if program is not None:
+                attach_bpf(sock.ins, program)
+        elif bpf_filter:
+            sock.close()
+            sock = conf.L2listen(iface=iface, filter=bpf_filter)
+
+        linktypes = {}
+        while should_stop is None or not should_stop():
+            if not select.select([sock], [], [], poll_interval)[0]:
+                continue
+            cls, frame, ts = sock.recv_raw()
+            if frame:
+                if cls not in linktypes:
+                    linktypes[cls] = link_type(cls)
+                yield cls, linktypes[cls], frame, ts if ts is not None else time.time()
+    finally:
+        sock.close()
+
+
+def ipv4_offset(frame, linktype=DLT_EN10MB):
+    """Offset of the IPv4 header in a frame of the given link type, or None for anything else."""
+    if linktype == DLT_EN10MB:
+        if len(frame) < 14:
+            return None
+        ethertype = (frame[12] << 8) | frame[13]
+        offset = 14
+        if ethertype == ETH_P_8021Q and len(frame) >= 18:
+            ethertype = (frame[16] << 8) | frame[17]
+            offset = 18
+    elif linktype in RAW_IP_LINKTYPES:
+        offset = 0
+        ethertype = ETH_P_IP if frame and frame[0] >> 4 == 4 else None
+    elif linktype == DLT_LINUX_SLL:
+        offset = 16
+        ethertype = (frame[14] << 8) | frame[15] if len(frame) >= 16 else None
+    elif linktype == DLT_LINUX_SLL2:
+        offset = 20
+        ethertype = (frame[0] << 8) | frame[1] if len(frame) >= 20 else None
+    elif linktype in (DLT_NULL, DLT_LOOP):
+        # AF_INET (2) in host byte order for NULL, network byte order for LOOP
+        offset = 4
+        ethertype = ETH_P_IP if frame[:4] in (b'\x02\x00\x00\x00', b'\x00\x00\x00\x02') else None
+    else:
+        return None
+    if ethertype != ETH_P_IP or len(frame) < offset + 20:
+        return None
+    return offset
+
+
+def wire_length(frame, offset):
+    """Length of the frame before truncation, from the IPv4 total length field."""
+    return offset + ((frame[offset + 2] << 8) | frame[offset + 3])
+
+
+def truncated_length(frame, snaplen, linktype=DLT_EN10MB):
+    """Original length of a frame cut at ``snaplen``, or 0 when it was not cut."""
+    if not snaplen or len(frame) < snaplen:
+        return 0
+    offset = ipv4_offset(frame, linktype)
+    return wire_length(frame, offset) if offset is not None else 0
+
+
+def flow_key(frame, offset):
+    """Direction-independent 5-tuple bytes read straight from the frame."""
+    proto = frame[offset + 9]
+    src = frame[offset + 12:offset + 16]
+    dst = frame[offset + 16:offset + 20]
+    l4 = offset + (frame[offset] & 0x0F) * 4
+    if proto in (6, 17) and len(frame) >= l4 + 4:
+        sport = frame[l4:l4 + 2]
+        dport = frame[l4 + 2:l4 + 4]
+    else:
+        sport = dport = b''
+    a, b = src + sport, dst + dport
+    return bytes([proto]) + (a + b if a <= b else b + a)
+
+
+def ipv4_summary(frame, offset):
+    """(source, destination, protocol, TCP flags) of an IPv4 frame, as the dissected packet reports them."""
+    proto = frame[offset + 9]
+    flags = 0
+    l4 = offset + (frame[offset] & 0x0F) * 4
+    # Only the first fragment carries the TCP header
+    first = not ((frame[offset + 6] & 0x1F) or frame[offset + 7])
+    if proto == 6 and first and len(frame) >= l4 + 14:
+        flags = ((frame[l4 + 12] & 0x01) << 8) | frame[l4 + 13]
+    return (socket.inet_ntoa(frame[offset + 12:offset + 16]), socket.inet_ntoa(frame[offset + 16:offset + 20]),
+            proto, flags)
+
+
+class PacketSampler:
+    """Decides from the raw frame whether a packet is dissected at all.
+
+    ``count`` keeps every ``rate``-th IPv4 packet. ``flow`` keeps every packet
+    of roughly one in ``rate`` flows, picked by a hash of the 5-tuple that is
+    the same in both directions, so the flows that are kept have complete
+    features. While sampling, frames without an IPv4 header the sampler can
+    find are dropped, since the pipeline ignores them anyway; ``none`` keeps
+    every frame and leaves that decision to the dissected packet. Counts of
+    kept packets scale back to the link by multiplying with ``rate``.
+    """
+
+    def __init__(self, mode='none', rate=1):
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode: {mode} (expected one of {', '.join(SAMPLING_MODES)})")
+        rate = int(rate)
+        if rate < 1:
+            raise ValueError('sample_rate must be at least 1')
+        self.mode = mode if rate > 1 else 'none'
+        self.rate = rate if self.mode != 'none' else 1
+        self.seen = 0
+        self.kept = 0
+        self.not_ip = 0
+
+    def keep(self, frame, linktype=DLT_EN10MB):
+        self.seen += 1
+        if self.mode == 'none':
+            self.kept += 1
+            return True
+        offset = ipv4_offset(frame, linktype)
+        if offset is None:
+            self.not_ip += 1
+            return False
+        if self.mode == 'count':
+            keep = (self.seen - self.not_ip - 1) % self.rate == 0
+        else:
+            keep = zlib.crc32(flow_key(frame, offset)) % self.rate == 0
+        if keep:
+            self.kept += 1
+        return keep
+
+    def stats(self):
+        ip_packets = self.seen - self.not_ip
+        return {
+            'mode': self.mode,
+            'sample_rate': self.rate,
+            'frames_seen': self.seen,
+            'not_ip': self.not_ip,
+            'kept': self.kept,
+            'kept_ratio': round(self.kept / ip_packets, 4) if ip_packets else None,
+        }
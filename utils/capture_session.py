@@ -0,0 +1,411 @@
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime
+
+
+from utils.capture_filter import PacketSampler, link_type, read_frames, truncated_length
+from utils.flow_utils import FlowTable
+from utils.inference_utils import BatchInferenceEngine, VerdictCache
+from utils.live_feed import LiveFeed
+from utils.perf_utils import LatencyStats
+from utils.replay_utils import replay, replay_source
+from utils.traffic_stats import TrafficStats
+
+logger = logging.getLogger(__name__)
+
+# Flow table limits: idle/active timeouts (seconds) and the maximum number of tracked flows
+FLOW_IDLE_TIMEOUT = 120.0
+FLOW_ACTIVE_TIMEOUT = 1800.0
+MAX_FLOWS = 500000
+
+# Rows each session keeps for the dashboard
+PACKET_HISTORY = 1000
+PREDICTION_HISTORY = 100
+FLOW_HISTORY = 100
+GRAPH_POINTS = 50
+
+
+class SnapshotRing:
+    """Fixed-size ring with one writer and lock-free snapshot reads.
+
+    Every append stores ``(seq, item)`` in the slot for ``seq`` and only then
+    advances ``written``. A reader notes ``written``, copies the slot list
+    (a single atomic operation in CPython) and keeps the slots whose sequence
+    number is the one expected there; a slot overwritten while it was being
+    copied is skipped instead of showing a half-updated view. ``written`` is
+    also the ring's version: it changes exactly when the contents do.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self.written = 0
+
+    def append(self, item):
+        seq = self.written
+        self._slots[seq % self.capacity] = (seq, item)
+        self.written = seq + 1
+
+    def snapshot(self, limit=None):
+        """The newest ``limit`` items (all by default), oldest first."""
+        end = self.written
+        slots = list(self._slots)
+        start = max(0, end - (min(limit, self.capacity) if limit else self.capacity))
+        items = []
+        for seq in range(start, end):
+            slot = slots[seq % self.capacity]
+            if slot is not None and slot[0] == seq:
+                items.append(slot[1])
+        return items
+
+    def __len__(self):
+        return min(self.written, self.capacity)
+
+
+class CaptureSession:
+    """One capture: its source, flow table, inference engine, writer and dashboard buffers.
+
+    Only the capture side writes a session's buffers: the capture thread, the
+    inference worker or the fan-out merge thread, one at a time per buffer.
+    Request handlers read them through ``SnapshotRing`` snapshots and never
+    wait on the capture path. Each capture gets a new session, so starting one
+    never clears buffers a finishing capture is still writing to, and captures
+    on different interfaces run side by side.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, source, writer, classify_batch, batch_size=64, max_latency_ms=50, capacity=10000,
+                 sampler=None, settings=None, iface=None, options=None, on_results=None, traffic_stats=None,
+                 verdict_cache=None):
+        self.id = str(next(self._ids))
+        self.source = source
+        self.iface = iface
+        self.options = options or {}
+        self.writer = writer
+        self.sampler = sampler or PacketSampler()
+        self.settings = settings or {'bpf_filter': None, 'snaplen': None}
+        self.engine = BatchInferenceEngine(
+            classify_batch,
+            on_results or self.handle_predictions,
+            batch_size=batch_size,
+            max_latency_ms=max_latency_ms,
+            capacity=capacity
+        )
+        self.flow_table = FlowTable(
+            idle_timeout=FLOW_IDLE_TIMEOUT,
+            active_timeout=FLOW_ACTIVE_TIMEOUT,
+            max_flows=MAX_FLOWS,
+            on_evict=self.handle_flow_eviction
+        )
+        self.fanout = None
+        # The VerdictCache used by classify_batch, if any; only its counters are read here
+        self.verdict_cache = verdict_cache
+        # Rates, heavy hitters and distinct sources per window, with threshold/EWMA alerts
+        self.traffic_stats = traffic_stats or TrafficStats(sample_rate=self.sampler.rate)
+
+        self.packets = SnapshotRing(PACKET_HISTORY)
+        self.predictions = SnapshotRing(PREDICTION_HISTORY)
+        self.flows = SnapshotRing(FLOW_HISTORY)
+        self.graph_points = SnapshotRing(GRAPH_POINTS)
+        self.feed = LiveFeed()
+        # Last rendered graph as (graph_points version, PNG bytes), kept by whoever renders it
+        self.graph_cache = (-1, None)
+
+        # Per-packet time spent in feature extraction, the flow table update and the window statistics
+        self.stage_latency = {'extract': LatencyStats(), 'flow': LatencyStats(), 'stats': LatencyStats()}
+        self.packets_processed = 0
+        self.started_at = None
+        self.finished_at = None
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self.started_at is not None and not self._finished.is_set()
+
+    @property
+    def stopping(self):
+        return self._stop.is_set()
+
+    def open(self, fanout=None):
+        """Start the writer and the inference worker; packets can be passed to ``process_packet`` from here on.
+
+        With ``fanout`` the worker processes classify, and this session only
+        merges their rows.
+        """
+        self.started_at = time.time()
+        if self.writer is not None:
+            self.writer.start()
+        self.fanout = fanout
+        if fanout is None:
+            self.engine.start()
+
+    def start(self, program=None, fanout=None):
+        """Open the session and start the capture thread for its source"""
+        self.open(fanout)
+        if fanout is not None:
+            target, args = self._run_fanout, ()
+        else:
+            if self.source == 'live':
+                target, args = self._sniff, (program,)
+            else:
+                target, args = self._replay, replay_source(dict(self.options, source=self.source))
+        self._thread = threading.Thread(target=target, args=args, name=f"capture-{self.id}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop reading packets and wait up to ``timeout`` seconds for the pipeline to drain."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        return self._finished.is_set()
+
+    def wait(self, timeout=None):
+        return self._finished.wait(timeout)
+
+    def finish(self, timeout=5):
+        """Drain the pipeline once packets stop arriving"""
+        self._stop.set()
+        if self._finished.is_set():
+            return
+        # Emit the remaining flows so their verdicts are not lost
+        self.flow_table.flush()
+        # Classify whatever is still buffered before the capture ends
+        self.engine.stop(timeout=timeout)
+        if self.writer is not None:
+            self.writer.close()
+        self.finished_at = time.time()
+        self._finished.set()
+
+    def _sniff(self, program=None):
+        """Read raw frames, sample them, and dissect only the packets that are kept"""
+        try:
+            logger.info(f"Session {self.id}: capturing on {self.iface} ({self.settings}, "
+                        f"sampling {self.sampler.mode} 1/{self.sampler.rate})")
+            snaplen = self.settings['snaplen']
+            frames = read_frames(self.iface, program, self.settings['bpf_filter'], should_stop=self._stop.is_set)
+            for cls, linktype, frame, ts in frames:
+                if not self.sampler.keep(frame, linktype):
+                    continue
+                packet = cls(frame)
+                packet.time = ts
+                packet.wirelen = truncated_length(frame, snaplen, linktype) or None
+                self.process_packet(packet)
+        except Exception as e:
+            logger.error(f"Capture error: {str(e)}")
+        finally:
+            self.finish()
+
+    def process_sampled(self, packet):
+        """Apply capture sampling to an already dissected packet, for replayed sources"""
+        frame = getattr(packet, 'original', None) or bytes(packet)
+        # The reader dissected the packet with its link layer class
+        if self.sampler.keep(frame, link_type(type(packet))):
+            self.process_packet(packet)
+
+    def _replay(self, packets, rate=None, speed=None):
+        """Feed recorded or synthetic packets through the same pipeline as live capture"""
+        try:
+            sent = replay(packets, self.process_sampled, rate=rate, speed=speed, should_stop=self._stop.is_set)
+            logger.info(f"Session {self.id}: replay finished after {sent} packets")
+        except Exception as e:
+            logger.error(f"Replay error: {str(e)}")
+        finally:
+            self.finish()
+
+    def _run_fanout(self):
+        """Drive a fan-out capture until its source ends or the session is stopped"""
+        fanout = self.fanout
+        try:
+            fanout.start()
+            while fanout.running():
+                if self._stop.is_set():
+                    fanout.stop()
+                fanout.wait(0.2)
+        except Exception as e:
+            logger.error(f"Fan-out capture error: {str(e)}")
+        finally:
+            fanout.join(timeout=10)
+            self.finish()
+
+    def write_capture_row(self, row):
+        """Hand a classified row to the buffered capture writer"""
+        if self.writer is not None:
+            self.writer.write(row)
+
+    def handle_predictions(self, rows, results):
+        """Record classified rows for the dashboard and the capture file"""
+        for row, (prediction, confidence) in zip(rows, results):
+            row['prediction'] = prediction
+            row['confidence'] = confidence
+
+            if row.get('flow_complete'):
+                # Verdicts for finished flows are shown separately from per-packet rows
+                self.flows.append(row)
+                self.write_capture_row(row)
+                continue
+
+            self.packets.append(row)
+            self.predictions.append(row)
+            self.graph_points.append({
+                'timestamp': row['timestamp'],
+                'length': row['packet_length'],
+                'prediction': row['prediction'],
+                'confidence': row['confidence']
+            })
+            self.write_capture_row(row)
+
+        self.feed.publish(rows)
+
+    def handle_flow_eviction(self, record, reason):
+        """Submit the finished feature vector of an evicted flow for classification"""
+        row = {
+            'timestamp': datetime.fromtimestamp(record.last_seen).isoformat(),
+            'record_type': 'flow',
+            'source_ip': record.src,
+            'destination_ip': record.dst,
+            'src_port': record.sport,
+            'dst_port': record.dport,
+            'protocol': record.proto,
+            'packet_length': record.fwd.bytes + record.bwd.bytes,
+            'flow_packets': record.packets,
+            'flow_end_reason': reason,
+            'flow_complete': True,
+            'sample_rate': self.sampler.rate,
+        }
+        row.update(record.features())
+        self.engine.submit(row)
+
+    def process_packet(self, packet):
+        """Extract the features of one captured packet and queue it for classification"""
+        from scapy.layers.inet import IP, TCP, UDP
+
+        if IP not in packet:
+            return None
+
+        started = time.perf_counter()
+        self.packets_processed += 1
+        ip = packet[IP]
+        # Initialize with basic features we can always extract
+        row = {
+            'timestamp': datetime.now().isoformat(),
+            'record_type': 'packet',
+            'source_ip': ip.src,
+            'destination_ip': ip.dst,
+            'packet_length': packet.wirelen or len(packet),
+            'protocol': ip.proto,
+            'sample_rate': self.sampler.rate,
+            # Capture time; window statistics follow it rather than the clock
+            'packet_time': float(packet.time),
+        }
+
+        sport = dport = 0
+        flags = 0
+        window = None
+        l4 = ip.payload
+        # Add TCP-specific features if available
+        if TCP in packet:
+            l4 = packet[TCP]
+            sport, dport = l4.sport, l4.dport
+            flags = int(l4.flags)
+            window = l4.window
+            row.update({
+                'src_port': sport,
+                'dst_port': dport,
+                'window_size': window,
+                'flags': flags
+            })
+        elif UDP in packet:
+            l4 = packet[UDP]
+            sport, dport = l4.sport, l4.dport
+            row.update({'src_port': sport, 'dst_port': dport})
+
+        # Update the bidirectional flow and attach its running CICIDS-style features;
+        # bytes cut off by the snap length still count as payload
+        payload_len = len(l4.payload) + max(0, row['packet_length'] - len(packet))
+        extracted = time.perf_counter()
+        flow = self.flow_table.update(
+            row['packet_time'], ip.src, ip.dst, sport, dport, ip.proto,
+            payload_len, header_len=len(l4) - payload_len, flags=flags, window=window
+        )
+        row.update(flow.features())
+        updated = time.perf_counter()
+        self.observe(row)
+        self.stage_latency['extract'].add(extracted - started)
+        self.stage_latency['flow'].add(updated - extracted)
+        self.stage_latency['stats'].add(time.perf_counter() - updated)
+
+        # Classification happens in micro-batches on the inference worker
+        self.engine.submit(row)
+        return row
+
+    def observe(self, row):
+        """Count a packet row in the window statistics"""
+        self.traffic_stats.observe(row['source_ip'], row['destination_ip'], row['packet_length'],
+                                   row['protocol'], row.get('flags', 0), row.get('packet_time'))
+
+    def observe_batch(self, batch):
+        """Count (source, destination, length, protocol, flags, timestamp) summaries from a fan-out reader"""
+        for entry in batch:
+            self.traffic_stats.observe(*entry)
+
+    def worker_stats(self):
+        """Counters of a fan-out worker's session, sent back to the web process"""
+        return {
+            'packets_processed': self.packets_processed,
+            'stages': {name: stats.percentiles() for name, stats in self.stage_latency.items()},
+            'inference': self.engine.stats(),
+            'verdict_cache': self.verdict_cache.stats() if self.verdict_cache else None,
+            'flow_table': self.flow_table.stats(),
+        }
+
+    def stats(self):
+        """Packets/s, per-stage latency percentiles and drop counts of this capture"""
+        writer = self.writer
+        fanout = self.fanout
+        if fanout is not None:
+            fanout_stats = fanout.stats()
+            workers = [worker for worker in fanout_stats['per_worker'] if worker]
+            inference = None
+            processed = sum(worker['packets_processed'] for worker in workers)
+            packets_per_s = fanout_stats['rows_per_s']
+            dropped = fanout_stats['ring_dropped'] + sum(worker['inference']['dropped'] for worker in workers)
+            sampling = fanout_stats['reader'] or self.sampler.stats()
+            verdict_cache = VerdictCache.merge_stats(worker.get('verdict_cache') for worker in workers)
+        else:
+            fanout_stats = None
+            inference = self.engine.stats()
+            processed = self.packets_processed
+            packets_per_s = inference['throughput_rows_per_s']
+            dropped = inference['dropped']
+            sampling = self.sampler.stats()
+            verdict_cache = self.verdict_cache.stats() if self.verdict_cache else None
+        return {
+            'session': self.id,
+            'source': self.source,
+            'iface': self.iface,
+            'monitoring': self.running,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'packets_processed': processed,
+            'packets_per_s': packets_per_s,
+            'dropped': dropped,
+            'stages': {
+                'extract': self.stage_latency['extract'].percentiles(),
+                'flow': self.stage_latency['flow'].percentiles(),
+                'stats': self.stage_latency['stats'].percentiles(),
+                'inference': inference['latency'] if inference else None,
+                'write': writer.flush_latency.percentiles() if writer else None,
+            },
+            'inference': inference,
+            'verdict_cache': verdict_cache,
+            'flow_table': self.flow_table.stats(),
+            'writer': writer.stats() if writer else None,
+            # Multiply sampled counts by sample_rate to estimate the traffic on the link
+            'sampling': dict(sampling, **self.settings),
+            'fanout': fanout_stats,
+        }
@@ -0,0 +1,280 @@
+import csv
+import gzip
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from utils.flow_utils import FLOW_FEATURES
+from utils.perf_utils import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Fixed output schema: every row gets every column, whatever protocol it came from
+CAPTURE_FIELDS = [
+    'timestamp', 'record_type', 'source_ip', 'destination_ip', 'src_port', 'dst_port',
+    'protocol', 'packet_length', 'window_size', 'flags', 'flow_end_reason',
+] + FLOW_FEATURES + ['prediction', 'confidence', 'sample_rate']
+
+STRING_FIELDS = {'timestamp', 'record_type', 'source_ip', 'destination_ip', 'flow_end_reason', 'prediction'}
+
+OUTPUT_FORMATS = {
+    'csv': ('.csv', 'text/csv'),
+    'csv.gz': ('.csv.gz', 'application/gzip'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('.arrow', 'application/vnd.apache.arrow.file'),
+}
+
+
+class CaptureWriter:
+    """Background writer for captured rows.
+
+    ``write`` only appends to an in-memory buffer. A writer thread flushes the
+    buffer every ``flush_interval`` seconds or once ``flush_rows`` rows are
+    waiting, keeps the output file open between flushes, and rotates it once it
+    grows past ``rotate_bytes`` or is older than ``rotate_seconds``.
+    At most ``capacity`` rows wait in the buffer: while the disk stalls,
+    further rows are dropped and counted, and rows whose write failed go
+    back to the front of the buffer for the next flush.
+    Columnar formats (parquet, arrow) need pyarrow and write one record batch
+    per flush; they only become readable once rotated or closed.
+    """
+
+    def __init__(self, path, output_format='csv', flush_rows=1000, flush_interval=1.0,
+                 rotate_bytes=100 * 1024 * 1024, rotate_seconds=None, fields=CAPTURE_FIELDS, capacity=100000):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        if output_format in ('parquet', 'arrow'):
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                raise ValueError(f"The {output_format} output format requires pyarrow")
+
+        stem = path[:-len('.csv')] if path.endswith('.csv') else path
+        self.output_format = output_format
+        self.path = stem + OUTPUT_FORMATS[output_format][0]
+        self.mimetype = OUTPUT_FORMATS[output_format][1]
+        self.fields = list(fields)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.capacity = max(self.flush_rows, int(capacity))
+
+        self._buffer = deque()
+        self._wakeup = threading.Event()
+        self._io_lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+        self._file = None
+        self._csv_writer = None
+        self._arrow_writer = None
+        self._arrow_schema = None
+        self._opened_at = None
+
+        self.rows_written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.flushes = 0
+        self.rotated_files = []
+        self.flush_latency = LatencyStats()
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, row):
+        """Buffer one row for the writer thread. Returns False if the buffer is full."""
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            return False
+        self._buffer.append(row)
+        if len(self._buffer) >= self.flush_rows:
+            self._wakeup.set()
+        return True
+
+    def close(self, timeout=5):
+        if not self._running:
+            return
+        self._running = False
+        self._wakeup.set()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        with self._io_lock:
+            self._flush_locked()
+            self._close_file()
+
+    def _run(self):
+        while self._running:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Error writing capture data: {str(e)}")
+
+    def flush(self):
+        with self._io_lock:
+            self._flush_locked()
+
+    def rotate(self):
+        """Close the current file and return its rotated path (None if nothing was written)."""
+        with self._io_lock:
+            self._flush_locked()
+            return self._rotate_locked()
+
+    def latest_complete_file(self):
+        """Path of a file that can be read right now."""
+        if self.output_format in ('csv', 'csv.gz'):
+            self.flush()
+            if os.path.exists(self.path):
+                return self.path
+        else:
+            rotated = self.rotate()
+            if rotated:
+                return rotated
+        return self.rotated_files[-1] if self.rotated_files else None
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        started = time.perf_counter()
+        rows = []
+        buffer = self._buffer
+        while buffer:
+            rows.append(buffer.popleft())
+
+        try:
+            if self._needs_rotation():
+                self._rotate_locked()
+            if self._file is None and self._arrow_writer is None:
+                self._open_file()
+
+            if self._csv_writer is not None:
+                self._csv_writer.writerows(rows)
+                self._file.flush()
+            else:
+                self._write_arrow(rows)
+        except Exception:
+            # Retried on the next flush; whatever no longer fits is dropped, oldest first
+            self.write_errors += 1
+            buffer.extendleft(reversed(rows))
+            while len(buffer) > self.capacity:
+                buffer.popleft()
+                self.dropped += 1
+            raise
+
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.flush_latency.add(time.perf_counter() - started)
+
+    def _needs_rotation(self):
+        if self._opened_at is None:
+            return False
+        if self.rotate_seconds and time.time() - self._opened_at >= self.rotate_seconds:
+            return True
+        if self.rotate_bytes and os.path.exists(self.path) and os.path.getsize(self.path) >= self.rotate_bytes:
+            return True
+        return False
+
+    def _open_file(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        if os.path.exists(self.path) and not self._can_append():
+            # A file left by an earlier capture with another schema is moved aside
+            self._move_aside()
+
+        if self.output_format in ('csv', 'csv.gz'):
+            write_header = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            if self.output_format == 'csv':
+                self._file = open(self.path, 'a', newline='')
+            else:
+                self._file = gzip.open(self.path, 'at', newline='')
+            self._csv_writer = csv.DictWriter(self._file, fieldnames=self.fields, restval='', extrasaction='ignore')
+            if write_header:
+                self._csv_writer.writeheader()
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            self._arrow_schema = pa.schema([
+                (name, pa.string() if name in STRING_FIELDS else pa.float64()) for name in self.fields
+            ])
+            if self.output_format == 'parquet':
+                self._arrow_writer = pq.ParquetWriter(self.path, self._arrow_schema, compression='snappy')
+            else:
+                self._arrow_writer = pa.ipc.new_file(self.path, self._arrow_schema)
+        self._opened_at = time.time()
+
+    def _can_append(self):
+        if self.output_format == 'csv':
+            with open(self.path, newline='') as f:
+                header = next(csv.reader(f), None)
+            return header == self.fields
+        # Columnar files cannot be appended to; gzip members can, but the header must match
+        if self.output_format == 'csv.gz':
+            try:
+                with gzip.open(self.path, 'rt', newline='') as f:
+                    header = next(csv.reader(f), None)
+                return header == self.fields
+            except (OSError, EOFError):
+                return False
+        return False
+
+    def _write_arrow(self, rows):
+        import pyarrow as pa
+        columns = []
+        for field in self._arrow_schema:
+            values = [row.get(field.name) for row in rows]
+            if field.name in STRING_FIELDS:
+                values = [None if v is None else str(v) for v in values]
+            else:
+                values = [None if v is None or v == '' else float(v) for v in values]
+            columns.append(pa.array(values, type=field.type))
+        batch = pa.RecordBatch.from_arrays(columns, schema=self._arrow_schema)
+        if self.output_format == 'parquet':
+            self._arrow_writer.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._arrow_writer.write_batch(batch)
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+        if self._arrow_writer is not None:
+            self._arrow_writer.close()
+        self._file = None
+        self._csv_writer = None
+        self._arrow_writer = None
+        self._opened_at = None
+
+    def _rotate_locked(self):
+        was_open = self._opened_at is not None
+        self._close_file()
+        if not was_open or not os.path.exists(self.path):
+            return None
+        return self._move_aside()
+
+    def _move_aside(self):
+        suffix = OUTPUT_FORMATS[self.output_format][0]
+        stem = self.path[:-len(suffix)]
+        rotated = f"{stem}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}{suffix}"
+        os.replace(self.path, rotated)
+        self.rotated_files.append(rotated)
+        logger.info(f"Rotated capture file to {rotated}")
+        return rotated
+
+    def stats(self):
+        return {
+            'path': os.path.abspath(self.path),
+            'format': self.output_format,
+            'buffered_rows': len(self._buffer),
+            'capacity': self.capacity,
+            'rows_written': self.rows_written,
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+            'flushes': self.flushes,
+            'rotated_files': list(self.rotated_files),
+            'flush_latency': self.flush_latency.percentiles(),
+        }
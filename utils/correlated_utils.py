@@ -1,25 +1,141 @@
-import pandas as pd
 import numpy as np
 
-def CORRELATED(df1):
-    X = df1.drop('Label', axis=1)
+# Rows per block when accumulating the Gram matrix
+BLOCK_ROWS = 65536
 
-    # Step 1: Remove features with zero standard deviation
-    zero_std_features = [col for col in X.columns if X[col].std() == 0]
-    X = X.drop(columns=zero_std_features)
+# float32 products are not exact: pairs with |r| >= threshold - CORRELATION_TOLERANCE are
+# candidates only, and are decided in float64 against threshold - EXACT_TOLERANCE
+CORRELATION_TOLERANCE = 1e-5
+EXACT_TOLERANCE = 1e-12
 
-    # Step 2: Remove highly correlated features
-    correlation_matrix = X.corr().abs()
-    upper_triangle = correlation_matrix.where(np.triu(np.ones(correlation_matrix.shape), k=1).astype(bool))
 
-    highly_correlated_features = set()
-    for column in upper_triangle.columns:
-        correlated_cols = upper_triangle.index[upper_triangle[column] == 1].tolist()
-        for col in correlated_cols:
-            if col not in highly_correlated_features:
-                highly_correlated_features.add(column)
+class CorrelationAccumulator:
+    """Accumulates what is needed for a Pearson correlation matrix block by block.
+
+    Each block is shifted by the first block's column means and multiplied in
+    ``dtype`` (float32 unless exact products are needed); the per-block Gram
+    matrices and column sums are added up in float64.
+    Column minima and maxima are tracked as well to find constant columns.
+    Blocks can come from one in-memory frame or from a chunked CSV read.
+    """
+
+    def __init__(self, columns, dtype=np.float32):
+        self.columns = list(columns)
+        self.dtype = dtype
+        p = len(self.columns)
+        self.n = 0
+        self.shift = None
+        self.sums = np.zeros(p, dtype=np.float64)
+        self.gram = np.zeros((p, p), dtype=np.float64)
+        self.mins = np.full(p, np.inf)
+        self.maxs = np.full(p, -np.inf)
+
+    def update(self, block):
+        block = np.asarray(block, dtype=np.float64)
+        if block.shape[0] == 0:
+            return
+        if self.shift is None:
+            self.shift = block.mean(axis=0)
+        self.mins = np.minimum(self.mins, block.min(axis=0))
+        self.maxs = np.maximum(self.maxs, block.max(axis=0))
+
+        centered = (block - self.shift).astype(self.dtype, copy=False)
+        self.n += centered.shape[0]
+        self.sums += centered.sum(axis=0, dtype=np.float64)
+        self.gram += (centered.T @ centered).astype(np.float64)
+
+    def constant_columns(self):
+        return self.maxs == self.mins
+
+    def correlation(self, keep):
+        """Correlation matrix restricted to the boolean mask ``keep``."""
+        sums = self.sums[keep]
+        cov = self.gram[np.ix_(keep, keep)] - np.outer(sums, sums) / self.n
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        return np.nan_to_num(corr)
+
+
+def _elimination_order(high):
+    """Columns removed by the original left-to-right rule.
+
+    Column j is dropped when some earlier column i, not dropped itself, has
+    |corr(i, j)| >= threshold, as given by the upper triangle of ``high``.
+    """
+    removed = np.zeros(high.shape[0], dtype=bool)
+    for j in np.flatnonzero(high.any(axis=0)):
+        removed[j] = (high[:j, j] & ~removed[:j]).any()
+    return removed
+
+
+def correlated_features_from_blocks(columns, read_blocks, threshold=1.0, tolerance=CORRELATION_TOLERANCE):
+    """Find zero-variance and highly correlated columns from 2-D blocks.
+
+    ``read_blocks()`` returns a fresh iterable of the blocks. The float32 pass
+    only finds candidate pairs; when there are any, the blocks are read a
+    second time to decide those pairs from float64 products of their columns.
+    """
+    accumulator = CorrelationAccumulator(columns)
+    for block in read_blocks():
+        accumulator.update(block)
+
+    columns = np.array(accumulator.columns, dtype=object)
+    if accumulator.n == 0:
+        return {"zero_std": [], "highly_correlated": []}
+
+    constant = accumulator.constant_columns()
+    keep = ~constant
+    high = np.triu(np.abs(accumulator.correlation(keep)) >= threshold - tolerance, k=1)
+    if high.any():
+        candidates = np.flatnonzero(high.any(axis=0) | high.any(axis=1))
+        positions = np.flatnonzero(keep)[candidates]
+        exact = CorrelationAccumulator(positions, dtype=np.float64)
+        for block in read_blocks():
+            exact.update(np.asarray(block, dtype=np.float64)[:, positions])
+        exact_corr = exact.correlation(np.ones(len(positions), dtype=bool))
+        high[np.ix_(candidates, candidates)] &= np.abs(exact_corr) >= threshold - EXACT_TOLERANCE
+    removed = _elimination_order(high)
 
-    X = X.drop(columns=highly_correlated_features)
+    return {
+        "zero_std": columns[constant].tolist(),
+        "highly_correlated": columns[keep][removed].tolist(),
+    }
+
+
+def correlated_features(X, threshold=1.0, block_rows=BLOCK_ROWS, tolerance=CORRELATION_TOLERANCE):
+    """Removed-feature lists for the numeric columns of an in-memory frame."""
+    numeric = X.select_dtypes(include=[np.number]).columns.tolist()
+    values = X[numeric].to_numpy(dtype=np.float64)
+
+    def read_blocks():
+        return (values[start:start + block_rows] for start in range(0, len(values), block_rows))
+
+    return correlated_features_from_blocks(numeric, read_blocks, threshold=threshold, tolerance=tolerance)
+
+
+def correlated_features_csv(path, threshold=1.0, chunksize=BLOCK_ROWS, tolerance=CORRELATION_TOLERANCE):
+    """Same as ``correlated_features`` but streams a CSV file chunk by chunk."""
+    import pandas as pd
+
+    head = pd.read_csv(path, nrows=chunksize)
+    numeric = [col for col in head.select_dtypes(include=[np.number]).columns if col != 'Label']
+    del head
+
+    def read_blocks():
+        chunks = pd.read_csv(path, usecols=numeric, chunksize=chunksize)
+        return (chunk.dropna()[numeric].to_numpy(dtype=np.float64) for chunk in chunks)
+
+    return correlated_features_from_blocks(numeric, read_blocks, threshold=threshold, tolerance=tolerance)
+
+
+def CORRELATED(df1, threshold=1.0):
+    X = df1.drop('Label', axis=1)
+
+    # Step 1: Remove features with zero standard deviation
+    # Step 2: Remove highly correlated features
+    removed_features = correlated_features(X, threshold=threshold)
+    X = X.drop(columns=removed_features["zero_std"] + removed_features["highly_correlated"])
 
     # Step 3: Remove redundant features (identical columns)
     # duplicate_features = X.T.duplicated()
@@ -29,9 +145,4 @@ def CORRELATED(df1):
     # Keep the label column
     X['Label'] = df1['Label']
 
-    removed_features = {
-        "zero_std": zero_std_features,
-        "highly_correlated": list(highly_correlated_features),
-        
-    }
-    return X, removed_features
\ No newline at end of file
+    return X, removed_features
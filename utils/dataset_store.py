@@ -0,0 +1,424 @@
+import contextlib
+import importlib.util
+import json
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: pipeline steps are then not serialized across processes
+    fcntl = None
+
+# pandas and pyarrow are imported where they are used, so routes that only check
+# whether a dataset exists do not load them at startup; CSV is the fallback
+# when pyarrow is not installed
+HAS_PARQUET = importlib.util.find_spec('pyarrow') is not None
+
+UPLOAD_FOLDER = 'uploads'
+
+# Rows per batch when streaming a dataset
+CHUNK_ROWS = 100000
+
+# Parquet row group size; batches are read one row group at a time
+ROW_GROUP_ROWS = 100000
+
+# Lock file held while pipeline steps read or rewrite the stored splits
+DATASET_LOCK_FILE = os.path.join(UPLOAD_FOLDER, '.datasets.lock')
+
+
+@contextlib.contextmanager
+def dataset_lock(exclusive=True):
+    """Hold the dataset store lock: exclusive to rewrite splits, shared to read them.
+
+    An flock, so uploads, inline requests and job worker processes wait for
+    each other instead of one reading a mix of old and new splits.
+    """
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    with open(DATASET_LOCK_FILE, 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def with_dataset_lock(func, exclusive, **params):
+    """``func(**params)`` run under ``dataset_lock``; module-level so job workers can unpickle it."""
+    with dataset_lock(exclusive):
+        return func(**params)
+
+
+def dataset_path(name):
+    """Location of a pipeline dataset (train, validation, test, train_normalized, ...)."""
+    extension = '.parquet' if HAS_PARQUET else '.csv'
+    return os.path.join(UPLOAD_FOLDER, f"{name}{extension}")
+
+
+def dataset_exists(name):
+    return os.path.exists(dataset_path(name))
+
+
+def dataset_stats_path(name):
+    """Column statistics recorded when the dataset was ingested."""
+    return os.path.join(UPLOAD_FOLDER, f"{name}.stats.json")
+
+
+def dataset_sha256_path(name):
+    """Content hash of the dataset, with the file state it was computed for."""
+    return os.path.join(UPLOAD_FOLDER, f"{name}.sha256.json")
+
+
+def save_dataset(df, name):
+    """Write a dataset with typed columns; returns its path."""
+    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    path = dataset_path(name)
+    tmp_path = path + '.tmp'
+    if HAS_PARQUET:
+        df.to_parquet(tmp_path, index=False, row_group_size=ROW_GROUP_ROWS)
+    else:
+        df.to_csv(tmp_path, index=False)
+    # Readers never see a half-written file
+    os.replace(tmp_path, path)
+    remove_dataset_stats(name)
+    return path
+
+
+def _is_number(data_type):
+    import pyarrow.types as pat
+    return pat.is_integer(data_type) or pat.is_floating(data_type) or pat.is_boolean(data_type)
+
+
+def widen_schema(schema, other):
+    """Schema that holds both: differing numeric columns become float64, anything else string."""
+    import pyarrow as pa
+
+    fields = []
+    for field, other_field in zip(schema, other):
+        if field.type == other_field.type or pa.types.is_null(other_field.type):
+            fields.append(field)
+        elif pa.types.is_null(field.type):
+            fields.append(other_field)
+        elif _is_number(field.type) and _is_number(other_field.type):
+            fields.append(pa.field(field.name, pa.float64()))
+        else:
+            fields.append(pa.field(field.name, pa.string()))
+    return pa.schema(fields)
+
+
+class DatasetWriter:
+    """Writes a dataset chunk by chunk, without holding more than a row group in memory.
+
+    Parquet column types come from the first chunk. A later chunk is cast to
+    them, and when that is lossy (an integer column meets fractions, a numeric
+    one meets text) the rows written so far are rewritten once with a schema
+    wide enough for both. Chunks are buffered up to ROW_GROUP_ROWS rows so the
+    row groups stay the size ``iter_dataset_chunks`` reads. The file appears
+    under its name only on ``close``; ``abort`` discards it.
+    """
+
+    def __init__(self, name):
+        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+        self.name = name
+        self.path = dataset_path(name)
+        self.tmp_path = self.path + '.tmp'
+        self.columns = None
+        self.rows = 0
+        self.schema_rewrites = 0
+        self._schema = None
+        self._writer = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, df):
+        if self.columns is None:
+            self.columns = [str(column) for column in df.columns]
+        if not len(df):
+            return
+        self.rows += len(df)
+        if not HAS_PARQUET:
+            df.to_csv(self.tmp_path, mode='w' if self.rows == len(df) else 'a',
+                      header=self.rows == len(df), index=False)
+            return
+
+        table = self._to_table(df)
+        if self._schema is None:
+            self._schema = table.schema
+        elif not table.schema.equals(self._schema):
+            table = self._conform(table)
+        self._pending.append(table)
+        self._pending_rows += len(table)
+        if self._pending_rows >= ROW_GROUP_ROWS:
+            self._flush(ROW_GROUP_ROWS)
+
+    @staticmethod
+    def _to_table(df):
+        import pyarrow as pa
+
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Object columns mixing numbers and text are stored as text
+            df = df.copy()
+            for column in df.select_dtypes(include=['object']).columns:
+                df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        # Pandas metadata would describe the first chunk's dtypes, not the file's
+        return table.replace_schema_metadata(None)
+
+    def _conform(self, table):
+        import pyarrow as pa
+
+        try:
+            return table.cast(self._schema)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            pass
+        self.widen(table.schema)
+        return table.cast(self._schema)
+
+    @property
+    def schema(self):
+        return self._schema
+
+    def widen(self, other):
+        """Widen the column types to also hold ``other``'s, rewriting rows already written if needed."""
+        if self._schema is None or other is None:
+            return
+        schema = widen_schema(self._schema, other)
+        if schema.equals(self._schema):
+            return
+        self._pending = [pending.cast(schema) for pending in self._pending]
+        if self._writer is not None:
+            self._rewrite(schema)
+        self._schema = schema
+
+    def _rewrite(self, schema):
+        """Copy the row groups written so far into a new file with ``schema``."""
+        import pyarrow.parquet as pq
+
+        self._writer.close()
+        self._writer = None
+        old_path = self.tmp_path + '.old'
+        os.replace(self.tmp_path, old_path)
+        writer = pq.ParquetWriter(self.tmp_path, schema)
+        parquet_file = pq.ParquetFile(old_path)
+        for index in range(parquet_file.num_row_groups):
+            writer.write_table(parquet_file.read_row_group(index).cast(schema))
+        parquet_file.close()
+        os.remove(old_path)
+        self._writer = writer
+        self.schema_rewrites += 1
+
+    def _flush(self, group_rows=None):
+        """Write the buffered rows; with ``group_rows``, only whole row groups of that size."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._pending:
+            return
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.tmp_path, self._schema)
+        table = pa.concat_tables(self._pending)
+        keep = len(table) % group_rows if group_rows else 0
+        # The remainder waits for the next chunks instead of becoming a small row group
+        self._pending = [table.slice(len(table) - keep)] if keep else []
+        self._pending_rows = keep
+        self._writer.write_table(table.slice(0, len(table) - keep), row_group_size=ROW_GROUP_ROWS)
+
+    def close(self):
+        """Finish the file and move it into place; returns its path."""
+        if HAS_PARQUET:
+            self._flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        if self.rows == 0:
+            import pandas as pd
+            empty = pd.DataFrame(columns=self.columns or [])
+            if HAS_PARQUET:
+                empty.to_parquet(self.tmp_path, index=False)
+            else:
+                empty.to_csv(self.tmp_path, index=False)
+        os.replace(self.tmp_path, self.path)
+        remove_dataset_stats(self.name)
+        return self.path
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._pending = []
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def load_dataset(name, columns=None):
+    """Read a dataset, optionally only some of its columns."""
+    import pandas as pd
+
+    path = dataset_path(name)
+    if HAS_PARQUET:
+        return pd.read_parquet(path, columns=columns, memory_map=True)
+    return pd.read_csv(path, usecols=columns)
+
+
+def dataset_columns(name):
+    """Column names, read from the file footer/header only."""
+    path = dataset_path(name)
+    if HAS_PARQUET:
+        import pyarrow.parquet as pq
+        return pq.read_schema(path, memory_map=True).names
+    import pandas as pd
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def numeric_columns(name):
+    """Names of the numeric columns, from the stored schema."""
+    path = dataset_path(name)
+    if HAS_PARQUET:
+        import pyarrow.parquet as pq
+        import pyarrow.types as pat
+        schema = pq.read_schema(path, memory_map=True)
+        return [field.name for field in schema
+                if pat.is_integer(field.type) or pat.is_floating(field.type)]
+    import numpy as np
+    import pandas as pd
+    head = pd.read_csv(path, nrows=CHUNK_ROWS)
+    return head.select_dtypes(include=[np.number]).columns.tolist()
+
+
+def dataset_shape(name):
+    """(rows, columns) from the Parquet footer, without scanning the data."""
+    path = dataset_path(name)
+    if HAS_PARQUET:
+        import pyarrow.parquet as pq
+        metadata = pq.read_metadata(path, memory_map=True)
+        return metadata.num_rows, metadata.num_columns
+    import pandas as pd
+    rows = 0
+    for chunk in pd.read_csv(path, usecols=[0], chunksize=CHUNK_ROWS):
+        rows += len(chunk)
+    return rows, len(dataset_columns(name))
+
+
+def dataset_dimensions(name, missing="Not uploaded"):
+    if not dataset_exists(name):
+        return missing
+    rows, cols = dataset_shape(name)
+    return f"{rows} rows, {cols} columns"
+
+
+def iter_dataset_chunks(name, columns=None, chunksize=CHUNK_ROWS):
+    """Yield the dataset as DataFrames of at most ``chunksize`` rows."""
+    path = dataset_path(name)
+    if HAS_PARQUET:
+        import pyarrow.parquet as pq
+        parquet_file = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet_file.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunksize)
+
+
+def memmap_dataset(name, classes, directory, chunksize=CHUNK_ROWS):
+    """Copy a dataset into memory-mapped arrays, one chunk at a time.
+
+    Features (all columns but the last) go to a float32 array and labels to
+    their index in ``classes``, both .npy files in ``directory``. Chunks are
+    appended in file order, so the copy writes each page once, in sequence,
+    even when the split is larger than memory; readers shuffle by visiting
+    blocks of rows in random order. Returns (features, labels).
+    """
+    import numpy as np
+
+    rows, columns = dataset_shape(name)
+    features = np.lib.format.open_memmap(os.path.join(directory, 'features.npy'), mode='w+',
+                                         dtype=np.float32, shape=(rows, columns - 1))
+    labels = np.lib.format.open_memmap(os.path.join(directory, 'labels.npy'), mode='w+',
+                                       dtype=np.int32, shape=(rows,))
+    offset = 0
+    for chunk in iter_dataset_chunks(name, chunksize=chunksize):
+        end = offset + len(chunk)
+        features[offset:end] = chunk.iloc[:, :-1].to_numpy(dtype=np.float32)
+        labels[offset:end] = np.searchsorted(classes, chunk.iloc[:, -1].to_numpy())
+        offset = end
+    features.flush()
+    labels.flush()
+    return features, labels
+
+
+def remove_dataset(name):
+    path = dataset_path(name)
+    if os.path.exists(path):
+        os.remove(path)
+    remove_dataset_stats(name)
+    if os.path.exists(dataset_sha256_path(name)):
+        os.remove(dataset_sha256_path(name))
+
+
+def dataset_sha256(name, known=None):
+    """Content hash of a stored dataset.
+
+    The hash is remembered next to the dataset together with the file's
+    inode, size and mtime, so it is only recomputed after the file is
+    replaced. ``known`` records a hash the caller already has for the file.
+    """
+    import hashlib
+
+    path = dataset_path(name)
+    status = os.stat(path)
+    stamp = [status.st_ino, status.st_size, status.st_mtime_ns]
+    sidecar = dataset_sha256_path(name)
+    if known is None:
+        try:
+            with open(sidecar) as f:
+                saved = json.load(f)
+            if saved.get('stamp') == stamp:
+                return saved['sha256']
+        except (OSError, ValueError, KeyError):
+            pass
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        known = digest.hexdigest()
+    with open(sidecar, 'w') as f:
+        json.dump({'sha256': known, 'stamp': stamp}, f)
+    return known
+
+
+def save_dataset_stats(name, stats):
+    path = dataset_stats_path(name)
+    with open(path, 'w') as f:
+        json.dump(stats, f, indent=2)
+    return path
+
+
+def load_dataset_stats(name):
+    """Statistics saved at ingest, or None if the dataset was rewritten since."""
+    path = dataset_stats_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def remove_dataset_stats(name):
+    path = dataset_stats_path(name)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def export_csv(name, target):
+    """Write a stored dataset out as CSV, streaming it batch by batch."""
+    header = True
+    with open(target, 'w', newline='') as f:
+        for chunk in iter_dataset_chunks(name):
+            chunk.to_csv(f, index=False, header=header)
+            header = False
+        if header:
+            import pandas as pd
+            pd.DataFrame(columns=dataset_columns(name)).to_csv(f, index=False)
+    return target
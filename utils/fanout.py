@@ -0,0 +1,357 @@
+import logging
+import multiprocessing
+import queue
+import struct
+import threading
+import time
+import zlib
+from multiprocessing import shared_memory
+
+from utils.capture_filter import DLT_EN10MB, flow_key, ipv4_offset, ipv4_summary, read_frames, truncated_length
+
+logger = logging.getLogger(__name__)
+
+# Per-worker ring: slots of RING_SLOT_SIZE bytes; longer frames are cut and keep their wire length
+RING_SLOTS = 8192
+RING_SLOT_SIZE = 2048
+
+# Frames a worker takes per read, and how long it sleeps on an empty ring
+RING_BATCH = 256
+RING_POLL_INTERVAL = 0.001
+
+# How often workers report their counters while running
+WORKER_STATS_INTERVAL = 1.0
+
+# The reader sends packet summaries for the window statistics in batches of this
+# many, or sooner once the oldest has waited OBSERVE_INTERVAL seconds
+OBSERVE_BATCH = 256
+OBSERVE_INTERVAL = 0.05
+
+# Ring header: head (frames written), tail (frames read), closed flag, frames dropped when full
+_HEADER = struct.Struct('<qqqq')
+# Slot header: captured length, wire length (0 if not cut), timestamp, pcap link type
+_SLOT = struct.Struct('<IIdI')
+
+
+class FrameRing:
+    """Single-producer, single-consumer ring of raw frames in shared memory.
+
+    The reader process writes a frame into the next free slot and only then
+    advances ``head``; the worker copies frames out and then advances
+    ``tail``. Each counter has one writer, so no lock is needed. A full ring
+    drops the frame and counts it rather than blocking the reader.
+    """
+
+    def __init__(self, name=None, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE):
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=_HEADER.size + slots * (_SLOT.size + slot_size))
+            self._shm.buf[:_HEADER.size] = _HEADER.pack(0, 0, 0, 0)
+            self.owner = True
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.name = self._shm.name
+        self.slots = slots
+        self.slot_size = slot_size
+        self._stride = _SLOT.size + slot_size
+        self._buf = self._shm.buf
+
+    def _header(self):
+        return _HEADER.unpack_from(self._buf, 0)
+
+    def put(self, frame, ts, wirelen=0, block=False, linktype=DLT_EN10MB):
+        """Append a frame; when full, wait for the worker if ``block`` and drop it otherwise."""
+        head, tail, closed, dropped = self._header()
+        while head - tail >= self.slots:
+            if not block:
+                struct.pack_into('<q', self._buf, 24, dropped + 1)
+                return False
+            time.sleep(RING_POLL_INTERVAL)
+            tail = struct.unpack_from('<q', self._buf, 8)[0]
+        if len(frame) > self.slot_size:
+            wirelen = wirelen or len(frame)
+            frame = frame[:self.slot_size]
+        offset = _HEADER.size + (head % self.slots) * self._stride
+        _SLOT.pack_into(self._buf, offset, len(frame), wirelen, ts, linktype)
+        self._buf[offset + _SLOT.size:offset + _SLOT.size + len(frame)] = frame
+        # Publish the slot only once it is fully written
+        struct.pack_into('<q', self._buf, 0, head + 1)
+        return True
+
+    def get_many(self, max_frames=RING_BATCH):
+        """Up to ``max_frames`` (frame bytes, timestamp, wire length, link type) tuples, oldest first."""
+        head, tail = struct.unpack_from('<qq', self._buf, 0)
+        end = min(head, tail + max_frames)
+        frames = []
+        for index in range(tail, end):
+            offset = _HEADER.size + (index % self.slots) * self._stride
+            length, wirelen, ts, linktype = _SLOT.unpack_from(self._buf, offset)
+            start = offset + _SLOT.size
+            frames.append((bytes(self._buf[start:start + length]), ts, wirelen, linktype))
+        if frames:
+            struct.pack_into('<q', self._buf, 8, end)
+        return frames
+
+    @property
+    def closed(self):
+        return bool(self._header()[2])
+
+    def mark_closed(self):
+        struct.pack_into('<q', self._buf, 16, 1)
+
+    def stats(self):
+        head, tail, closed, dropped = self._header()
+        return {'written': head, 'read': tail, 'depth': head - tail, 'dropped': dropped}
+
+    def close(self):
+        self._buf = None
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
+
+
+def worker_index(frame, offset, workers):
+    """Worker owning the frame's flow; both directions of a flow go to the same worker.
+
+    The CRC is mixed before reducing it so the choice is independent of
+    flow sampling, which keeps flows by the CRC modulo the sample rate.
+    """
+    mixed = (zlib.crc32(flow_key(frame, offset)) * 2654435761) & 0xFFFFFFFF
+    return (mixed * workers) >> 32
+
+
+class FrameDistributor:
+    """Samples raw frames and hands each one to the ring of the worker that owns its flow.
+
+    Live frames are dropped when a worker falls behind; replayed ones wait
+    (``block``), since the file can be read at whatever pace the workers keep.
+    Frames without an IPv4 header to hash, kept when not sampling, all go to
+    the first worker. With ``on_observed`` the (source, destination, length,
+    protocol, flags, timestamp) of every kept IPv4 frame is passed to it in
+    batches, in capture order, which rows merged back from the workers are not.
+    """
+
+    def __init__(self, ring_names, sampler, snaplen=None, block=False, on_observed=None):
+        self.rings = [FrameRing(name=name) for name in ring_names]
+        self.sampler = sampler
+        self.snaplen = snaplen
+        self.block = block
+        self.on_observed = on_observed
+        self._observed = []
+        self._observed_since = None
+
+    def dispatch(self, frame, ts, wirelen=0, linktype=DLT_EN10MB):
+        if not self.sampler.keep(frame, linktype):
+            return
+        offset = ipv4_offset(frame, linktype)
+        index = worker_index(frame, offset, len(self.rings)) if offset is not None else 0
+        wirelen = wirelen or truncated_length(frame, self.snaplen, linktype)
+        self.rings[index].put(frame, ts, wirelen, self.block, linktype)
+        if self.on_observed is not None and offset is not None:
+            src, dst, proto, flags = ipv4_summary(frame, offset)
+            self._observed.append((src, dst, wirelen or len(frame), proto, flags, ts))
+            now = time.perf_counter()
+            if self._observed_since is None:
+                self._observed_since = now
+            if len(self._observed) >= OBSERVE_BATCH or now - self._observed_since >= OBSERVE_INTERVAL:
+                self.flush_observed()
+
+    def flush_observed(self):
+        if self._observed:
+            self.on_observed(self._observed)
+            self._observed = []
+        self._observed_since = None
+
+    def close(self):
+        self.flush_observed()
+        for ring in self.rings:
+            ring.mark_closed()
+            ring.close()
+
+
+def run_reader(ring_names, stop_event, results, sampler, source, options, iface=None, program=None, settings=None,
+               observe=False):
+    """Reader process: capture or replay frames and distribute them to the worker rings.
+
+    The rings are marked closed once the source is exhausted or ``stop_event``
+    is set, and the sampling counters are sent back as a ``('reader', ...)`` message.
+    With ``observe`` packet summaries are sent as ``('observed', None, batch)`` messages.
+    """
+    from utils.replay_utils import replay, replay_source
+
+    settings = settings or {'bpf_filter': None, 'snaplen': None}
+    on_observed = (lambda batch: results.put(('observed', None, batch))) if observe else None
+    distributor = FrameDistributor(ring_names, sampler, settings['snaplen'], block=source != 'live',
+                                   on_observed=on_observed)
+    try:
+        if source == 'live':
+            for _, linktype, frame, ts in read_frames(iface, program, settings['bpf_filter'],
+                                                      should_stop=stop_event.is_set):
+                distributor.dispatch(frame, ts, linktype=linktype)
+        else:
+            packets, rate, speed = replay_source(dict(options, source=source), raw=True)
+            replay(packets, lambda packet: distributor.dispatch(
+                       getattr(packet, 'original', None) or bytes(packet), float(packet.time), packet.wirelen or 0,
+                       getattr(packet, 'linktype', DLT_EN10MB)),
+                   rate=rate, speed=speed, should_stop=stop_event.is_set)
+    except Exception as e:
+        logger.error(f"Capture reader error: {str(e)}")
+    finally:
+        distributor.close()
+        results.put(('reader', None, sampler.stats()))
+
+
+class FanoutCapture:
+    """Capture spread over processes: one reader and ``workers`` classifier processes.
+
+    The reader hashes every sampled frame by its flow into one shared-memory
+    ring per worker. ``worker_target(index, ring_name, results, control, *worker_args)``
+    runs in each worker process. It owns the flows hashed to it and sends
+    ``('rows', index, rows, results)``, ``('stats', index, stats)`` and
+    finally ``('done', index, stats)`` messages back. The merge thread in this
+    process passes classified rows to ``on_results(rows, results)`` and, when
+    given, the reader's packet summaries in capture order to ``on_observed(batch)``.
+    ``send`` puts a message on every worker's ``control`` queue.
+    """
+
+    def __init__(self, workers, worker_target, worker_args, on_results, sampler, source, options,
+                 iface=None, program=None, settings=None, slots=RING_SLOTS, slot_size=RING_SLOT_SIZE,
+                 on_observed=None):
+        self.workers = max(1, int(workers))
+        self.worker_target = worker_target
+        self.worker_args = worker_args
+        self.on_results = on_results
+        self.on_observed = on_observed
+        self.reader_args = (sampler, source, options, iface, program, settings, on_observed is not None)
+        self.slots = slots
+        self.slot_size = slot_size
+
+        self._context = multiprocessing.get_context('spawn')
+        self._rings = []
+        self._rings_lock = threading.Lock()
+        self._processes = []
+        self._reader = None
+        self._stop = self._context.Event()
+        self._results = self._context.Queue()
+        self._controls = [self._context.Queue() for _ in range(self.workers)]
+        self._merger = None
+        self._worker_stats = {}
+        self._reader_stats = None
+        self._ring_stats = []
+        self._finished = set()
+        self.rows_merged = 0
+        self.started_at = None
+
+    def start(self, ready_timeout=60):
+        """Start the workers, wait until each has its model loaded, then start the reader."""
+        self._rings = [FrameRing(slots=self.slots, slot_size=self.slot_size) for _ in range(self.workers)]
+        for index, ring in enumerate(self._rings):
+            process = self._context.Process(
+                target=self.worker_target,
+                args=(index, ring.name, self._results, self._controls[index]) + tuple(self.worker_args),
+                name=f"capture-worker-{index}", daemon=True)
+            process.start()
+            self._processes.append(process)
+
+        ready = set()
+        deadline = time.time() + ready_timeout
+        while len(ready) < self.workers:
+            try:
+                message = self._results.get(timeout=max(0.1, deadline - time.time()))
+            except queue.Empty:
+                self._abort()
+                raise RuntimeError("Capture workers did not start in time")
+            if message[0] == 'ready':
+                ready.add(message[1])
+            elif message[0] == 'done':
+                self._abort()
+                raise RuntimeError(f"Capture worker {message[1]} failed to start: {message[2].get('error')}")
+
+        self.started_at = time.perf_counter()
+        self._merger = threading.Thread(target=self._merge, name="capture-merge", daemon=True)
+        self._merger.start()
+        self._reader = self._context.Process(
+            target=run_reader, args=([ring.name for ring in self._rings], self._stop, self._results) + self.reader_args,
+            name="capture-reader", daemon=True)
+        self._reader.start()
+
+    def _reader_pending(self):
+        return self._reader_stats is None and self._reader is not None and self._reader.is_alive()
+
+    def _merge(self):
+        while len(self._finished) < self.workers or self._reader_pending():
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not self._reader_pending() and not any(process.is_alive() for process in self._processes):
+                    logger.error("Capture workers exited without reporting")
+                    break
+                continue
+            kind, index = message[0], message[1]
+            if kind == 'rows':
+                self.rows_merged += len(message[2])
+                self.on_results(message[2], message[3])
+            elif kind == 'observed':
+                self.on_observed(message[2])
+            elif kind == 'reader':
+                self._reader_stats = message[2]
+            elif kind in ('stats', 'done'):
+                self._worker_stats[index] = message[2]
+                if kind == 'done':
+                    self._finished.add(index)
+
+    def running(self):
+        return self._merger is not None and self._merger.is_alive()
+
+    def send(self, message):
+        """Queue ``message`` for every worker; workers not started yet read it once they are."""
+        for control in self._controls:
+            control.put(message)
+
+    def wait(self, timeout=None):
+        if self._merger is not None:
+            self._merger.join(timeout)
+
+    def stop(self):
+        """Stop reading; workers drain their rings and flush their flows before exiting."""
+        self._stop.set()
+
+    def _abort(self):
+        self.stop()
+        for ring in self._rings:
+            ring.mark_closed()
+        self.join(timeout=5)
+
+    def join(self, timeout=None):
+        if self._reader is not None:
+            self._reader.join(timeout)
+        for ring in self._rings:
+            ring.mark_closed()
+        if self._merger is not None:
+            self._merger.join(timeout)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        # stats() may run from a request thread meanwhile; it must not see a closed ring
+        with self._rings_lock:
+            rings, self._rings = self._rings, []
+            if rings:
+                self._ring_stats = [ring.stats() for ring in rings]
+        for ring in rings:
+            ring.close()
+
+    def stats(self):
+        with self._rings_lock:
+            rings = [ring.stats() for ring in self._rings] if self._rings else self._ring_stats
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'workers': self.workers,
+            'rows_merged': self.rows_merged,
+            'rows_per_s': round(self.rows_merged / elapsed, 1) if elapsed else 0.0,
+            'ring_slots': self.slots,
+            'rings': rings,
+            'ring_dropped': sum(ring['dropped'] for ring in rings),
+            'per_worker': [self._worker_stats.get(index) for index in range(self.workers)],
+            'reader': self._reader_stats,
+        }
@@ -0,0 +1,307 @@
+import math
+from collections import OrderedDict
+
+# TCP flag bits
+FIN = 0x01
+SYN = 0x02
+RST = 0x04
+PSH = 0x08
+ACK = 0x10
+URG = 0x20
+
+# Flow features in the naming used by the capture CSV / CICIDS-style training data.
+# Durations and inter-arrival times are in microseconds and packet lengths are
+# transport payload bytes, as in CICFlowMeter.
+FLOW_FEATURES = [
+    'destination_port', 'flow_duration',
+    'total_fwd_packets', 'total_backward_packets',
+    'total_length_of_fwd_packets', 'total_length_of_bwd_packets',
+    'fwd_packet_length_max', 'fwd_packet_length_min', 'fwd_packet_length_mean', 'fwd_packet_length_std',
+    'bwd_packet_length_max', 'bwd_packet_length_min', 'bwd_packet_length_mean', 'bwd_packet_length_std',
+    'flow_bytes_s', 'flow_packets_s',
+    'flow_iat_mean', 'flow_iat_std', 'flow_iat_max', 'flow_iat_min',
+    'fwd_iat_total', 'fwd_iat_mean', 'fwd_iat_std', 'fwd_iat_max', 'fwd_iat_min',
+    'bwd_iat_total', 'bwd_iat_mean', 'bwd_iat_std', 'bwd_iat_max', 'bwd_iat_min',
+    'fwd_header_length', 'bwd_header_length', 'fwd_packets_s', 'bwd_packets_s',
+    'min_packet_length', 'max_packet_length', 'packet_length_mean', 'packet_length_std',
+    'packet_length_variance',
+    'fin_flag_count', 'syn_flag_count', 'rst_flag_count', 'psh_flag_count', 'ack_flag_count',
+    'urg_flag_count',
+    'down_up_ratio', 'average_packet_size', 'avg_fwd_segment_size', 'avg_bwd_segment_size',
+    'init_win_bytes_forward', 'init_win_bytes_backward',
+]
+
+
+def _mean_std(count, total, total_sq):
+    if count == 0:
+        return 0.0, 0.0
+    mean = total / count
+    return mean, math.sqrt(max(total_sq / count - mean * mean, 0.0))
+
+
+class DirectionStats:
+    """Running aggregates for one direction of a flow."""
+
+    __slots__ = ('packets', 'bytes', 'bytes_sq', 'len_max', 'len_min', 'header_bytes',
+                 'last_ts', 'iat_total', 'iat_sq', 'iat_max', 'iat_min', 'init_win')
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.bytes_sq = 0
+        self.len_max = 0
+        self.len_min = 0
+        self.header_bytes = 0
+        self.last_ts = 0.0
+        self.iat_total = 0.0
+        self.iat_sq = 0.0
+        self.iat_max = 0.0
+        self.iat_min = 0.0
+        self.init_win = -1
+
+    def add(self, ts, length, header_len, window):
+        if self.packets:
+            iat = (ts - self.last_ts) * 1e6
+            self.iat_total += iat
+            self.iat_sq += iat * iat
+            if self.packets == 1 or iat < self.iat_min:
+                self.iat_min = iat
+            if iat > self.iat_max:
+                self.iat_max = iat
+            if length < self.len_min:
+                self.len_min = length
+        else:
+            self.len_min = length
+            if window is not None:
+                self.init_win = window
+        if length > self.len_max:
+            self.len_max = length
+        self.packets += 1
+        self.bytes += length
+        self.bytes_sq += length * length
+        self.header_bytes += header_len
+        self.last_ts = ts
+
+
+class FlowRecord:
+    """Bidirectional flow state; forward is the direction of the first packet seen."""
+
+    __slots__ = ('key', 'src', 'dst', 'sport', 'dport', 'proto', 'start', 'last_seen',
+                 'fwd', 'bwd', 'flow_iat_sq', 'flow_iat_max', 'flow_iat_min', 'flags', 'fin_sides')
+
+    def __init__(self, key, ts, src, dst, sport, dport, proto):
+        self.key = key
+        self.src = src
+        self.dst = dst
+        self.sport = sport
+        self.dport = dport
+        self.proto = proto
+        self.start = ts
+        self.last_seen = ts
+        self.fwd = DirectionStats()
+        self.bwd = DirectionStats()
+        self.flow_iat_sq = 0.0
+        self.flow_iat_max = 0.0
+        self.flow_iat_min = 0.0
+        # fin, syn, rst, psh, ack, urg
+        self.flags = [0, 0, 0, 0, 0, 0]
+        # Directions that have sent a FIN: 1 forward, 2 backward
+        self.fin_sides = 0
+
+    @property
+    def packets(self):
+        return self.fwd.packets + self.bwd.packets
+
+    def add(self, ts, forward, length, header_len, flags, window):
+        if self.packets:
+            iat = (ts - self.last_seen) * 1e6
+            self.flow_iat_sq += iat * iat
+            if self.packets == 1 or iat < self.flow_iat_min:
+                self.flow_iat_min = iat
+            if iat > self.flow_iat_max:
+                self.flow_iat_max = iat
+        (self.fwd if forward else self.bwd).add(ts, length, header_len, window)
+        self.last_seen = ts
+        if flags:
+            counts = self.flags
+            for i, bit in enumerate((FIN, SYN, RST, PSH, ACK, URG)):
+                if flags & bit:
+                    counts[i] += 1
+            if flags & FIN:
+                self.fin_sides |= 1 if forward else 2
+
+    def features(self):
+        """Return the flow feature vector as a dict keyed by FLOW_FEATURES."""
+        fwd, bwd = self.fwd, self.bwd
+        packets = fwd.packets + bwd.packets
+        total_bytes = fwd.bytes + bwd.bytes
+        duration = (self.last_seen - self.start) * 1e6
+        seconds = duration / 1e6
+
+        fwd_mean, fwd_std = _mean_std(fwd.packets, fwd.bytes, fwd.bytes_sq)
+        bwd_mean, bwd_std = _mean_std(bwd.packets, bwd.bytes, bwd.bytes_sq)
+        pkt_mean, pkt_std = _mean_std(packets, total_bytes, fwd.bytes_sq + bwd.bytes_sq)
+        flow_iat_mean, flow_iat_std = _mean_std(packets - 1, duration, self.flow_iat_sq)
+        fwd_iat_mean, fwd_iat_std = _mean_std(fwd.packets - 1, fwd.iat_total, fwd.iat_sq)
+        bwd_iat_mean, bwd_iat_std = _mean_std(bwd.packets - 1, bwd.iat_total, bwd.iat_sq)
+
+        if fwd.packets and bwd.packets:
+            min_len = min(fwd.len_min, bwd.len_min)
+        else:
+            min_len = fwd.len_min if fwd.packets else bwd.len_min
+        fin, syn, rst, psh, ack, urg = self.flags
+
+        return {
+            'destination_port': self.dport,
+            'flow_duration': duration,
+            'total_fwd_packets': fwd.packets,
+            'total_backward_packets': bwd.packets,
+            'total_length_of_fwd_packets': fwd.bytes,
+            'total_length_of_bwd_packets': bwd.bytes,
+            'fwd_packet_length_max': fwd.len_max,
+            'fwd_packet_length_min': fwd.len_min,
+            'fwd_packet_length_mean': fwd_mean,
+            'fwd_packet_length_std': fwd_std,
+            'bwd_packet_length_max': bwd.len_max,
+            'bwd_packet_length_min': bwd.len_min,
+            'bwd_packet_length_mean': bwd_mean,
+            'bwd_packet_length_std': bwd_std,
+            'flow_bytes_s': total_bytes / seconds if seconds else 0.0,
+            'flow_packets_s': packets / seconds if seconds else 0.0,
+            'flow_iat_mean': flow_iat_mean,
+            'flow_iat_std': flow_iat_std,
+            'flow_iat_max': self.flow_iat_max,
+            'flow_iat_min': self.flow_iat_min,
+            'fwd_iat_total': fwd.iat_total,
+            'fwd_iat_mean': fwd_iat_mean,
+            'fwd_iat_std': fwd_iat_std,
+            'fwd_iat_max': fwd.iat_max,
+            'fwd_iat_min': fwd.iat_min,
+            'bwd_iat_total': bwd.iat_total,
+            'bwd_iat_mean': bwd_iat_mean,
+            'bwd_iat_std': bwd_iat_std,
+            'bwd_iat_max': bwd.iat_max,
+            'bwd_iat_min': bwd.iat_min,
+            'fwd_header_length': fwd.header_bytes,
+            'bwd_header_length': bwd.header_bytes,
+            'fwd_packets_s': fwd.packets / seconds if seconds else 0.0,
+            'bwd_packets_s': bwd.packets / seconds if seconds else 0.0,
+            'min_packet_length': min_len,
+            'max_packet_length': max(fwd.len_max, bwd.len_max),
+            'packet_length_mean': pkt_mean,
+            'packet_length_std': pkt_std,
+            'packet_length_variance': pkt_std * pkt_std,
+            'fin_flag_count': fin,
+            'syn_flag_count': syn,
+            'rst_flag_count': rst,
+            'psh_flag_count': psh,
+            'ack_flag_count': ack,
+            'urg_flag_count': urg,
+            'down_up_ratio': bwd.packets / fwd.packets if fwd.packets else 0.0,
+            'average_packet_size': total_bytes / packets if packets else 0.0,
+            'avg_fwd_segment_size': fwd_mean,
+            'avg_bwd_segment_size': bwd_mean,
+            'init_win_bytes_forward': fwd.init_win,
+            'init_win_bytes_backward': bwd.init_win,
+        }
+
+
+def flow_key(src, dst, sport, dport, proto):
+    """Direction-independent 5-tuple key."""
+    if (src, sport) <= (dst, dport):
+        return (src, sport, dst, dport, proto)
+    return (dst, dport, src, sport, proto)
+
+
+class FlowTable:
+    """Incremental flow table keyed by the bidirectional 5-tuple.
+
+    Each packet costs O(1): the record's running aggregates are updated and the
+    flow moves to the back of an insertion-ordered dict, so the least recently
+    seen flows are always at the front. Flows are evicted (and handed to
+    ``on_evict(record, reason)``) when they go idle, exceed the active timeout,
+    close with FIN/RST, or when the table reaches ``max_flows``.
+    """
+
+    def __init__(self, idle_timeout=120.0, active_timeout=1800.0, max_flows=500000,
+                 on_evict=None, sweep_interval=1.0):
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.on_evict = on_evict
+        self.sweep_interval = sweep_interval
+        self._flows = OrderedDict()
+        self._last_sweep = 0.0
+        self.evicted = {'idle': 0, 'active': 0, 'closed': 0, 'capacity': 0, 'flush': 0}
+
+    def __len__(self):
+        return len(self._flows)
+
+    def update(self, ts, src, dst, sport, dport, proto, length, header_len=0, flags=0, window=None):
+        """Account one packet and return the FlowRecord it belongs to."""
+        if ts - self._last_sweep >= self.sweep_interval:
+            self.expire(ts)
+
+        flows = self._flows
+        key = flow_key(src, dst, sport, dport, proto)
+        record = flows.get(key)
+
+        if record is not None and ts - record.start > self.active_timeout:
+            self._evict(key, 'active')
+            record = None
+
+        if record is None:
+            if len(flows) >= self.max_flows:
+                self._evict(next(iter(flows)), 'capacity')
+            record = FlowRecord(key, ts, src, dst, sport, dport, proto)
+            flows[key] = record
+        else:
+            flows.move_to_end(key)
+
+        forward = src == record.src and sport == record.sport
+        record.add(ts, forward, length, header_len, flags, window)
+
+        # RST tears the connection down; FIN closes it once both sides have sent one,
+        # so a retransmitted FIN from one side does not end the flow
+        if flags & RST or (flags & FIN and record.fin_sides == 3):
+            self._evict(key, 'closed')
+        return record
+
+    def expire(self, now):
+        """Evict every flow idle for longer than idle_timeout."""
+        self._last_sweep = now
+        flows = self._flows
+        deadline = now - self.idle_timeout
+        while flows:
+            key, record = next(iter(flows.items()))
+            if record.last_seen > deadline:
+                break
+            self._evict(key, 'idle')
+
+    def flush(self):
+        """Evict all remaining flows, e.g. when capture stops."""
+        while self._flows:
+            self._evict(next(iter(self._flows)), 'flush')
+
+    def clear(self):
+        self._flows.clear()
+        self._last_sweep = 0.0
+        for reason in self.evicted:
+            self.evicted[reason] = 0
+
+    def _evict(self, key, reason):
+        record = self._flows.pop(key, None)
+        if record is None:
+            return
+        self.evicted[reason] += 1
+        if self.on_evict is not None:
+            self.on_evict(record, reason)
+
+    def stats(self):
+        return {
+            'active_flows': len(self._flows),
+            'idle_timeout': self.idle_timeout,
+            'active_timeout': self.active_timeout,
+            'max_flows': self.max_flows,
+            'evicted': dict(self.evicted),
+        }
@@ -0,0 +1,329 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from utils.perf_utils import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# Verdict cache defaults: entries, seconds a verdict stays valid, cache hits before a
+# forced re-evaluation, and quantization steps per doubling of a feature value
+VERDICT_CACHE_SIZE = 65536
+VERDICT_CACHE_TTL = 5.0
+VERDICT_CACHE_REVALIDATE = 16
+VERDICT_CACHE_RESOLUTION = 1
+# Flow counters, durations, inter-arrival times and rates move with nearly every
+# packet; they get this many steps per doubling so a flow keeps its signature
+VERDICT_CACHE_COARSE_RESOLUTION = 0.25
+VOLATILE_FEATURE_MARKERS = ('duration', 'iat', 'total', 'header_length', 'flag_count', 'bytes_s', 'packets_s')
+
+
+class BatchInferenceEngine:
+    """Collects feature rows from the capture callback and classifies them in micro-batches.
+
+    The capture thread only calls ``submit``; a worker thread drains the bounded buffer
+    once ``batch_size`` rows are waiting or the oldest row has waited ``max_latency_ms``,
+    classifies the whole batch with one ``classify_batch(rows)`` call and hands the
+    ``(label, confidence)`` results to ``on_results(rows, results)``.
+    """
+
+    def __init__(self, classify_batch, on_results, batch_size=64, max_latency_ms=50, capacity=10000):
+        self.classify_batch = classify_batch
+        self.on_results = on_results
+        self.batch_size = max(1, int(batch_size))
+        self.max_latency = max(0.0, float(max_latency_ms)) / 1000.0
+        self.capacity = max(self.batch_size, int(capacity))
+
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._running = False
+        self._thread = None
+
+        self.latency = LatencyStats()
+        self._reset_counters()
+
+    def _reset_counters(self):
+        self.submitted = 0
+        self.processed = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self.inference_time = 0.0
+        self.started_at = None
+
+    def start(self):
+        if self._running:
+            return
+        self._reset_counters()
+        self.latency.clear()
+        self.started_at = time.perf_counter()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="batch-inference", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Stop the worker after classifying whatever is still buffered."""
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+
+    def submit(self, row):
+        """Queue one row for classification. Returns False if the buffer is full."""
+        with self._cond:
+            if len(self._buffer) >= self.capacity:
+                self.dropped += 1
+                return False
+            self._buffer.append((time.perf_counter(), row))
+            self.submitted += 1
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if len(self._buffer) >= self.batch_size:
+                    break
+                if self._buffer:
+                    wait = self._buffer[0][0] + self.max_latency - time.perf_counter()
+                    if wait <= 0 or not self._running:
+                        break
+                elif not self._running:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+            count = min(len(self._buffer), self.batch_size)
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                break
+
+            enqueued = [item[0] for item in batch]
+            rows = [item[1] for item in batch]
+
+            started = time.perf_counter()
+            try:
+                results = self.classify_batch(rows)
+            except Exception as e:
+                logger.error(f"Batch prediction error: {str(e)}")
+                self.errors += 1
+                results = [("Prediction error", 0.0)] * len(rows)
+            finished = time.perf_counter()
+
+            self.inference_time += finished - started
+            self.batches += 1
+            self.processed += len(rows)
+            self.latency.extend(finished - t for t in enqueued)
+
+            try:
+                self.on_results(rows, results)
+            except Exception as e:
+                logger.error(f"Error handling batch results: {str(e)}")
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            "running": self._running,
+            "batch_size": self.batch_size,
+            "max_latency_ms": self.max_latency * 1000.0,
+            "capacity": self.capacity,
+            "queue_depth": len(self._buffer),
+            "submitted": self.submitted,
+            "processed": self.processed,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+            "avg_batch_size": round(self.processed / self.batches, 2) if self.batches else 0.0,
+            "throughput_rows_per_s": round(self.processed / elapsed, 2) if elapsed else 0.0,
+            "model_rows_per_s": round(self.processed / self.inference_time, 2) if self.inference_time else 0.0,
+            "latency": self.latency.percentiles(),
+        }
+
+
+def volatile_feature(name):
+    """Whether a model input grows or jitters with every packet of a flow"""
+    name = str(name).lower()
+    return any(marker in name for marker in VOLATILE_FEATURE_MARKERS)
+
+
+def flow_cache_key(row):
+    """Direction-independent 5-tuple of a feature row, or None for a flow's first packet.
+
+    A first packet's features say nothing about its flow beyond the packet
+    itself, so first packets share verdicts by signature alone, which is
+    what lets the packets of a spoofed-source flood hit the cache.
+    """
+    if row.get('total_fwd_packets', 0) + row.get('total_backward_packets', 0) == 1:
+        return None
+    a = (row.get('source_ip'), row.get('src_port', 0))
+    b = (row.get('destination_ip'), row.get('dst_port', 0))
+    return (row.get('protocol'),) + (a + b if a <= b else b + a)
+
+
+class VerdictCache:
+    """LRU/TTL cache of (label, confidence) verdicts in front of the model.
+
+    Entries are keyed by the flow's 5-tuple plus a signature of the model's
+    input features, each quantized to ``resolution`` steps per doubling of its
+    value, or ``coarse_resolution`` for counters, durations, inter-arrival
+    times and rates (see ``volatile_feature``): while a flow's features stay
+    within the same steps its packets get the cached verdict instead of a
+    model call. A verdict is re-evaluated
+    after ``revalidate_every`` hits or ``ttl`` seconds, whichever comes first,
+    and the cache is emptied when the model changes. Finished-flow rows are
+    always classified. Used from the inference worker thread only.
+    """
+
+    def __init__(self, max_entries=VERDICT_CACHE_SIZE, ttl=VERDICT_CACHE_TTL,
+                 revalidate_every=VERDICT_CACHE_REVALIDATE, resolution=VERDICT_CACHE_RESOLUTION,
+                 coarse_resolution=VERDICT_CACHE_COARSE_RESOLUTION):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.revalidate_every = max(1, int(revalidate_every))
+        self.resolution = float(resolution)
+        self.coarse_resolution = float(coarse_resolution)
+        self._entries = OrderedDict()
+        self._model = None
+        self._resolutions = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.revalidated = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.model_calls = 0
+        self.model_rows = 0
+
+    def resolutions(self, feature_names, count):
+        """Steps per doubling for each of the ``count`` model input columns"""
+        if not feature_names or len(feature_names) != count:
+            return np.full(count, self.resolution)
+        return np.array([self.coarse_resolution if volatile_feature(name) else self.resolution
+                         for name in feature_names])
+
+    def signatures(self, features, resolutions=None):
+        """Quantized feature rows as bytes, one per row of the ``features`` array"""
+        if resolutions is None:
+            resolutions = self.resolution
+        with np.errstate(invalid='ignore'):
+            steps = np.floor(np.log2(np.abs(features) + 1.0) * resolutions) * np.sign(features)
+        steps = np.nan_to_num(steps, nan=-1.0, posinf=1e6, neginf=-1e6).astype(np.int32)
+        return [row.tobytes() for row in steps]
+
+    def classify(self, rows, features, model, classify_features):
+        """Verdicts for ``rows``; only rows without a valid cached verdict go to ``classify_features``.
+
+        ``features`` is the model input array for ``rows`` and
+        ``classify_features(array)`` returns (label, confidence) per row.
+        """
+        if model is not self._model:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._model = model
+            self._resolutions = None
+        if self._resolutions is None or len(self._resolutions) != features.shape[1]:
+            self._resolutions = self.resolutions(getattr(model, 'feature_names', None), features.shape[1])
+
+        now = time.monotonic()
+        entries = self._entries
+        signatures = self.signatures(features, self._resolutions)
+        results = [None] * len(rows)
+        # Rows to classify: one per distinct key, so repeats within the batch share its verdict
+        pending = OrderedDict()
+        for i, row in enumerate(rows):
+            if row.get('flow_complete'):
+                pending[('flow', i)] = [i]
+                continue
+            key = (flow_cache_key(row), signatures[i])
+            if key in pending:
+                pending[key].append(i)
+                self.hits += 1
+                continue
+            entry = entries.get(key)
+            if entry is not None:
+                if entry[2] <= now:
+                    self.expired += 1
+                elif entry[3] >= self.revalidate_every:
+                    self.revalidated += 1
+                else:
+                    entry[3] += 1
+                    entries.move_to_end(key)
+                    results[i] = (entry[0], entry[1])
+                    self.hits += 1
+                    continue
+            self.misses += 1
+            pending[key] = [i]
+
+        if pending:
+            first = [indices[0] for indices in pending.values()]
+            self.model_calls += 1
+            self.model_rows += len(first)
+            verdicts = classify_features(features[first] if len(first) < len(rows) else features)
+            for (key, indices), verdict in zip(pending.items(), verdicts):
+                for i in indices:
+                    results[i] = verdict
+                if key[0] == 'flow':
+                    continue
+                entries[key] = [verdict[0], verdict[1], now + self.ttl, len(indices) - 1]
+                entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+        return results
+
+    def clear(self):
+        self._entries.clear()
+        self._model = None
+        self._resolutions = None
+
+    def settings(self):
+        """Constructor arguments, to build an identical cache elsewhere (e.g. in a capture worker)"""
+        return {'max_entries': self.max_entries, 'ttl': self.ttl,
+                'revalidate_every': self.revalidate_every, 'resolution': self.resolution,
+                'coarse_resolution': self.coarse_resolution}
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "revalidate_every": self.revalidate_every,
+            "resolution": self.resolution,
+            "coarse_resolution": self.coarse_resolution,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "expired": self.expired,
+            "revalidated": self.revalidated,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "model_calls": self.model_calls,
+            "model_rows": self.model_rows,
+        }
+
+    @staticmethod
+    def merge_stats(stats):
+        """Counters of several caches (one per capture worker) added up"""
+        stats = [item for item in stats if item]
+        if not stats:
+            return None
+        merged = dict(stats[0])
+        for key in ('entries', 'max_entries', 'hits', 'misses', 'expired', 'revalidated', 'evictions',
+                    'invalidations', 'model_calls', 'model_rows'):
+            merged[key] = sum(item[key] for item in stats)
+        lookups = merged['hits'] + merged['misses']
+        merged['hit_ratio'] = round(merged['hits'] / lookups, 4) if lookups else 0.0
+        return merged
@@ -0,0 +1,223 @@
+import csv
+import io
+import math
+
+import numpy as np
+
+from utils.dataset_store import DatasetWriter, save_dataset_stats
+
+# Rows parsed per chunk while streaming an upload; memory stays bounded by this
+UPLOAD_CHUNK_ROWS = 50000
+
+# The header line has to fit in this many bytes
+MAX_HEADER_BYTES = 1 << 20
+
+LABEL_COLUMN = 'Label'
+
+# Share of a single uploaded file that goes to each split
+SPLIT_FRACTIONS = (('train', 0.70), ('validation', 0.15), ('test', 0.15))
+
+
+class PrefixedStream(io.RawIOBase):
+    """A binary stream that returns ``prefix`` before the rest of ``stream``.
+
+    Lets the header be read from the first bytes of a non-seekable upload
+    and the parser still see the whole file.
+    """
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            count = min(len(buffer), len(self._prefix))
+            buffer[:count] = self._prefix[:count]
+            self._prefix = self._prefix[count:]
+            return count
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def read_header(stream, required=(LABEL_COLUMN,)):
+    """Parse the CSV header from the first bytes of ``stream`` and check the required columns.
+
+    Returns (column names, stream to parse the whole file from). Raises
+    ValueError for an empty file, an oversized header or a missing column.
+    """
+    prefix = b''
+    while b'\n' not in prefix and len(prefix) < MAX_HEADER_BYTES:
+        data = stream.read(64 * 1024)
+        if not data:
+            break
+        prefix += data
+    if not prefix.strip():
+        raise ValueError("Uploaded file is empty")
+    if b'\n' not in prefix and len(prefix) >= MAX_HEADER_BYTES:
+        raise ValueError(f"CSV header is longer than {MAX_HEADER_BYTES} bytes")
+
+    line = prefix.split(b'\n', 1)[0].decode('utf-8-sig', errors='replace').rstrip('\r')
+    columns = next(csv.reader([line]), [])
+    for column in required:
+        if column not in columns:
+            raise ValueError(f"Dataset must have a '{column}' column")
+    return columns, io.BufferedReader(PrefixedStream(prefix, stream))
+
+
+def split_assignments(chunk, fractions=SPLIT_FRACTIONS):
+    """Index into ``fractions`` for every row, from a hash of the row's values.
+
+    The assignment depends only on the row itself, so it is the same on
+    every upload of the file and identical rows always land in the same
+    split instead of leaking between train and test.
+    """
+    import pandas as pd
+
+    hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+    # Top 53 bits as a uniform float in [0, 1)
+    position = (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+    bounds = np.cumsum([fraction for _, fraction in fractions])
+    bounds[-1] = 1.0
+    return np.searchsorted(bounds, position, side='right')
+
+
+class ColumnSummary:
+    """Row count and per-column statistics accumulated chunk by chunk.
+
+    Numeric columns track nulls, infinities, min, max and a mean and variance
+    of their finite values, merged across chunks with Chan's parallel update.
+    Other columns track nulls, and the label column its class counts.
+    """
+
+    def __init__(self, label=LABEL_COLUMN):
+        self.label = label
+        self.rows = 0
+        self.columns = None
+        self.nulls = {}
+        self.numeric = {}
+        self.text = set()
+        self.label_counts = {}
+
+    def update(self, chunk):
+        if self.columns is None:
+            self.columns = [str(column) for column in chunk.columns]
+            self.nulls = dict.fromkeys(self.columns, 0)
+        if not len(chunk):
+            return
+        self.rows += len(chunk)
+        for column, count in chunk.isna().sum().items():
+            self.nulls[str(column)] += int(count)
+
+        numeric = [column for column in chunk.select_dtypes(include=[np.number]).columns
+                   if column != self.label]
+        self.text.update(str(column) for column in chunk.columns if column not in numeric)
+        if numeric:
+            self._update_numeric(numeric, chunk[numeric].to_numpy(dtype=np.float64))
+
+        if self.label in chunk.columns:
+            for value, count in chunk[self.label].value_counts(dropna=False).items():
+                key = str(value)
+                self.label_counts[key] = self.label_counts.get(key, 0) + int(count)
+
+    def _update_numeric(self, columns, values):
+        finite = np.isfinite(values)
+        count = finite.sum(axis=0)
+        infinite = np.isinf(values).sum(axis=0)
+        masked = np.where(finite, values, 0.0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = masked.sum(axis=0) / count
+        m2 = (np.where(finite, values - mean, 0.0) ** 2).sum(axis=0)
+        low = np.where(finite, values, np.inf).min(axis=0)
+        high = np.where(finite, values, -np.inf).max(axis=0)
+
+        for i, column in enumerate(columns):
+            column = str(column)
+            state = self.numeric.setdefault(column, [0, 0.0, 0.0, math.inf, -math.inf, 0])
+            state[5] += int(infinite[i])
+            n_b = int(count[i])
+            if not n_b:
+                continue
+            n_a, mean_a, m2_a = state[0], state[1], state[2]
+            n = n_a + n_b
+            delta = float(mean[i]) - mean_a
+            state[0] = n
+            state[1] = mean_a + delta * n_b / n
+            state[2] = m2_a + float(m2[i]) + delta * delta * n_a * n_b / n
+            state[3] = min(state[3], float(low[i]))
+            state[4] = max(state[4], float(high[i]))
+
+    def stats(self):
+        columns = {}
+        for column in self.columns or []:
+            entry = {'nulls': self.nulls.get(column, 0)}
+            # A column that was text in any chunk is text
+            if column in self.numeric and column not in self.text:
+                count, mean, m2, low, high, infinite = self.numeric[column]
+                entry.update({
+                    'numeric': True,
+                    'count': count,
+                    'infinite': infinite,
+                    'min': low if count else None,
+                    'max': high if count else None,
+                    'mean': mean if count else None,
+                    'std': math.sqrt(m2 / (count - 1)) if count > 1 else None,
+                })
+            else:
+                entry['numeric'] = False
+            columns[column] = entry
+        return {
+            'rows': self.rows,
+            'columns': len(self.columns or []),
+            'label_counts': self.label_counts,
+            'column_stats': columns,
+        }
+
+
+def ingest_csv(stream, name=None, fractions=SPLIT_FRACTIONS, chunksize=UPLOAD_CHUNK_ROWS):
+    """Stream a CSV upload into the dataset store in one pass.
+
+    Every row goes to dataset ``name`` or, without a name, to one of the
+    datasets in ``fractions`` by ``split_assignments``. The header is checked
+    before any row is parsed, and the statistics of each dataset are computed
+    while it is written and saved next to it. Returns {name: statistics}.
+    Raises ValueError for a malformed upload; nothing is stored then.
+    """
+    import pandas as pd
+
+    names = [name] if name else [split for split, _ in fractions]
+    header, stream = read_header(stream)
+    writers = [DatasetWriter(dataset) for dataset in names]
+    summaries = [ColumnSummary() for _ in names]
+    try:
+        for chunk in pd.read_csv(stream, chunksize=chunksize):
+            if name:
+                parts = [chunk]
+            else:
+                assignment = split_assignments(chunk, fractions)
+                parts = [chunk[assignment == index] for index in range(len(names))]
+            for writer, summary, part in zip(writers, summaries, parts):
+                writer.write(part)
+                summary.update(part)
+        # Splits of one file get the same column types, wide enough for all of them
+        for writer in writers:
+            for other in writers:
+                writer.widen(other.schema)
+    except Exception:
+        for writer in writers:
+            writer.abort()
+        raise
+
+    results = {}
+    for dataset, writer, summary in zip(names, writers, summaries):
+        # A header-only upload still stores its columns
+        if writer.columns is None:
+            writer.columns = header
+        writer.close()
+        stats = dict(summary.stats(), columns=len(writer.columns))
+        save_dataset_stats(dataset, stats)
+        results[dataset] = stats
+    return results
@@ -0,0 +1,230 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+# Jobs that may run at the same time, and how many may wait behind them
+MAX_CONCURRENT_JOBS = max(1, min(4, (os.cpu_count() or 2) // 2))
+MAX_PENDING_JOBS = 16
+
+# Finished jobs kept around for status queries
+MAX_FINISHED_JOBS = 100
+
+# Set inside worker processes
+_progress_queue = None
+_current_job_id = None
+
+
+def _init_worker(progress_queue):
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def report_progress(progress, message=None):
+    """Report progress (0..1) of the job running in this worker; a no-op outside jobs."""
+    if _progress_queue is None or _current_job_id is None:
+        return
+    try:
+        _progress_queue.put_nowait((_current_job_id, 'progress', float(progress), message))
+    except Exception:
+        pass
+
+
+def _run_job(job_id, func, kwargs):
+    global _current_job_id
+    _current_job_id = job_id
+    _progress_queue.put((job_id, 'started', 0.0, None))
+    try:
+        return func(**kwargs)
+    finally:
+        _current_job_id = None
+
+
+class Job:
+    def __init__(self, kind, params):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = 'queued'
+        self.progress = 0.0
+        self.message = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.status_code = None
+        self.error = None
+
+    def to_dict(self):
+        end = self.finished_at or time.time()
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': round(self.progress, 4),
+            'message': self.message,
+            'submitted_at': self.submitted_at,
+            'queued_seconds': round((self.started_at or end) - self.submitted_at, 3),
+            'elapsed_seconds': round(end - self.started_at, 3) if self.started_at else 0.0,
+            'result': self.result,
+            'status_code': self.status_code,
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """Runs heavy pipeline steps in a local process pool.
+
+    Job functions are module-level callables that return ``(payload, status_code)``
+    like the synchronous routes do; they may call ``report_progress`` while
+    running. At most ``max_workers`` jobs run at once and at most
+    ``max_pending`` more may wait.
+    """
+
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_pending=MAX_PENDING_JOBS):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._progress_queue = None
+        self._listener = None
+
+    def _ensure_started(self):
+        if self._executor is not None:
+            return
+        # spawn keeps workers clear of the capture threads running in this process
+        self._progress_queue = multiprocessing.get_context('spawn').Queue()
+        self._start_executor()
+        self._listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+        self._listener.start()
+
+    def _start_executor(self):
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(self._progress_queue,)
+        )
+
+    def _replace_executor(self, broken):
+        """A new pool in place of ``broken``, unless another submit already replaced it"""
+        with self._lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._start_executor()
+            return self._executor
+
+    def _listen(self):
+        while True:
+            try:
+                job_id, event, progress, message = self._progress_queue.get()
+            except (EOFError, OSError):
+                break
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if job is None or job.status in ('finished', 'failed'):
+                    continue
+                if event == 'started':
+                    job.status = 'running'
+                    job.started_at = time.time()
+                else:
+                    job.progress = progress
+                    if message:
+                        job.message = message
+
+    def submit(self, kind, func, **params):
+        """Queue ``func(**params)``; raises RuntimeError when the queue is full."""
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.status in ('queued', 'running'))
+            if active >= self.max_workers + self.max_pending:
+                raise RuntimeError("Too many jobs in progress, try again later")
+            self._ensure_started()
+            job = Job(kind, params)
+            self._jobs[job.id] = job
+            self._trim()
+
+        executor = self._executor
+        try:
+            try:
+                future = executor.submit(_run_job, job.id, func, params)
+            except BrokenProcessPool:
+                # A worker died (e.g. killed for running out of memory) and took the pool
+                # with it; its jobs fail through their futures, new ones get a fresh pool
+                logger.warning("Job worker pool is broken, starting a new one")
+                future = self._replace_executor(executor).submit(_run_job, job.id, func, params)
+        except Exception as e:
+            with self._lock:
+                self._fail(job, e)
+            return job
+        future.add_done_callback(lambda f, job_id=job.id: self._finish(job_id, f))
+        return job
+
+    def _finish(self, job_id, future):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            job.finished_at = time.time()
+            job.started_at = job.started_at or job.finished_at
+            try:
+                payload, status_code = future.result()
+                job.result = payload
+                job.status_code = status_code
+                if status_code >= 400:
+                    job.status = 'failed'
+                    job.error = payload.get('error') if isinstance(payload, dict) else str(payload)
+                else:
+                    job.status = 'finished'
+                    job.progress = 1.0
+            except Exception as e:
+                self._fail(job, e)
+
+    def _fail(self, job, e):
+        if isinstance(e, BrokenProcessPool):
+            e = RuntimeError(f"A job worker process died, e.g. for running out of memory, "
+                             f"and took this job with it ({str(e)})")
+        logger.error(f"Job {job.id} ({job.kind}) failed: {str(e)}")
+        job.finished_at = job.finished_at or time.time()
+        job.started_at = job.started_at or job.finished_at
+        job.status = 'failed'
+        job.status_code = 500
+        job.error = str(e)
+        job.result = {"error": str(e), "traceback": ''.join(traceback.format_exception(e))}
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in ('finished', 'failed')]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def list(self):
+        with self._lock:
+            return [job.to_dict() for job in reversed(self._jobs.values())]
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'max_concurrent_jobs': self.max_workers,
+            'max_pending_jobs': self.max_pending,
+            'queued': statuses.count('queued'),
+            'running': statuses.count('running'),
+            'finished': statuses.count('finished'),
+            'failed': statuses.count('failed'),
+        }
+
+
+job_queue = JobQueue()
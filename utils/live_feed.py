@@ -0,0 +1,78 @@
+import threading
+import time
+from collections import OrderedDict, deque
+
+# Prediction events kept for clients that reconnect, and seconds of counts kept
+LIVE_FEED_EVENTS = 1000
+COUNT_WINDOW_SECONDS = 120
+
+# Fields of a classified row sent to dashboards; the full feature vector stays server-side
+EVENT_FIELDS = ('timestamp', 'record_type', 'source_ip', 'destination_ip', 'src_port', 'dst_port',
+                'protocol', 'packet_length', 'prediction', 'confidence', 'flow_packets', 'flow_end_reason')
+
+
+class LiveFeed:
+    """Sequence-numbered prediction events and per-second counts for streaming clients.
+
+    ``publish`` is called from the inference worker with each classified batch;
+    readers ask for the events after the last sequence number they saw and
+    block in ``wait`` until there is something new. Sequence numbers keep
+    increasing across captures, so a reconnecting client never mistakes an old
+    id for a new one.
+    """
+
+    def __init__(self, max_events=LIVE_FEED_EVENTS, window_seconds=COUNT_WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self._events = deque(maxlen=max_events)
+        self._counts = OrderedDict()
+        self._cond = threading.Condition()
+        self.seq = 0
+        self.total = 0
+
+    def publish(self, rows):
+        if not rows:
+            return
+        second = int(time.time())
+        with self._cond:
+            bucket = self._counts.get(second)
+            if bucket is None:
+                bucket = self._counts[second] = {'second': second, 'packets': 0, 'flows': 0, 'labels': {}}
+                while self._counts and next(iter(self._counts)) <= second - self.window_seconds:
+                    self._counts.popitem(last=False)
+            for row in rows:
+                self.seq += 1
+                event = {field: row[field] for field in EVENT_FIELDS if field in row}
+                event['seq'] = self.seq
+                self._events.append(event)
+                if row.get('flow_complete'):
+                    bucket['flows'] += 1
+                    continue
+                self.total += 1
+                bucket['packets'] += 1
+                label = str(row.get('prediction'))
+                bucket['labels'][label] = bucket['labels'].get(label, 0) + 1
+            self._cond.notify_all()
+
+    def since(self, seq, limit=LIVE_FEED_EVENTS):
+        """Events after ``seq`` (at most ``limit``, newest kept) and the sequence number to resume from."""
+        with self._cond:
+            events = [event for event in self._events if event['seq'] > seq] if seq < self.seq else []
+            return events[-limit:], self.seq
+
+    def counts(self, since_second=None):
+        """Per-second packet counts by label, oldest first; copies safe to serialize."""
+        with self._cond:
+            return [dict(bucket, labels=dict(bucket['labels'])) for second, bucket in self._counts.items()
+                    if since_second is None or second >= since_second]
+
+    def wait(self, seq, timeout):
+        """Block until an event newer than ``seq`` is published; True if there is one."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.seq > seq, timeout)
+
+    def clear(self):
+        with self._cond:
+            self._events.clear()
+            self._counts.clear()
+            self.total = 0
+            self._cond.notify_all()
@@ -0,0 +1,297 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: registrations are then only serialized within this process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REGISTRY_DIR = os.path.join('models', 'registry')
+
+# Loaded models kept in memory, so switching back to one of them is instant
+MODEL_CACHE_SIZE = 4
+
+MODEL_FILE = 'model.joblib'
+PIPELINE_FILE = 'preprocessing.pkl'
+MANIFEST_FILE = 'manifest.json'
+# Held while a version number is picked and its directory moved into place
+LOCK_FILE = '.registry.lock'
+
+
+def _hash_file(digest, path, block_size=1 << 20):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+
+def artifact_sha256(version_dir):
+    """Hash of the stored files of an artifact, checked before they are unpickled."""
+    digest = hashlib.sha256()
+    for filename in (MODEL_FILE, PIPELINE_FILE):
+        path = os.path.join(version_dir, filename)
+        if os.path.exists(path):
+            _hash_file(digest, path)
+    return digest.hexdigest()
+
+
+def content_sha256(model_path, pipeline=None):
+    """Identity of an uploaded model: its file bytes plus its preprocessing state.
+
+    Hashing what was uploaded rather than a re-dump matters because pickled
+    sklearn trees include uninitialized padding bytes, so dumping the same
+    model twice does not give the same bytes.
+    """
+    digest = hashlib.sha256()
+    _hash_file(digest, model_path)
+    if pipeline is not None:
+        digest.update(pickle.dumps(pipeline, protocol=4))
+    return digest.hexdigest()
+
+
+def read_model_file(path):
+    """Unpickle an uploaded model with joblib, falling back to plain pickle."""
+    import joblib
+
+    try:
+        return joblib.load(path)
+    except Exception as joblib_error:
+        logger.warning(f"Joblib load failed: {str(joblib_error)}. Falling back to pickle.")
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except Exception as pickle_error:
+            raise ValueError(
+                f"Failed to load model.\n"
+                f"Joblib error: {str(joblib_error)}\n"
+                f"Pickle error: {str(pickle_error)}"
+            )
+
+
+class LoadedModel:
+    """A registry model in memory: the estimator, its preprocessing state and manifest.
+
+    Instances are never mutated after loading, so a reader holding one always
+    sees a consistent model/pipeline/feature list even while another model is
+    being activated.
+    """
+
+    def __init__(self, model, pipeline, manifest):
+        self.model = model
+        self.pipeline = pipeline
+        self.manifest = manifest
+        self.feature_names = manifest.get('features') or (
+            pipeline.feature_names if pipeline is not None and pipeline.feature_names
+            else list(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else None)
+        self.classes = manifest.get('classes') or (
+            model.classes_.tolist() if hasattr(model, 'classes_') else None)
+
+    @property
+    def sha256(self):
+        return self.manifest['sha256']
+
+    @property
+    def name(self):
+        return self.manifest['name']
+
+    @property
+    def version(self):
+        return self.manifest['version']
+
+
+class ModelRegistry:
+    """Versioned model artifacts under ``models/registry/<name>/v<N>/``.
+
+    Each version holds the estimator dumped uncompressed with joblib (so its
+    arrays can be memory-mapped on load), the preprocessing state, and a
+    manifest with the content sha256, the stored files' hash, the feature
+    list and classes. Registering content that is already stored returns the
+    existing version. Loads check the stored files' hash before unpickling and
+    go through an LRU cache keyed by content hash.
+    """
+
+    def __init__(self, root=REGISTRY_DIR, cache_size=MODEL_CACHE_SIZE):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._register_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _version_dir(self, name, version):
+        return os.path.join(self.root, name, f"v{version}")
+
+    @contextlib.contextmanager
+    def _registering(self):
+        """Serialize registrations across threads and processes (job and training workers register too)"""
+        with self._register_lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, LOCK_FILE), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def manifests(self, name=None):
+        """Manifests of all registered versions, newest first."""
+        names = [name] if name else (sorted(os.listdir(self.root)) if os.path.isdir(self.root) else [])
+        manifests = []
+        for model_name in names:
+            model_dir = os.path.join(self.root, model_name)
+            if not os.path.isdir(model_dir):
+                continue
+            for entry in os.listdir(model_dir):
+                path = os.path.join(model_dir, entry, MANIFEST_FILE)
+                if entry.startswith('v') and os.path.exists(path):
+                    with open(path) as f:
+                        manifests.append(json.load(f))
+        manifests.sort(key=lambda m: (m['created_at'], m['version']), reverse=True)
+        return manifests
+
+    def find(self, sha256=None, name=None, version=None):
+        """Manifest by content hash (a unique prefix is enough), or by name and version (latest by default)."""
+        if sha256:
+            matches = [m for m in self.manifests() if m['sha256'].startswith(sha256)]
+            return matches[0] if len(matches) == 1 else None
+        if name:
+            versions = self.manifests(name)
+            if version is None:
+                return max(versions, key=lambda m: m['version']) if versions else None
+            return next((m for m in versions if m['version'] == int(version)), None)
+        return None
+
+    def register(self, model, name, pipeline=None, source=None, sha256=None):
+        """Store ``model`` as the next version of ``name``; returns its manifest.
+
+        ``sha256`` identifies the content (see ``content_sha256``); it defaults
+        to the hash of the stored artifact.
+        """
+        import joblib
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{name}-", dir=self.root)
+        try:
+            # Uncompressed, so numpy arrays inside the model can be memory-mapped on load
+            model_path = os.path.join(tmp_dir, MODEL_FILE)
+            joblib.dump(model, model_path)
+            if pipeline is not None:
+                pipeline.save(os.path.join(tmp_dir, PIPELINE_FILE))
+            stored_sha256 = artifact_sha256(tmp_dir)
+            sha256 = sha256 or stored_sha256
+
+            features = (pipeline.feature_names if pipeline is not None and pipeline.feature_names
+                        else list(model.feature_names_in_) if hasattr(model, 'feature_names_in_') else None)
+            classes = getattr(model, 'classes_', None)
+
+            with self._registering():
+                existing = self._existing(name, sha256)
+                if existing is not None:
+                    return existing
+                versions = [m['version'] for m in self.manifests(name)]
+                version = max(versions, default=0) + 1
+                # A directory left without a manifest by an interrupted registration keeps its number
+                while os.path.exists(self._version_dir(name, version)):
+                    version += 1
+                manifest = {
+                    'name': name,
+                    'version': version,
+                    'sha256': sha256,
+                    'artifact_sha256': stored_sha256,
+                    'model_type': type(model).__name__,
+                    'features': [str(feature) for feature in features] if features is not None else None,
+                    'classes': [c.item() if hasattr(c, 'item') else c for c in classes] if classes is not None else None,
+                    'preprocessing': pipeline is not None,
+                    'normalization': pipeline.normalization_type if pipeline is not None else None,
+                    'size_bytes': os.path.getsize(model_path),
+                    'source': source,
+                    'created_at': time.time(),
+                }
+                with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+                    json.dump(manifest, f, indent=2)
+                target = self._version_dir(name, version)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                # The version appears complete or not at all
+                os.replace(tmp_dir, target)
+            logger.info(f"Registered {name} v{version} ({sha256[:12]})")
+            return manifest
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def register_file(self, path, name, pipeline=None, source=None):
+        """Register a model file as uploaded (joblib or pickle).
+
+        A file already registered under ``name`` with the same preprocessing
+        state returns its existing version without being unpickled again.
+        """
+        sha256 = content_sha256(path, pipeline)
+        existing = self._existing(name, sha256)
+        if existing is not None:
+            return existing
+        model = read_model_file(path)
+        if not hasattr(model, 'predict'):
+            raise ValueError("Uploaded file is not a valid scikit-learn model (missing predict method)")
+        return self.register(model, name, pipeline=pipeline, source=source, sha256=sha256)
+
+    def _existing(self, name, sha256):
+        return next((m for m in self.manifests(name) if m['sha256'] == sha256), None)
+
+    def load(self, manifest):
+        """The ``LoadedModel`` for a manifest, from the cache when possible."""
+        sha256 = manifest['sha256']
+        with self._lock:
+            loaded = self._cache.get(sha256)
+            if loaded is not None:
+                self._cache.move_to_end(sha256)
+                self.hits += 1
+                return loaded
+            self.misses += 1
+
+        version_dir = self._version_dir(manifest['name'], manifest['version'])
+        model_path = os.path.join(version_dir, MODEL_FILE)
+        # Refuse to unpickle an artifact that changed since it was registered
+        if artifact_sha256(version_dir) != manifest['artifact_sha256']:
+            raise ValueError(f"{manifest['name']} v{manifest['version']} changed since it was registered; refusing to load it")
+        import joblib
+        model = joblib.load(model_path, mmap_mode='r')
+        pipeline_path = os.path.join(version_dir, PIPELINE_FILE)
+        pipeline = joblib.load(pipeline_path) if os.path.exists(pipeline_path) else None
+        loaded = LoadedModel(model, pipeline, manifest)
+
+        with self._lock:
+            self._cache[sha256] = loaded
+            self._cache.move_to_end(sha256)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return loaded
+
+    def cached(self):
+        with self._lock:
+            return list(self._cache)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached_models': len(self._cache),
+                'cache_size': self.cache_size,
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+            }
+
+
+registry = ModelRegistry()
@@ -0,0 +1,136 @@
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import numpy as np
+
+# Batch sizes profiled after training: one packet at a time, the default
+# inference micro-batch, and a bulk batch
+PROFILE_BATCH_SIZES = (1, 64, 1024)
+
+
+class LatencyStats:
+    """Keeps the most recent latency samples (in seconds) and reports percentiles in ms."""
+
+    def __init__(self, maxlen=4096):
+        self._samples = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def extend(self, samples):
+        with self._lock:
+            self._samples.extend(samples)
+
+    def percentiles(self, points=(50, 99)):
+        with self._lock:
+            samples = np.fromiter(self._samples, dtype=float, count=len(self._samples))
+        if samples.size == 0:
+            return {f"p{p}_ms": 0.0 for p in points}
+        values = np.percentile(samples, points) * 1000.0
+        return {f"p{p}_ms": round(float(v), 3) for p, v in zip(points, values)}
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+def current_rss_mb():
+    """Resident set size of this process in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def prediction_method(model):
+    """The method live inference calls on ``model``, as in ``predict_batch``."""
+    for name in ('predict_proba', 'decision_function', 'predict'):
+        if hasattr(model, name):
+            return name
+    raise ValueError("Model has no prediction method")
+
+
+def profile_model(model, X, model_path=None, batch_sizes=PROFILE_BATCH_SIZES,
+                  max_seconds=1.0, max_repeats=200, seed=0):
+    """Measure prediction latency and throughput of a fitted model.
+
+    Each batch size is timed on rows sampled from ``X`` for up to
+    ``max_seconds`` (at least 5 and at most ``max_repeats`` calls). With
+    ``model_path`` the saved size and the RSS growth of loading it are added.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    method = prediction_method(model)
+    predict = getattr(model, method)
+    rng = np.random.default_rng(seed)
+
+    batches = {}
+    for size in batch_sizes:
+        batch = X[rng.integers(0, len(X), size)]
+        predict(batch)  # warm-up
+        stats = LatencyStats(maxlen=max_repeats)
+        total = 0.0
+        calls = 0
+        deadline = time.perf_counter() + max_seconds
+        while calls < max_repeats and (calls < 5 or time.perf_counter() < deadline):
+            started = time.perf_counter()
+            predict(batch)
+            elapsed = time.perf_counter() - started
+            stats.add(elapsed)
+            total += elapsed
+            calls += 1
+        batches[str(size)] = {
+            **stats.percentiles(),
+            'rows_per_s': round(size * calls / total, 1) if total else 0.0,
+            'calls': calls,
+        }
+
+    profile = {'model_type': type(model).__name__, 'prediction_method': method,
+               'batches': batches, 'profiled_at': time.time()}
+
+    if model_path is not None:
+        import joblib
+        profile['model_size_kb'] = round(os.path.getsize(model_path) / 1024.0, 1)
+        # RSS misses allocations served from memory the process already holds,
+        # so also count what loading allocates
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        before = current_rss_mb()
+        allocated_before = tracemalloc.get_traced_memory()[0]
+        copy = joblib.load(model_path)
+        profile['load_rss_delta_mb'] = round(max(0.0, current_rss_mb() - before), 2)
+        profile['load_allocated_mb'] = round((tracemalloc.get_traced_memory()[0] - allocated_before) / (1024.0 * 1024.0), 3)
+        if not tracing:
+            tracemalloc.stop()
+        del copy
+    return profile
+
+
+def model_profile_path(model_path):
+    """Where the profile of ``models/<name>.pkl`` is stored."""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}_profile.json"
+
+
+def save_profile(profile, model_path):
+    path = model_profile_path(model_path)
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    return path
+
+
+def load_profile(model_path):
+    path = model_profile_path(model_path)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
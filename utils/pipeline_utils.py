@@ -0,0 +1,101 @@
+import os
+
+import numpy as np
+
+from utils.correlated_utils import correlated_features
+
+# Preprocessing state learned from the current uploads/train split
+DATASET_PIPELINE_PATH = os.path.join('uploads', 'preprocessing.pkl')
+
+
+def make_scaler(normalization_type):
+    from sklearn.preprocessing import MinMaxScaler, StandardScaler, QuantileTransformer
+
+    if normalization_type == "minmax":
+        return MinMaxScaler()
+    if normalization_type == "standard":
+        return StandardScaler()
+    if normalization_type == "quantile":
+        return QuantileTransformer(output_distribution='normal')
+    raise ValueError("Invalid normalization type")
+
+
+class PreprocessingPipeline:
+    """Column drop list and fitted scaler learned on the train split only.
+
+    The same state is applied to the validation and test splits and, saved
+    next to a trained model, to live traffic rows in ``predict_traffic``.
+    """
+
+    def __init__(self, label='Label'):
+        self.label = label
+        self.removed_features = {"zero_std": [], "highly_correlated": []}
+        self.drop_columns = []
+        self.feature_names = None
+        self.normalization_type = None
+        self.scaler = None
+
+    def fit_drop_list(self, train_df, threshold=1.0):
+        X = train_df.drop(self.label, axis=1)
+        self.removed_features = correlated_features(X, threshold=threshold)
+        self.drop_columns = self.removed_features["zero_std"] + self.removed_features["highly_correlated"]
+        self.feature_names = [col for col in X.columns if col not in set(self.drop_columns)]
+        # A new drop list invalidates any scaler fitted on the old columns
+        self.scaler = None
+        self.normalization_type = None
+        return self.removed_features
+
+    def drop(self, df):
+        """Drop the learned columns and move the label last, as CORRELATED did."""
+        features = self.feature_names or [col for col in df.columns if col != self.label]
+        columns = [col for col in features if col in df.columns]
+        if self.label in df.columns:
+            columns.append(self.label)
+        return df[columns]
+
+    def fit_scaler(self, train_df, normalization_type):
+        if self.feature_names is None:
+            self.feature_names = [col for col in train_df.columns if col != self.label]
+        scaler = make_scaler(normalization_type)
+        scaler.fit(train_df[self.feature_names].to_numpy(dtype=np.float64))
+        self.scaler = scaler
+        self.normalization_type = normalization_type
+
+    def scale(self, df):
+        """Return a copy of ``df`` with the feature columns scaled by the fitted scaler."""
+        df = df.copy()
+        df[self.feature_names] = self.transform_array(df[self.feature_names].to_numpy(dtype=np.float64))
+        return df
+
+    def transform_array(self, X):
+        """Scale a feature matrix whose columns are ordered like ``feature_names``."""
+        if self.scaler is None:
+            return X
+        return self.scaler.transform(X)
+
+    def without_scaler(self):
+        pipeline = PreprocessingPipeline(self.label)
+        pipeline.removed_features = self.removed_features
+        pipeline.drop_columns = list(self.drop_columns)
+        pipeline.feature_names = self.feature_names
+        return pipeline
+
+    def save(self, path=DATASET_PIPELINE_PATH):
+        import joblib
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        joblib.dump(self, path)
+        return path
+
+    @staticmethod
+    def load(path=DATASET_PIPELINE_PATH):
+        if not os.path.exists(path):
+            return None
+        import joblib
+        return joblib.load(path)
+
+
+def model_pipeline_path(model_path):
+    """Where the preprocessing state of ``models/<name>.pkl`` is stored."""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}_preprocessing.pkl"
@@ -0,0 +1,151 @@
+import os
+import random
+import time
+
+# Capture requests may only replay pcap files from this directory
+PCAP_FOLDER = os.path.join('uploads', 'pcaps')
+
+
+def iter_pcap(path):
+    """Yield packets from a pcap/pcapng file without loading it into memory."""
+    from scapy.utils import PcapReader
+
+    with PcapReader(path) as reader:
+        for packet in reader:
+            yield packet
+
+
+class RawFrame:
+    """An undissected frame with the attributes ``replay`` and the capture reader use."""
+
+    __slots__ = ('original', 'time', 'wirelen', 'linktype')
+
+    def __init__(self, original, time, wirelen=None, linktype=1):
+        self.original = original
+        self.time = time
+        self.wirelen = wirelen
+        self.linktype = linktype
+
+
+def iter_pcap_frames(path):
+    """Yield ``RawFrame`` objects from a pcap/pcapng file without dissecting them."""
+    from scapy.utils import RawPcapReader
+
+    with RawPcapReader(path) as reader:
+        for data, meta in reader:
+            # pcapng records the link type per interface, pcap once per file
+            if hasattr(meta, 'tsresol'):
+                ts = ((meta.tshigh << 32) | meta.tslow) / meta.tsresol
+                linktype = meta.linktype
+            else:
+                ts = meta.sec + meta.usec / (1e9 if reader.nano else 1e6)
+                linktype = reader.linktype
+            yield RawFrame(data, ts, meta.wirelen if meta.wirelen > len(data) else None, linktype)
+
+
+def synthetic_packets(count, flows=200, attack_ratio=0.3, start_time=None, seed=42):
+    """Generate a reproducible mix of benign TCP conversations and a SYN flood.
+
+    Benign packets belong to ``flows`` client/server conversations with ordinary
+    payload sizes; ``attack_ratio`` of the packets are spoofed-source SYNs aimed
+    at one victim, which is the traffic shape the DDoS models are trained on.
+    """
+    from scapy.all import Ether, IP, TCP, Raw
+
+    rng = random.Random(seed)
+    now = time.time() if start_time is None else start_time
+    clients = [(f"10.0.{i // 250}.{i % 250 + 1}", rng.randint(1024, 65535)) for i in range(flows)]
+    servers = [("192.168.1.10", 80), ("192.168.1.11", 443), ("192.168.1.12", 22)]
+    victim = ("192.168.1.10", 80)
+
+    for _ in range(count):
+        now += rng.expovariate(10000.0)
+        if rng.random() < attack_ratio:
+            src = f"172.{rng.randint(16, 31)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+            packet = (Ether() / IP(src=src, dst=victim[0]) /
+                      TCP(sport=rng.randint(1024, 65535), dport=victim[1], flags='S', window=1024))
+        else:
+            index = rng.randrange(flows)
+            client, cport = clients[index]
+            server, sport = servers[index % len(servers)]
+            payload = Raw(b'x' * rng.choice((0, 64, 512, 1400)))
+            if rng.random() < 0.5:
+                packet = Ether() / IP(src=client, dst=server) / TCP(sport=cport, dport=sport, flags='PA', window=64240) / payload
+            else:
+                packet = Ether() / IP(src=server, dst=client) / TCP(sport=sport, dport=cport, flags='PA', window=65160) / payload
+        # Round-trip through bytes so consumers dissect real frames, as in live capture
+        packet = Ether(bytes(packet))
+        packet.time = now
+        yield packet
+
+
+def replay(packets, handler, rate=None, speed=None, should_stop=None):
+    """Feed packets to ``handler`` as fast as possible or at a paced rate.
+
+    ``rate`` paces to a fixed number of packets per second; ``speed`` instead
+    follows the packets' own timestamps scaled by the given factor (1.0 is real
+    time). With neither, packets are replayed back to back.
+    Returns the number of packets handed to the handler.
+    """
+    sent = 0
+    wall_start = time.perf_counter()
+    first_ts = None
+
+    for packet in packets:
+        if should_stop is not None and should_stop():
+            break
+
+        if rate:
+            target = wall_start + sent / rate
+        elif speed:
+            if first_ts is None:
+                first_ts = float(packet.time)
+            target = wall_start + (float(packet.time) - first_ts) / speed
+        else:
+            target = None
+        if target is not None:
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        handler(packet)
+        sent += 1
+    return sent
+
+
+def resolve_pcap_path(pcap_path, folder=PCAP_FOLDER):
+    """Real path of the pcap file ``pcap_path`` names inside ``folder``.
+
+    A relative path is taken relative to ``folder``. Raises ValueError for a
+    missing file or one that resolves outside ``folder``, through ``..`` or
+    a symlink, so a capture request cannot make the server read other files.
+    """
+    folder = os.path.realpath(folder)
+    if not pcap_path or not isinstance(pcap_path, str):
+        raise ValueError(f"pcap_path must name a pcap file in {folder}")
+    path = os.path.realpath(os.path.join(folder, pcap_path))
+    if os.path.commonpath([folder, path]) != folder or not os.path.isfile(path):
+        raise ValueError(f"pcap_path must name an existing pcap file in {folder}")
+    return path
+
+
+def replay_source(options, raw=False):
+    """Return (packets, rate, speed) for a ``pcap`` or ``synthetic`` capture request.
+
+    With ``raw`` pcap files yield undissected ``RawFrame`` objects. The pcap
+    path is used as given; paths from a request go through
+    ``resolve_pcap_path`` first.
+    """
+    source = options.get('source')
+    rate = float(options['replay_rate']) if options.get('replay_rate') else None
+    speed = float(options['replay_speed']) if options.get('replay_speed') else None
+    if source == 'pcap':
+        pcap_path = options.get('pcap_path')
+        if not pcap_path or not os.path.isfile(pcap_path):
+            raise ValueError('pcap_path must point to an existing pcap file')
+        packets = iter_pcap_frames(pcap_path) if raw else iter_pcap(pcap_path)
+    elif source == 'synthetic':
+        packets = synthetic_packets(int(options.get('packet_count', 10000)))
+    else:
+        raise ValueError(f"Unknown capture source: {source}")
+    return packets, rate, speed
@@ -0,0 +1,130 @@
+import itertools
+import math
+import time
+
+import numpy as np
+
+from utils.perf_utils import prediction_method
+
+# Search space per model when the request gives none. A list is a set of
+# choices; a dict samples between ``low`` and ``high`` (``log`` for a
+# log-uniform scale, ``int`` for whole numbers)
+DEFAULT_SEARCH_SPACES = {
+    'decision_tree': {'max_depth': [3, 5, 8, 12, 16, None], 'min_samples_leaf': [1, 5, 20],
+                      'criterion': ['gini', 'entropy']},
+    'naive_bayes': {'var_smoothing': {'low': 1e-11, 'high': 1e-5, 'log': True}},
+    'knn': {'n_neighbors': [1, 3, 5, 9, 15, 25], 'weights': ['uniform', 'distance']},
+    'svm': {'C': {'low': 0.1, 'high': 100.0, 'log': True}, 'gamma': ['scale', 'auto']},
+    'logistic_regression': {'C': {'low': 1e-3, 'high': 100.0, 'log': True}},
+    'sgd': {'alpha': {'low': 1e-6, 'high': 1e-2, 'log': True}, 'penalty': ['l2', 'l1', 'elasticnet']},
+    'lda': {'solver': ['svd', 'lsqr']},
+    'qda': {'reg_param': {'low': 0.0, 'high': 0.5}},
+    'random_forest': {'n_estimators': [25, 50, 100, 200], 'max_depth': [8, 16, None],
+                      'max_features': ['sqrt', 'log2'], 'min_samples_leaf': [1, 5]},
+    'mlp': {'hidden_layer_sizes': [[50], [100], [100, 50]], 'alpha': {'low': 1e-5, 'high': 1e-2, 'log': True},
+            'learning_rate_init': {'low': 1e-4, 'high': 1e-2, 'log': True}},
+    'gradient_boosting': {'n_estimators': [50, 100, 200], 'learning_rate': {'low': 0.03, 'high': 0.3, 'log': True},
+                          'max_depth': [2, 3, 5]},
+}
+
+# Rows per predict call when timing a candidate, as the live inference engine batches them
+LATENCY_BATCH_ROWS = 64
+
+
+def _choice(value):
+    # JSON has no tuples; sklearn wants them for shapes like hidden_layer_sizes
+    return tuple(value) if isinstance(value, list) else value
+
+
+def validate_space(space):
+    """Raise ValueError unless every entry is a value, a non-empty list or a {low, high} range."""
+    if not isinstance(space, dict):
+        raise ValueError("The parameter space must be an object of parameter name to values")
+    for name, values in space.items():
+        if isinstance(values, list) and not values:
+            raise ValueError(f"No values given for {name}")
+        if isinstance(values, dict):
+            if 'low' not in values or 'high' not in values:
+                raise ValueError(f"Range for {name} needs low and high")
+            low, high = values['low'], values['high']
+            if not isinstance(low, (int, float)) or not isinstance(high, (int, float)) or low > high:
+                raise ValueError(f"Range for {name} needs numbers with low <= high")
+            if values.get('log') and low <= 0:
+                raise ValueError(f"Log range for {name} needs low > 0")
+
+
+def sample_configs(space, max_configs, seed=0):
+    """Distinct parameter dicts from ``space``, at most ``max_configs`` of them.
+
+    A space of lists that fits in the budget is searched exhaustively;
+    otherwise configurations are drawn at random with ``seed``.
+    """
+    names = sorted(space)
+    if all(isinstance(space[name], list) for name in names):
+        grid = list(itertools.product(*(space[name] for name in names)))
+        if len(grid) <= max_configs:
+            return [{name: _choice(value) for name, value in zip(names, values)} for values in grid]
+
+    rng = np.random.default_rng(seed)
+    configs, seen = [], set()
+    for _ in range(max_configs * 20):
+        config = {}
+        for name in names:
+            values = space[name]
+            if isinstance(values, list):
+                config[name] = _choice(values[rng.integers(len(values))])
+            elif isinstance(values, dict):
+                low, high = values['low'], values['high']
+                value = (math.exp(rng.uniform(math.log(low), math.log(high))) if values.get('log')
+                         else rng.uniform(low, high))
+                config[name] = int(round(value)) if values.get('int') else float(value)
+            else:
+                config[name] = values
+        key = repr(sorted(config.items()))
+        if key not in seen:
+            seen.add(key)
+            configs.append(config)
+            if len(configs) == max_configs:
+                break
+    return configs
+
+
+def halving_schedule(n_configs, n_rows, eta=3, min_rows=1000):
+    """(configurations, training rows) per round of successive halving.
+
+    Every round keeps the best 1/eta of the configurations and trains them
+    on eta times as many rows; the last round uses all ``n_rows``.
+    """
+    if n_configs <= 0 or n_rows <= 0:
+        return []
+    min_rows = max(1, min(min_rows, n_rows))
+    rounds = 1 + min(int(math.log(n_configs, eta) + 1e-9) if n_configs > 1 else 0,
+                     int(math.log(n_rows / min_rows, eta) + 1e-9))
+    schedule = []
+    for index in range(rounds):
+        configs = max(1, math.ceil(n_configs / eta ** index))
+        rows = max(min_rows, int(n_rows / eta ** (rounds - 1 - index)))
+        schedule.append((configs, min(rows, n_rows)))
+    return schedule
+
+
+def objective(validation_accuracy, latency_ms, latency_weight):
+    """Score to maximise: accuracy minus ``latency_weight`` per millisecond of batch latency."""
+    return validation_accuracy - latency_weight * latency_ms
+
+
+def batch_latency_ms(model, X, batch_rows=LATENCY_BATCH_ROWS, min_calls=5, max_seconds=0.2, seed=0):
+    """Median milliseconds of one prediction call on ``batch_rows`` rows sampled from ``X``."""
+    predict = getattr(model, prediction_method(model))
+    rng = np.random.default_rng(seed)
+    batch = np.asarray(X[np.sort(rng.integers(0, len(X), batch_rows))], dtype=np.float64)
+    predict(batch)  # warm-up
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < min_calls or time.perf_counter() < deadline:
+        started = time.perf_counter()
+        predict(batch)
+        samples.append(time.perf_counter() - started)
+        if len(samples) >= 200:
+            break
+    return float(np.median(samples)) * 1000.0
@@ -0,0 +1,290 @@
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache lock then only covers this process's threads
+    fcntl = None
+
+from utils.dataset_store import UPLOAD_FOLDER, dataset_exists, dataset_path, dataset_sha256, remove_dataset_stats
+
+logger = logging.getLogger(__name__)
+
+STAGE_CACHE_DIR = os.path.join(UPLOAD_FOLDER, 'stage_cache')
+
+# Bytes of cached results and datasets kept before the least recently used entries go
+STAGE_CACHE_MAX_BYTES = 2 << 30
+
+ENTRY_FILE = 'entry.json'
+RESULT_FILE = 'result.pkl'
+STATS_FILE = 'stats.json'
+
+
+def dataset_digests(names):
+    """Content hash of every stored dataset among ``names``"""
+    return {name: dataset_sha256(name) for name in names if dataset_exists(name)}
+
+
+def stage_key(stage, inputs, params=None):
+    """Cache key: hash of the stage name, the content hashes of its inputs and its parameters"""
+    description = json.dumps({'stage': stage, 'inputs': inputs, 'params': params or {}},
+                             sort_keys=True, default=str)
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+def _link_or_copy(source, target):
+    # Datasets are only ever replaced, never written in place, so a hard link is a safe copy
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class StageCache:
+    """Results of pipeline stages under ``uploads/stage_cache/<key>/``.
+
+    The key (``stage_key``) covers the content hashes of the stage's input
+    datasets, the stage name and its parameters, so only new data or new
+    settings miss. An entry holds the stage's result pickled with joblib, the
+    datasets it wrote (hard-linked when the filesystem allows) and a manifest
+    with their hashes. A stage that rewrites its inputs also stores aliases
+    keyed by its outputs, so running it again on its own output is a hit.
+    Entries beyond ``max_bytes`` are evicted least recently used first. Hit,
+    miss and eviction counts per stage are kept in ``stats.json`` so that
+    stages run in job worker processes are counted too. Those processes share
+    the cache, so manifests, counters and eviction are changed only under an
+    ``flock`` on ``<root>.lock``.
+    """
+
+    def __init__(self, root=STAGE_CACHE_DIR, max_bytes=STAGE_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock_path = os.path.normpath(root) + '.lock'
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(os.path.dirname(self.lock_path) or '.', exist_ok=True)
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _entry_dir(self, key):
+        return os.path.join(self.root, key)
+
+    def _read_entry(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), ENTRY_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def fetch(self, stage, key, restore=False):
+        """(result, restored dataset names) stored under ``key`` or the entry it is an alias of, or None.
+
+        With ``restore`` the entry's datasets are put back in the store as
+        well. All of it happens under the cache lock, so no other process can
+        evict the entry halfway; an entry that cannot be read or unpickled
+        counts as a miss, and the stage runs again.
+        """
+        import joblib
+
+        with self._locked():
+            entry = self._read_entry(key)
+            if entry is not None and entry.get('alias_of'):
+                entry = self._read_entry(entry['alias_of'])
+            try:
+                if entry is None:
+                    raise FileNotFoundError(key)
+                result = joblib.load(os.path.join(self._entry_dir(entry['key']), RESULT_FILE))
+                restored = self._restore_datasets(entry) if restore else []
+            except Exception as e:
+                if entry is not None:
+                    logger.warning(f"Ignoring unreadable {stage} cache entry {entry['key'][:12]}: {str(e)}")
+                self._count(stage, 'misses')
+                return None
+            entry['last_used'] = time.time()
+            entry['hits'] += 1
+            _write_json(os.path.join(self._entry_dir(entry['key']), ENTRY_FILE), entry)
+            self._count(stage, 'hits')
+        return result, restored
+
+    def _restore_datasets(self, entry):
+        """Put the datasets of ``entry`` back in the store, skipping those already identical"""
+        restored = []
+        for name, stored in entry['datasets'].items():
+            if dataset_exists(name) and dataset_sha256(name) == stored['sha256']:
+                continue
+            path = dataset_path(name)
+            tmp_path = path + '.tmp'
+            _link_or_copy(os.path.join(self._entry_dir(entry['key']), stored['file']), tmp_path)
+            os.replace(tmp_path, path)
+            remove_dataset_stats(name)
+            dataset_sha256(name, known=stored['sha256'])
+            restored.append(name)
+        return restored
+
+    def put(self, stage, key, result, datasets=(), aliases=(), inputs=None, params=None):
+        """Store ``result`` and the stored ``datasets`` a stage produced under ``key``.
+
+        ``aliases`` are further keys that lead to the same entry. Returns the
+        manifest, or None when it could not be stored or alone is larger than the cache.
+        """
+        import joblib
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(prefix=f".{stage}-", dir=self.root)
+        try:
+            joblib.dump(result, os.path.join(tmp_dir, RESULT_FILE))
+            stored = {}
+            for name in datasets:
+                filename = os.path.basename(dataset_path(name))
+                _link_or_copy(dataset_path(name), os.path.join(tmp_dir, filename))
+                stored[name] = {'file': filename, 'sha256': dataset_sha256(name)}
+            size = sum(os.path.getsize(os.path.join(tmp_dir, filename)) for filename in os.listdir(tmp_dir))
+            if size > self.max_bytes:
+                logger.info(f"Not caching {stage} result: {size} bytes exceed the {self.max_bytes} byte cache")
+                return None
+
+            now = time.time()
+            entry = {
+                'key': key,
+                'stage': stage,
+                'inputs': inputs,
+                'params': params,
+                'datasets': stored,
+                'size_bytes': size,
+                'created_at': now,
+                'last_used': now,
+                'hits': 0,
+            }
+            _write_json(os.path.join(tmp_dir, ENTRY_FILE), entry)
+            with self._locked():
+                target = self._entry_dir(key)
+                if os.path.exists(target):
+                    shutil.rmtree(target, ignore_errors=True)
+                # The entry appears complete or not at all
+                os.replace(tmp_dir, target)
+                for alias in aliases:
+                    existing = self._read_entry(alias)
+                    if alias == key or (existing is not None and not existing.get('alias_of')):
+                        continue
+                    os.makedirs(self._entry_dir(alias), exist_ok=True)
+                    _write_json(os.path.join(self._entry_dir(alias), ENTRY_FILE),
+                                {'key': alias, 'stage': stage, 'alias_of': key, 'created_at': now})
+                self._evict(keep=key)
+            return entry
+        except OSError as e:
+            # The stage's result is still returned; it is only not cached
+            logger.warning(f"Could not cache {stage} result: {str(e)}")
+            return None
+        finally:
+            if os.path.exists(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _entries(self):
+        if not os.path.isdir(self.root):
+            return []
+        entries = (self._read_entry(name) for name in os.listdir(self.root) if not name.startswith('.'))
+        return [entry for entry in entries if entry is not None]
+
+    def _evict(self, keep=None):
+        entries = self._entries()
+        stored = sorted((entry for entry in entries if not entry.get('alias_of')),
+                        key=lambda entry: entry['last_used'])
+        total = sum(entry['size_bytes'] for entry in stored)
+        live = {entry['key'] for entry in stored}
+        for entry in stored:
+            if total <= self.max_bytes:
+                break
+            if entry['key'] == keep:
+                continue
+            shutil.rmtree(self._entry_dir(entry['key']), ignore_errors=True)
+            total -= entry['size_bytes']
+            live.discard(entry['key'])
+            self._count(entry['stage'], 'evictions')
+        # Aliases go with the entry they point to
+        for entry in entries:
+            if entry.get('alias_of') and entry['alias_of'] not in live:
+                shutil.rmtree(self._entry_dir(entry['key']), ignore_errors=True)
+
+    def _read_stats(self):
+        try:
+            with open(os.path.join(self.root, STATS_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _count(self, stage, counter):
+        stats = self._read_stats()
+        counts = stats.setdefault(stage, {'hits': 0, 'misses': 0, 'evictions': 0})
+        counts[counter] = counts.get(counter, 0) + 1
+        os.makedirs(self.root, exist_ok=True)
+        _write_json(os.path.join(self.root, STATS_FILE), stats)
+
+    def stats(self):
+        with self._locked():
+            entries = self._entries()
+            counts = self._read_stats()
+        stages = {}
+        for stage, stage_counts in counts.items():
+            stages[stage] = dict(stage_counts, entries=0, size_bytes=0)
+        for entry in entries:
+            if entry.get('alias_of'):
+                continue
+            stage = stages.setdefault(entry['stage'], {'hits': 0, 'misses': 0, 'evictions': 0,
+                                                       'entries': 0, 'size_bytes': 0})
+            stage['entries'] += 1
+            stage['size_bytes'] += entry['size_bytes']
+        hits = sum(stage['hits'] for stage in stages.values())
+        misses = sum(stage['misses'] for stage in stages.values())
+        return {
+            'entries': sum(stage['entries'] for stage in stages.values()),
+            'aliases': sum(1 for entry in entries if entry.get('alias_of')),
+            'size_bytes': sum(stage['size_bytes'] for stage in stages.values()),
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'evictions': sum(stage['evictions'] for stage in stages.values()),
+            'stages': stages,
+        }
+
+    def clear(self):
+        """Remove every entry and reset the counters"""
+        with self._locked():
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+def cache_info(key, hit, restored=None):
+    """What a stage reports about the cache in its payload"""
+    info = {'hit': hit, 'key': key[:12]}
+    if restored:
+        info['restored'] = restored
+    return info
+
+
+stage_cache = StageCache()
@@ -0,0 +1,392 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from utils.flow_utils import ACK, SYN
+
+logger = logging.getLogger(__name__)
+
+# Per-second buckets kept, and the length of the tumbling window the sketches cover
+HISTORY_SECONDS = 60
+WINDOW_SECONDS = 10
+
+# Sketch sizes: count-min depth x width counters, HyperLogLog registers 2**p
+CMS_WIDTH = 2048
+CMS_DEPTH = 4
+HLL_PRECISION = 12
+DEST_HLL_PRECISION = 8
+TOP_K = 20
+
+# Alert defaults: rates are packets/s on the link (sampled counts times the sample rate)
+ALERT_PPS = None
+ALERT_SYN_RATIO = 0.8
+ALERT_SYN_MIN = 50
+ALERT_SOURCES = 1000
+EWMA_ALPHA = 0.1
+EWMA_K = 4.0
+EWMA_WARMUP = 10
+EWMA_MIN_PPS = 100
+ALERT_COOLDOWN = 30.0
+MAX_ALERTS = 100
+
+_HASH_MASK = (1 << 64) - 1
+
+
+class CountMinSketch:
+    """Approximate counts per key in fixed memory; estimates never undercount."""
+
+    def __init__(self, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.width = width
+        self.depth = depth
+        self._table = [0] * (width * depth)
+        self.total = 0
+
+    def add(self, key, count=1):
+        """Count ``key`` and return its new estimate."""
+        h = hash(key) & _HASH_MASK
+        # Kirsch-Mitzenmacher: the depth row indices come from two halves of one hash
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        table, width = self._table, self.width
+        estimate = None
+        for row in range(self.depth):
+            index = row * width + (h1 + row * h2) % width
+            value = table[index] + count
+            table[index] = value
+            if estimate is None or value < estimate:
+                estimate = value
+        self.total += count
+        return estimate
+
+    def estimate(self, key):
+        h = hash(key) & _HASH_MASK
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return min(self._table[row * self.width + (h1 + row * h2) % self.width] for row in range(self.depth))
+
+    def nbytes(self):
+        return len(self._table) * 8
+
+
+class HyperLogLog:
+    """Distinct-count estimate in 2**precision one-byte registers (about 1.04/sqrt(2**p) error)."""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self._registers = bytearray(self.m)
+        self._bits = 64 - precision
+
+    def add(self, key):
+        h = hash(key) & _HASH_MASK
+        index = h & (self.m - 1)
+        rank = self._bits - (h >> self.precision).bit_length() + 1
+        if rank > self._registers[index]:
+            self._registers[index] = rank
+
+    def count(self):
+        m = self.m
+        registers = bytes(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m) if m >= 128 else {16: 0.673, 32: 0.697, 64: 0.709}[m]
+        estimate = alpha * m * m / sum(2.0 ** -r for r in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small range: linear counting is more accurate
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def nbytes(self):
+        return self.m
+
+
+class HeavyHitters:
+    """The ``k`` keys with the largest count-min estimates seen in a window."""
+
+    def __init__(self, k=TOP_K, width=CMS_WIDTH, depth=CMS_DEPTH):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.top = {}
+        self._floor = 0
+
+    def add(self, key, count=1):
+        """Count ``key``; returns True when it is (now) one of the top keys."""
+        estimate = self.sketch.add(key, count)
+        top = self.top
+        if key in top:
+            top[key] = estimate
+            return True
+        if len(top) < self.k:
+            top[key] = estimate
+            self._floor = min(top.values())
+            return True
+        if estimate <= self._floor:
+            return False
+        del top[min(top, key=top.get)]
+        top[key] = estimate
+        self._floor = min(top.values())
+        return True
+
+    def items(self):
+        """(key, estimate) pairs, largest first"""
+        return sorted(list(self.top.items()), key=lambda item: -item[1])
+
+
+class WindowSketches:
+    """Sketches of one tumbling window: heavy sources/destinations and distinct sources.
+
+    Destinations among the heavy hitters also get a small HyperLogLog of
+    their distinct sources, started when they enter the top ``k``.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.packets = 0
+        self.bytes = 0
+        self.syn = 0
+        self.tcp = 0
+        self.sources = HyperLogLog(HLL_PRECISION)
+        self.top_sources = HeavyHitters()
+        self.top_destinations = HeavyHitters()
+        self.dest_sources = {}
+
+    def add(self, src, dst, length, syn, tcp):
+        self.packets += 1
+        self.bytes += length
+        self.syn += syn
+        self.tcp += tcp
+        self.sources.add(src)
+        self.top_sources.add(src)
+        if self.top_destinations.add(dst):
+            sources = self.dest_sources.get(dst)
+            if sources is None:
+                sources = self.dest_sources[dst] = HyperLogLog(DEST_HLL_PRECISION)
+                # Drop the registers of destinations pushed out of the top k
+                if len(self.dest_sources) > self.top_destinations.k:
+                    for key in [key for key in self.dest_sources if key not in self.top_destinations.top]:
+                        del self.dest_sources[key]
+            sources.add(src)
+
+    def summary(self, end, scale=1):
+        seconds = max(end - self.start, 1e-9)
+        destinations = []
+        for dst, packets in self.top_destinations.items():
+            sources = self.dest_sources.get(dst)
+            destinations.append({'ip': dst, 'packets': packets,
+                                 'distinct_sources': sources.count() if sources is not None else None})
+        return {
+            'start': self.start,
+            'end': end,
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'packets_per_s': round(self.packets * scale / seconds, 1),
+            'bytes_per_s': round(self.bytes * scale / seconds, 1),
+            'syn_ratio': round(self.syn / self.tcp, 4) if self.tcp else None,
+            'distinct_sources': self.sources.count(),
+            'top_sources': [{'ip': src, 'packets': packets} for src, packets in self.top_sources.items()],
+            'top_destinations': destinations,
+        }
+
+    def nbytes(self):
+        return (self.sources.nbytes() + self.top_sources.sketch.nbytes() + self.top_destinations.sketch.nbytes()
+                + sum(sources.nbytes() for sources in self.dest_sources.values()))
+
+
+class TrafficStats:
+    """Sliding-window packet statistics and rate alerts, updated in O(1) per packet.
+
+    ``observe`` is called by the capture path only, with each packet's capture
+    timestamp, so a pcap replayed faster than real time keeps its own rates;
+    ``clock`` is only used for packets without one. Per-second counters live
+    in a fixed ring of buckets; sources and destinations go into count-min and
+    HyperLogLog sketches that are replaced every ``window_seconds``. Memory is
+    fixed by these sizes, whatever the traffic volume.
+
+    When a second completes its rate is checked against ``pps_threshold`` and
+    an EWMA baseline, and its SYN share against ``syn_ratio``; when a window
+    completes, distinct sources per heavy destination are checked against
+    ``sources_threshold``. These fire within a second or a window, before the
+    flow classifier has seen enough packets of any one flow.
+    """
+
+    def __init__(self, history_seconds=HISTORY_SECONDS, window_seconds=WINDOW_SECONDS, sample_rate=1,
+                 pps_threshold=ALERT_PPS, syn_ratio=ALERT_SYN_RATIO, sources_threshold=ALERT_SOURCES,
+                 alpha=EWMA_ALPHA, k=EWMA_K, clock=time.time):
+        self.history_seconds = history_seconds
+        self.window_seconds = window_seconds
+        self.sample_rate = sample_rate
+        self.pps_threshold = pps_threshold
+        self.syn_ratio = syn_ratio
+        self.sources_threshold = sources_threshold
+        self.alpha = alpha
+        self.k = k
+        self.clock = clock
+
+        # Bucket: [second, packets, bytes, tcp, syn, syn_ack]
+        self._buckets = [[None, 0, 0, 0, 0, 0] for _ in range(history_seconds)]
+        self._second = None
+        self._latest = None
+        # Packet time minus clock time at the last packet, so idle seconds still pass between packets
+        self._skew = 0.0
+        self.window = WindowSketches(self._window_start(clock()))
+        self.last_window = None
+
+        self.pps_mean = 0.0
+        self.pps_var = 0.0
+        self.seconds_seen = 0
+        self.alerts = deque(maxlen=MAX_ALERTS)
+        self.alert_seq = 0
+        self._last_alert = {}
+        # observe runs on the capture path while snapshot serves requests; the sketches are not thread-safe
+        self._lock = threading.RLock()
+
+    def _window_start(self, now):
+        return int(now // self.window_seconds * self.window_seconds)
+
+    def now(self):
+        """Current time on the packets' clock"""
+        return self.clock() + self._skew
+
+    def observe(self, src, dst, length, proto, flags=0, ts=None):
+        """Count one packet captured at ``ts`` (the clock when None)"""
+        with self._lock:
+            self._observe(src, dst, length, proto, flags, ts)
+
+    def _observe(self, src, dst, length, proto, flags, ts):
+        clock_now = self.clock()
+        now = clock_now if ts is None else float(ts)
+        if self._latest is None:
+            # Windows start from the first packet's time, which for a replay may be long ago
+            self.window = WindowSketches(self._window_start(now))
+        elif now < self._latest:
+            # Packets slightly out of order count in the current second
+            now = self._latest
+        self._latest = now
+        self._skew = now - clock_now
+        second = int(now)
+        if second != self._second:
+            self._advance(second)
+        bucket = self._buckets[second % self.history_seconds]
+        bucket[1] += 1
+        bucket[2] += length
+        syn = tcp = 0
+        if proto == 6:
+            tcp = 1
+            bucket[3] += 1
+            if flags & SYN:
+                if flags & ACK:
+                    bucket[5] += 1
+                else:
+                    syn = 1
+                    bucket[4] += 1
+        window = self.window
+        if now >= window.start + self.window_seconds:
+            window = self._roll_window(now)
+        window.add(src, dst, length, syn, tcp)
+
+    def _advance(self, second):
+        """Close the seconds between the last packet and ``second``, then start its bucket"""
+        if self._second is not None:
+            self._check_second(self._buckets[self._second % self.history_seconds], self._second)
+            # Idle seconds count as zero traffic, but only the last history_seconds of them matter
+            for closed in range(max(self._second + 1, second - self.history_seconds), second):
+                self._check_second(self._buckets[closed % self.history_seconds], closed)
+        self._buckets[second % self.history_seconds] = [second, 0, 0, 0, 0, 0]
+        self._second = second
+
+    def _roll_window(self, now):
+        completed = self.window
+        self.window = WindowSketches(self._window_start(now))
+        self.last_window = completed.summary(completed.start + self.window_seconds, self.sample_rate)
+        self._check_window(self.last_window)
+        return self.window
+
+    def _check_second(self, bucket, second):
+        packets, tcp, syn = (bucket[1], bucket[3], bucket[4]) if bucket[0] == second else (0, 0, 0)
+        pps = packets * self.sample_rate
+        if self.pps_threshold and pps >= self.pps_threshold:
+            self._alert('packet_rate', second, pps, self.pps_threshold,
+                        f"{pps} packets/s, above the {self.pps_threshold} packets/s threshold")
+        if self.seconds_seen >= EWMA_WARMUP and pps >= EWMA_MIN_PPS:
+            limit = self.pps_mean + self.k * math.sqrt(self.pps_var)
+            if pps > limit:
+                self._alert('rate_spike', second, pps, round(limit, 1),
+                            f"{pps} packets/s, {self.k} deviations above the recent mean of {self.pps_mean:.0f}")
+        if self.syn_ratio and syn * self.sample_rate >= ALERT_SYN_MIN and syn / tcp >= self.syn_ratio:
+            self._alert('syn_flood', second, round(syn / tcp, 3), self.syn_ratio,
+                        f"{syn / tcp:.0%} of TCP packets are SYNs without ACK ({syn * self.sample_rate}/s)")
+
+        # Exponentially weighted mean and variance of packets/s
+        diff = pps - self.pps_mean
+        increment = self.alpha * diff
+        self.pps_mean += increment
+        self.pps_var = (1 - self.alpha) * (self.pps_var + diff * increment)
+        self.seconds_seen += 1
+
+    def _check_window(self, summary):
+        if not self.sources_threshold:
+            return
+        for destination in summary['top_destinations']:
+            sources = destination['distinct_sources']
+            if sources is not None and sources >= self.sources_threshold:
+                self._alert('distributed_sources', summary['end'], sources, self.sources_threshold,
+                            f"{destination['ip']} received packets from about {sources} sources "
+                            f"in {self.window_seconds} s", target=destination['ip'])
+
+    def _alert(self, kind, at, value, threshold, message, target=None):
+        key = (kind, target)
+        if at - self._last_alert.get(key, float('-inf')) < ALERT_COOLDOWN:
+            return
+        if len(self._last_alert) > 4 * MAX_ALERTS:
+            self._last_alert.clear()
+        self._last_alert[key] = at
+        self.alert_seq += 1
+        self.alerts.append({'seq': self.alert_seq, 'time': at, 'kind': kind, 'target': target,
+                            'value': value, 'threshold': threshold, 'message': message})
+        logger.warning(f"Traffic alert ({kind}): {message}")
+
+    def seconds(self, limit=None):
+        """Completed and current per-second counters, oldest first"""
+        now = int(self.now())
+        limit = min(limit or self.history_seconds, self.history_seconds)
+        rows = []
+        with self._lock:
+            for second in range(now - limit + 1, now + 1):
+                bucket = list(self._buckets[second % self.history_seconds])
+                if bucket[0] != second:
+                    bucket = [second, 0, 0, 0, 0, 0]
+                rows.append({'second': second, 'packets': bucket[1], 'bytes': bucket[2], 'tcp': bucket[3],
+                             'syn': bucket[4], 'syn_ack': bucket[5]})
+        return rows
+
+    def alerts_since(self, seq=0):
+        return [alert for alert in list(self.alerts) if alert['seq'] > seq]
+
+    def snapshot(self, seconds=None, alerts_since=0):
+        """Per-second counters, the current and last window's aggregates, the rate baseline and alerts"""
+        with self._lock:
+            return self._snapshot(seconds, alerts_since)
+
+    def _snapshot(self, seconds, alerts_since):
+        window = self.window
+        return {
+            'sample_rate': self.sample_rate,
+            'window_seconds': self.window_seconds,
+            'seconds': self.seconds(seconds),
+            'current_window': window.summary(max(self.now(), window.start + 1), self.sample_rate),
+            'last_window': self.last_window,
+            'baseline': {
+                'packets_per_s_mean': round(self.pps_mean, 1),
+                'packets_per_s_std': round(math.sqrt(self.pps_var), 1),
+                'seconds_seen': self.seconds_seen,
+            },
+            'thresholds': {
+                'packets_per_s': self.pps_threshold,
+                'syn_ratio': self.syn_ratio,
+                'distinct_sources': self.sources_threshold,
+                'ewma_alpha': self.alpha,
+                'ewma_k': self.k,
+            },
+            'alert_seq': self.alert_seq,
+            'alerts': self.alerts_since(alerts_since),
+            'sketch_bytes': window.nbytes(),
+        }
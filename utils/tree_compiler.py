@@ -0,0 +1,334 @@
+import os
+
+import numpy as np
+
+# Saved next to models/<name>.pkl as models/<name>_compiled.pkl
+COMPILED_SUFFIX = '_compiled'
+
+
+# Ensembles no deeper than this are padded to complete binary trees, where a
+# child's position is computed rather than looked up and no path finishes
+# early; deeper ones keep their own node layout
+COMPLETE_MAX_DEPTH = 10
+
+
+class CompiledTreeEnsemble:
+    """A fitted decision tree, random forest or gradient boosting classifier
+    flattened into packed NumPy arrays.
+
+    Every tree's split features and thresholds live in shared node arrays and
+    leaf values in one value array. A batch is evaluated for all trees at
+    once, one tree level per step, so prediction costs a few vectorized
+    gathers per level with no sklearn in the loop. Shallow ensembles are
+    padded to complete trees (children of position i at 2i+1 and 2i+2);
+    deep ones keep explicit children and drop paths once they reach a leaf.
+
+    Predictions and probabilities are identical to the source model's: inputs
+    are rounded to float32 as sklearn does, thresholds are rounded down to
+    float32 so every split decision matches, and leaf values are combined in
+    the same order with the same operations.
+    """
+
+    def __init__(self, kind, classes, n_features_in, packed, learning_rate=None,
+                 init_raw=None, loss=None, feature_names_in=None):
+        self.kind = kind
+        self.classes_ = classes
+        self.n_features_in_ = n_features_in
+        self.layout = packed['layout']
+        self.n_trees = packed['n_trees']
+        self.depth = packed['depth']
+        self.feature = packed['feature']
+        self.threshold = packed['threshold']
+        self.missing_left = packed['missing_left']
+        self.children = packed.get('children')
+        self.is_leaf = packed.get('is_leaf')
+        self.roots = packed.get('roots')
+        self.value = packed['value']
+        self.tree_value = packed.get('tree_value')
+        self.learning_rate = learning_rate
+        self.init_raw = init_raw
+        self.loss = loss
+        if feature_names_in is not None:
+            self.feature_names_in_ = feature_names_in
+
+    @property
+    def n_nodes(self):
+        return len(self.feature) + (len(self.value) if self.layout == 'complete' else 0)
+
+    def _check_X(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"X has {X.shape[-1] if X.ndim else 0} features, "
+                             f"but the model expects {self.n_features_in_}")
+        return X
+
+    def apply(self, X):
+        """Index into ``value`` of the leaf each row reaches in each tree, shape (n_samples, n_trees)."""
+        X = self._check_X(X)
+        check_missing = self.missing_left is not None and np.isnan(X).any()
+        if self.layout == 'complete':
+            return self._apply_complete(X, check_missing)
+        return self._apply_sparse(X, check_missing)
+
+    def _apply_complete(self, X, check_missing):
+        # Heap numbering: root 1, children of i at 2i and 2i + 1, leaves at [2**depth, 2**(depth + 1))
+        n_internal = 2 ** self.depth - 1
+        row_offset = (np.arange(len(X)) * X.shape[1])[:, None]
+        tree_offset = np.arange(self.n_trees) * n_internal - 1
+        X = X.ravel()
+        position = np.ones((len(row_offset), self.n_trees), dtype=np.intp)
+        node = np.empty_like(position)
+        for _ in range(self.depth):
+            np.add(position, tree_offset, out=node)
+            x = X[row_offset + self.feature[node]]
+            go_right = ~(x <= self.threshold[node])
+            if check_missing:
+                go_right &= ~(np.isnan(x) & self.missing_left[node])
+            position <<= 1
+            position |= go_right
+        return position + (np.arange(self.n_trees) * (n_internal + 1) - n_internal - 1)
+
+    def _apply_sparse(self, X, check_missing):
+        n_samples = len(X)
+        # Flat (row, tree) paths; only those that have not reached a leaf are advanced
+        nodes = np.tile(self.roots, n_samples)
+        row_offset = np.repeat(np.arange(n_samples) * X.shape[1], self.n_trees)
+        X = X.ravel()
+        active = np.flatnonzero(~self.is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            x = X[row_offset[active] + self.feature[current]]
+            go_right = ~(x <= self.threshold[current])
+            if check_missing:
+                go_right &= ~(np.isnan(x) & self.missing_left[current])
+            current = self.children[2 * current + go_right]
+            nodes[active] = current
+            active = active[~self.is_leaf[current]]
+        return nodes.reshape(n_samples, self.n_trees)
+
+    def decision_function(self, X):
+        if self.kind != 'gradient_boosting':
+            raise AttributeError("decision_function is only available for gradient boosting")
+        leaves = self.apply(X)
+        # Trees are stored stage by stage, one per raw output column, and added
+        # in the same order as sklearn's predict_stages
+        n_outputs = len(self.init_raw)
+        steps = np.empty((self.n_trees // n_outputs + 1, len(leaves), n_outputs))
+        steps[0] = self.init_raw
+        leaves = leaves.reshape(len(leaves), -1, n_outputs).transpose(1, 0, 2)
+        np.multiply(self.learning_rate, self.value[leaves], out=steps[1:])
+        raw = _sum_in_order(steps)
+        if n_outputs == 1:
+            return raw.ravel()
+        return raw
+
+    def predict_proba(self, X):
+        if self.kind == 'gradient_boosting':
+            from scipy.special import expit
+
+            raw = self.decision_function(X)
+            if raw.ndim == 1:
+                proba = np.empty((raw.shape[0], 2), dtype=raw.dtype)
+                proba[:, 1] = expit(2 * raw if self.loss == 'exponential' else raw)
+                proba[:, 0] = 1 - proba[:, 1]
+                return proba
+            # Softmax, step for step as in sklearn.utils.extmath.softmax
+            raw -= raw.max(axis=1).reshape(-1, 1)
+            np.exp(raw, out=raw)
+            raw /= raw.sum(axis=1).reshape(-1, 1)
+            return raw
+
+        leaves = self.apply(X)
+        if self.kind == 'decision_tree':
+            return self.value[leaves[:, 0]]
+        # Summed tree by tree like sklearn's forest accumulation
+        proba = _sum_in_order(self.value[leaves.T])
+        proba /= self.n_trees
+        return proba
+
+    def predict(self, X):
+        if self.kind == 'gradient_boosting':
+            raw = self.decision_function(X)
+            if raw.ndim == 1:
+                return self.classes_[(raw >= 0).astype(int)]
+            return self.classes_[np.argmax(raw, axis=1)]
+        if self.kind == 'decision_tree':
+            # A single tree votes on its raw leaf values, as DecisionTreeClassifier.predict does
+            return self.classes_.take(np.argmax(self.tree_value[self.apply(X)[:, 0]], axis=1), axis=0)
+        return self.classes_.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+
+def _sum_in_order(terms):
+    """``terms[0] + terms[1] + ...`` strictly left to right, so sums match sklearn's bit for bit."""
+    # cumsum is a single call but slow per element; row-by-row adds cost a call per term
+    if terms[0].size < 256:
+        return np.cumsum(terms, axis=0)[-1]
+    total = terms[0].copy()
+    for term in terms[1:]:
+        total += term
+    return total
+
+
+def _float32_thresholds(threshold):
+    """Largest float32 not above each threshold: for float32 inputs ``x <= t``
+    then gives the same answer as sklearn's float32-against-float64 comparison."""
+    threshold = np.asarray(threshold, dtype=np.float64)
+    rounded = threshold.astype(np.float32)
+    above = rounded.astype(np.float64) > threshold
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _missing_go_to_left(tree):
+    if hasattr(tree, 'missing_go_to_left'):
+        return tree.missing_go_to_left.astype(bool)
+    return np.zeros(tree.node_count, dtype=bool)
+
+
+def _pack_complete(trees, node_values, depth):
+    """Pad every tree to a complete tree of ``depth`` levels; below a shallow
+    leaf both branches end at copies of that leaf."""
+    n_internal = 2 ** depth - 1
+    feature = np.zeros((len(trees), n_internal), dtype=np.intp)
+    threshold = np.full((len(trees), n_internal), np.inf)
+    missing_left = np.zeros((len(trees), n_internal), dtype=bool)
+    leaf_node = np.zeros((len(trees), n_internal + 1), dtype=np.intp)
+    for t, tree in enumerate(trees):
+        missing = _missing_go_to_left(tree)
+        stack = [(0, 0, 0)]
+        while stack:
+            node, position, level = stack.pop()
+            if level == depth:
+                leaf_node[t, position - n_internal] = node
+                continue
+            left, right = tree.children_left[node], tree.children_right[node]
+            if left == -1:
+                left = right = node
+            else:
+                feature[t, position] = tree.feature[node]
+                threshold[t, position] = tree.threshold[node]
+                missing_left[t, position] = missing[node]
+            stack.append((left, 2 * position + 1, level + 1))
+            stack.append((right, 2 * position + 2, level + 1))
+    packed = {
+        'layout': 'complete', 'n_trees': len(trees), 'depth': depth,
+        'feature': feature.ravel(), 'threshold': _float32_thresholds(threshold.ravel()),
+        'missing_left': missing_left.ravel() if missing_left.any() else None,
+    }
+    for name, values in node_values.items():
+        packed[name] = np.ascontiguousarray(np.concatenate(
+            [per_tree[leaf_node[t]] for t, per_tree in enumerate(values)]))
+    return packed
+
+
+def _pack_sparse(trees, node_values):
+    """Concatenate the trees' own node arrays; ``children`` holds (left, right) pairs."""
+    offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]]).astype(np.intp)
+    feature, threshold, missing_left, children, is_leaf = [], [], [], [], []
+    for tree, offset in zip(trees, offsets):
+        leaf = tree.children_left == -1
+        index = np.arange(tree.node_count) + offset
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        missing_left.append(_missing_go_to_left(tree) & ~leaf)
+        children.append(np.column_stack([np.where(leaf, index, tree.children_left + offset),
+                                         np.where(leaf, index, tree.children_right + offset)]))
+        is_leaf.append(leaf)
+    missing_left = np.concatenate(missing_left)
+    packed = {
+        'layout': 'sparse', 'n_trees': len(trees), 'depth': max(tree.max_depth for tree in trees),
+        'feature': np.concatenate(feature).astype(np.intp),
+        'threshold': _float32_thresholds(np.concatenate(threshold)),
+        'missing_left': missing_left if missing_left.any() else None,
+        'children': np.concatenate(children).astype(np.intp).ravel(),
+        'is_leaf': np.concatenate(is_leaf),
+        'roots': offsets,
+    }
+    for name, values in node_values.items():
+        packed[name] = np.ascontiguousarray(np.concatenate(values))
+    return packed
+
+
+def _pack_trees(trees, **node_values):
+    """Pack sklearn ``Tree`` objects together with per-node value arrays (one list entry per tree)."""
+    depth = max(tree.max_depth for tree in trees)
+    if depth <= COMPLETE_MAX_DEPTH:
+        return _pack_complete(trees, node_values, depth)
+    return _pack_sparse(trees, node_values)
+
+
+def _leaf_proba(tree):
+    """Per-node class probabilities exactly as ``DecisionTreeClassifier.predict_proba`` returns them."""
+    import sklearn
+
+    proba = tree.value[:, 0, :]
+    # Since scikit-learn 1.4 classifier trees store class fractions; before, weighted counts
+    # that predict_proba normalized on every call
+    if tuple(int(part) for part in sklearn.__version__.split('.')[:2]) >= (1, 4):
+        return proba.copy()
+    normalizer = proba.sum(axis=1)[:, np.newaxis]
+    normalizer[normalizer == 0.0] = 1.0
+    return proba / normalizer
+
+
+def compile_model(model):
+    """Flatten a fitted tree classifier into a ``CompiledTreeEnsemble``.
+
+    Raises ValueError for models that can't be compiled exactly.
+    """
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier
+
+    if not hasattr(model, 'classes_'):
+        raise ValueError("Model is not fitted")
+    if getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("Only single-output models can be compiled")
+    extra = {'feature_names_in': getattr(model, 'feature_names_in_', None)}
+
+    if isinstance(model, DecisionTreeClassifier):
+        tree = model.tree_
+        packed = _pack_trees([tree], value=[_leaf_proba(tree)], tree_value=[tree.value[:, 0, :]])
+        return CompiledTreeEnsemble('decision_tree', model.classes_, model.n_features_in_, packed, **extra)
+
+    if isinstance(model, (RandomForestClassifier, ExtraTreesClassifier)):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        packed = _pack_trees(trees, value=[_leaf_proba(tree) for tree in trees])
+        return CompiledTreeEnsemble('random_forest', model.classes_, model.n_features_in_, packed, **extra)
+
+    if isinstance(model, GradientBoostingClassifier):
+        from sklearn.dummy import DummyClassifier
+
+        if not (model.init_ == 'zero' or isinstance(model.init_, DummyClassifier)):
+            raise ValueError("Only gradient boosting with the default or 'zero' init can be compiled")
+        # Constant prior raw prediction of the init estimator
+        init_raw = model._raw_predict_init(np.zeros((1, model.n_features_in_), dtype=np.float32))[0].copy()
+        trees = [estimator.tree_ for estimator in model.estimators_.ravel()]
+        packed = _pack_trees(trees, value=[tree.value[:, 0, 0] for tree in trees])
+        return CompiledTreeEnsemble('gradient_boosting', model.classes_, model.n_features_in_, packed,
+                                    learning_rate=model.learning_rate, init_raw=init_raw, loss=model.loss,
+                                    **extra)
+
+    raise ValueError(f"{type(model).__name__} can't be compiled; only decision tree, "
+                     "random forest and gradient boosting classifiers are supported")
+
+
+def can_compile(model):
+    from sklearn.tree import DecisionTreeClassifier
+    from sklearn.ensemble import RandomForestClassifier, ExtraTreesClassifier, GradientBoostingClassifier
+
+    return isinstance(model, (DecisionTreeClassifier, RandomForestClassifier,
+                              ExtraTreesClassifier, GradientBoostingClassifier))
+
+
+def compiled_model_path(model_path):
+    """Where the compiled form of ``models/<name>.pkl`` is stored."""
+    stem = os.path.splitext(model_path)[0]
+    return f"{stem}{COMPILED_SUFFIX}.pkl"
+
+
+def source_model_path(path):
+    """``models/<name>.pkl`` for a compiled ``models/<name>_compiled.pkl``; other paths unchanged."""
+    stem, extension = os.path.splitext(path)
+    if stem.endswith(COMPILED_SUFFIX):
+        return stem[:-len(COMPILED_SUFFIX)] + extension
+    return path